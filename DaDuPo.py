@@ -22,7 +22,9 @@ __copyright__ = """
 """
 
 import json
+from datetime import datetime
 from functools import partial
+from pathlib import Path
 
 from PySide2 import QtCore, QtWidgets, QtGui
 from PySide2.QtCore import QSettings, Qt
@@ -44,10 +46,14 @@ pg.setConfigOption('foreground', 'b')
 
 
 class MainWindow(QtWidgets.QMainWindow):
+    measurementFinished = QtCore.Signal()  # emitted from a device thread, e.g. at the end of a replay
+
     def __init__(self):
         super(MainWindow, self).__init__()
         self.panels = []
         self.device_manager = DeviceManager()
+        self.measurementFinished.connect(self.on_measurement_finished)
+        self.device_manager.add_measurement_finished_listener(self.measurementFinished.emit)
         with open("project.json") as f:
             config = json.load(f)
             self.device_manager.load_devices(config['devices'])
@@ -221,6 +227,8 @@ class MainWindow(QtWidgets.QMainWindow):
                                           triggered=self.createScalarSignalPanel)
         self.configMeasurementAct = QAction('&Config Measurement', self, triggered=self.config_measurement)
         self.configMeasurementAct.setEnabled(False)
+        self.recordMeasurementAct = QAction('&Record Measurement', self, checkable=True)
+        self.captureDaqAct = QAction('Capture Raw &DAQ', self, checkable=True)
 
         self.connectAct = QAction(Icon.connect(), "&Connect", self,
                                   triggered=self.connect_device)
@@ -253,6 +261,8 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.editMenu = self.menuBar().addMenu("&Edit")
         self.editMenu.addAction(self.configMeasurementAct)
+        self.editMenu.addAction(self.recordMeasurementAct)
+        self.editMenu.addAction(self.captureDaqAct)
 
         self.viewMenu = self.menuBar().addMenu("&View")
         self.view_new_submenu = self.viewMenu.addMenu('New')
@@ -400,11 +410,21 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def start_measurement(self):
         try:
+            name = datetime.now().strftime('%Y%m%d_%H%M%S')
+            if self.recordMeasurementAct.isChecked():
+                self.device_manager.start_recording(Path('recordings') / name)
+            self.device_manager.set_capture(Path('captures') / name if self.captureDaqAct.isChecked() else None)
+            # buffers first, a replay delivers samples as soon as it is started
+            self.data_pool.on_start_measurement()
             self.device_manager.start_measurement()
         except Exception as e:
+            self.data_pool.on_stop_measurement()
+            if self.device_manager.recorder:
+                self.device_manager.stop_recording()
             QtWidgets.QMessageBox.information(self, "Error", 'start measurement failed! \n\n' + str(e))
             return
-        self.data_pool.on_start_measurement()
+        self.recordMeasurementAct.setEnabled(False)
+        self.captureDaqAct.setEnabled(False)
         self.connectAct.setEnabled(False)
         self.disconnectAct.setEnabled(False)
         self.startMeasurementAct.setEnabled(False)
@@ -413,11 +433,24 @@ class MainWindow(QtWidgets.QMainWindow):
             p.on_start_measurement()
         self._measurement_started = True
 
+    def on_measurement_finished(self):
+        if self._measurement_started:
+            self.stop_measurement()
+            self.statusBar().showMessage('replay finished')
+
     def stop_measurement(self):
         try:
             self.device_manager.stop_measurement()
         except Exception as e:
             QtWidgets.QMessageBox.information(self, "Error", 'stop measurement failed! \n\n' + str(e))
+        try:
+            recorder = self.device_manager.stop_recording()
+            if recorder:
+                self.statusBar().showMessage(f'{recorder.samples} samples recorded to {recorder.path}')
+        except Exception as e:
+            QtWidgets.QMessageBox.information(self, "Error", 'recording failed! \n\n' + str(e))
+        self.recordMeasurementAct.setEnabled(True)
+        self.captureDaqAct.setEnabled(True)
         self.connectAct.setEnabled(False)
         self.disconnectAct.setEnabled(True)
         self.startMeasurementAct.setEnabled(True)
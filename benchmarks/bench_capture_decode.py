@@ -0,0 +1,90 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# offline decoding of a DAQ capture into a recording by DaqCapture.decode_capture with 1 to all cores.
+# run from the repository root: python -m benchmarks.bench_capture_decode
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from benchmarks.common import make_database, signal_sizes, make_packets
+from data.DataPool import DataPool
+from device.DaqCapture import DaqCapture, decode_capture, layout_digest
+from device.XcpClient import BinPacker
+
+
+def write_capture(path, db, packets_total, batch_packets):
+    data_pool = DataPool()
+    data_pool._databases[db.name] = db
+    daq_list = OrderedDict()
+    daq_list['10ms'] = BinPacker.pack(signal_sizes(db), 13)
+    objs = {sid: data_pool.get_obj_by_sid(sid) for sid in signal_sizes(db)}
+    header = {'db': db.name, 'db_digest': layout_digest(objs, db.byte_order),
+              'identification_field': 'IDF_ABS_ODT_NUMBER', 'slave_byte_order': 'INTEL',
+              'daq_list': daq_list, 'daq_list_pid': {'10ms': 0}, 'start_time': time.time()}
+    packets = make_packets(daq_list['10ms'], 0, 10000)
+    capture = DaqCapture(path, header)
+    t = time.time()
+    for i in range(0, packets_total, batch_packets):
+        capture.append([(packets[(i + j) % len(packets)], i + j, 0, t + (i + j) * 1e-5)
+                        for j in range(min(batch_packets, packets_total - i))])
+    capture.close()
+    return capture
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--packets', type=int, default=2000000)
+    parser.add_argument('--batch', type=int, default=64, help='packets per drain of the DAQ queue')
+    parser.add_argument('--signals', type=int, default=64)
+    args = parser.parse_args()
+
+    db = make_database(args.signals)
+    tmp = Path(tempfile.mkdtemp())
+    try:
+        capture = write_capture(tmp / 'bench.daq', db, args.packets, args.batch)
+        print(f'{capture.packets} packets, {capture.bytes / 1e6:.1f} MB')
+        print(f'{"workers":>8} {"time [s]":>9} {"[MB/s]":>8} {"[pkt/s]":>10} {"speedup":>8}')
+        single = None
+        workers = 1
+        while True:
+            start = time.perf_counter()
+            decode_capture(tmp / 'bench.daq', db, tmp / f'rec{workers}', workers=workers)
+            elapsed = time.perf_counter() - start
+            single = single or elapsed
+            print(f'{workers:>8} {elapsed:>9.2f} {capture.bytes / 1e6 / elapsed:>8.1f} '
+                  f'{capture.packets / elapsed:>10.0f} {single / elapsed:>7.1f}x')
+            if workers >= (os.cpu_count() or 1):
+                break
+            workers = min(workers * 2, os.cpu_count())
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
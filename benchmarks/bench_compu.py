@@ -0,0 +1,136 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# values/second of the raw -> physical conversion: the original per value raw_value_to_phy_value against
+# the compiled compu methods on numpy arrays, the decoding of an array parameter from its bytes and the
+# physical -> raw conversion of DICT compu methods.
+# run from the repository root: python -m benchmarks.bench_compu
+
+import argparse
+
+import numpy as np
+
+from benchmarks.common import measure
+from data.Asap2Database import CompuMethod, CompuMethodType, Coeffs, Datatype, Alignment, ByteOrder
+from data.Asap2DatabaseUtil import bytes_to_array_phy_value, bytes_to_single_raw_value, calc_deposit_from_datatype
+from data.CompiledCompuMethod import CompiledCompuMethod
+
+
+def legacy_raw_value_to_phy_value(raw_value, compu_method: CompuMethod):
+    """raw_value_to_phy_value before the compu methods were compiled"""
+    if not compu_method or compu_method.compu_method_type == CompuMethodType.IDENTICAL:
+        return raw_value
+    out = raw_value
+    if compu_method.compu_method_type == CompuMethodType.LINEAR:
+        val = raw_value * compu_method.coeffs.a + compu_method.coeffs.b
+        out = type(raw_value)(val)
+    elif compu_method.compu_method_type == CompuMethodType.DICT:
+        out = compu_method.dictionary[str(int(raw_value))]
+        return out
+    return type(raw_value)(out)
+
+
+def legacy_phy_value_to_raw_value(phy_value, compu_method: CompuMethod):
+    """the DICT branch of phy_value_to_raw_value before the reverse index"""
+    out = None
+    for k, v in compu_method.dictionary.items():
+        if v == phy_value:
+            out = k
+    return out
+
+
+def legacy_bytes_to_array_phy_value(byts, count, datatype, alignment, byte_order, compu_method):
+    """bytes_to_array_phy_value before it was vectorized"""
+    start = 0
+    deposit_size = calc_deposit_from_datatype(datatype, alignment)
+    ret_raw = []
+    ret_phy = []
+    for i in range(count):
+        raw_val = bytes_to_single_raw_value(byts[start: start + deposit_size], datatype, alignment, byte_order)
+        ret_raw.append(raw_val)
+        ret_phy.append(legacy_raw_value_to_phy_value(raw_val, compu_method))
+        start += deposit_size
+    return ret_raw, ret_phy
+
+
+def compu_methods():
+    return {
+        'identical': (CompuMethod(None, CompuMethodType.IDENTICAL, None, 'identical', None), np.int16),
+        'linear int': (CompuMethod(Coeffs(0.1, -40.0), CompuMethodType.LINEAR, None, 'linear', None), np.int16),
+        'linear float': (CompuMethod(Coeffs(0.1, -40.0), CompuMethodType.LINEAR, None, 'linear', None), np.float32),
+        'dict dense': (CompuMethod(None, CompuMethodType.DICT, {str(i): f'state{i}' for i in range(256)},
+                                   'dense', None), np.uint8),
+        'dict sparse': (CompuMethod(None, CompuMethodType.DICT, {str(i << 20): f'state{i}' for i in range(256)},
+                                    'sparse', None), np.int64),
+    }
+
+
+def make_raw(dtype, compu_method: CompuMethod, n: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    if compu_method.compu_method_type == CompuMethodType.DICT:
+        keys = np.array([int(k) for k in compu_method.dictionary.keys()])
+        return rng.choice(keys, n).astype(dtype)
+    return rng.integers(-1000, 1000, n).astype(dtype)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--values', type=int, default=1000000)
+    parser.add_argument('--legacy-values', type=int, default=100000, help='values converted by the per value path')
+    args = parser.parse_args()
+
+    print(f'{"compu method":>14} {"before [val/s]":>15} {"after [val/s]":>15} {"speedup":>8}')
+    for name, (cm, dtype) in compu_methods().items():
+        raw = make_raw(dtype, cm, args.values)
+        raw_list = raw[:args.legacy_values].tolist()
+        compiled = CompiledCompuMethod(cm)
+        before = measure(lambda: [legacy_raw_value_to_phy_value(r, cm) for r in raw_list]) / len(raw_list)
+        after = measure(compiled.to_phy, raw) / len(raw)
+        print(f'{name:>14} {1 / before:>15.0f} {1 / after:>15.0f} {before / after:>7.1f}x')
+
+    print()
+    print(f'{"array of":>14} {"before [val/s]":>15} {"after [val/s]":>15} {"speedup":>8}')
+    alignment = Alignment(1, 4, 8, 8, 4, 2)
+    cm = compu_methods()['linear int'][0]
+    for count in [16, 256, 4096]:
+        byts = make_raw(np.int16, cm, count).tobytes()
+        before = measure(legacy_bytes_to_array_phy_value, byts, count, Datatype.SWORD, alignment,
+                         ByteOrder.MSB_LAST, cm)
+        after = measure(bytes_to_array_phy_value, byts, count, Datatype.SWORD, alignment, ByteOrder.MSB_LAST, cm)
+        print(f'{count:>14} {count / before:>15.0f} {count / after:>15.0f} {before / after:>7.1f}x')
+
+    print()
+    print(f'{"phy -> raw":>14} {"before [val/s]":>15} {"after [val/s]":>15} {"vector [val/s]":>15}')
+    for name in ['dict dense', 'dict sparse']:
+        cm, dtype = compu_methods()[name]
+        compiled = CompiledCompuMethod(cm)
+        phy = compiled.to_phy(make_raw(dtype, cm, args.values))
+        phy_list = phy[:args.legacy_values].tolist()
+        before = measure(lambda: [legacy_phy_value_to_raw_value(p, cm) for p in phy_list[:1000]]) / 1000
+        after = measure(lambda: [compiled.to_raw_value(p) for p in phy_list]) / len(phy_list)
+        vector = measure(compiled.to_raw, phy) / len(phy)
+        print(f'{name:>14} {1 / before:>15.0f} {1 / after:>15.0f} {1 / vector:>15.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# packets/second of the DAQ packet decoding in XcpClient._daq_thread: the original per signal decoding,
+# the compiled per packet decoding and the batched decoding of all packets of an ODT.
+# run from the repository root: python -m benchmarks.bench_daq_decode
+
+import argparse
+from collections import OrderedDict
+
+from benchmarks.common import make_database, signal_sizes, make_packets, measure
+from data import Asap2DatabaseUtil
+from data.DataPool import DataPool
+from device.DaqDecoder import DaqDecoder
+from device.XcpClient import BinPacker
+
+
+def legacy_decode(packets, daq_list, daq_list_pid, data_pool, listener):
+    """the per packet decoding of _daq_thread before the ODTs were compiled"""
+    data_start_index = 1
+    for response in packets:
+        odt = {}
+        pid = response[0]
+        for channel, odts in daq_list.items():
+            if daq_list_pid[channel] <= pid < daq_list_pid[channel] + len(odts):
+                odt = odts[pid - daq_list_pid[channel]]
+                break
+        size_offset = 0
+        for sid, size in odt.items():
+            raw_bytes = response[data_start_index + size_offset:][:size]
+            size_offset += size
+            obj = data_pool.get_obj_by_sid(sid)
+            raw_val, phy_val = Asap2DatabaseUtil.bytes_to_phy_value(raw_bytes, obj)
+            listener(sid, raw_val, phy_val, 0)
+
+
+def compiled_decode(packets, decoder, listener):
+    for response in packets:
+        odt = decoder.lookup(response)
+        if odt is None:
+            continue
+        for sid, raw_val, phy_val in odt.decode(response):
+            listener(sid, raw_val, phy_val, 0)
+
+
+def block_decode(packets, decoder, listener):
+    grouped = {}
+    for response in packets:
+        odt = decoder.lookup(response)
+        if odt is None:
+            continue
+        grouped.setdefault(odt, []).append(response)
+    for odt, responses in grouped.items():
+        listener(odt.decode_block(responses))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--packets', type=int, default=20000)
+    parser.add_argument('--odt-size', type=int, default=13)
+    args = parser.parse_args()
+
+    print(f'{"signals":>8} {"before [pkt/s]":>15} {"after [pkt/s]":>15} {"block [pkt/s]":>15} {"speedup":>8}')
+    for n_signals in [4, 16, 64, 256]:
+        db = make_database(n_signals)
+        data_pool = DataPool()
+        data_pool._databases[db.name] = db
+        objs = {sid: data_pool.get_obj_by_sid(sid) for sid in signal_sizes(db)}
+        daq_list = OrderedDict()
+        daq_list['10ms'] = BinPacker.pack(signal_sizes(db), args.odt_size)
+        daq_list_pid = {'10ms': 0}
+        decoder = DaqDecoder(daq_list, 'IDF_ABS_ODT_NUMBER', objs, db.byte_order)
+        decoder.bind_pids(daq_list_pid)
+        packets = make_packets(daq_list['10ms'], 0, args.packets)
+
+        def listener(sid, raw_val, phy_val, timestamp):
+            pass
+
+        before = measure(legacy_decode, packets, daq_list, daq_list_pid, data_pool, listener)
+        after = measure(compiled_decode, packets, decoder, listener)
+        block = measure(block_decode, packets, decoder, lambda columns: None)
+        print(f'{n_signals:>8} {len(packets) / before:>15.0f} {len(packets) / after:>15.0f} '
+              f'{len(packets) / block:>15.0f} {before / block:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
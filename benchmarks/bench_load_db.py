@@ -0,0 +1,157 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# seconds to process and to load databases of 1k, 10k and 100k symbols with hundreds of compu methods,
+# struct descriptions (db_desc) and axis references: the original process_asap2_database against the indexed one,
+# and DataPool.load_db from the JSON file against a load from the database cache.
+# run from the repository root: python -m benchmarks.bench_load_db
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import marshmallow_dataclass
+
+from data.Asap2Database import Asap2Database, Asap2Parameter, Asap2Signal, Alignment, ByteOrder, CompuMethod, \
+    CompuMethodType, Coeffs, Datatype, DBType, ParameterType
+from data.Asap2DatabaseUtil import process_asap2_database, _gen_asap2_objects
+from data.DataPool import DataPool
+
+STRUCT_DESC = {
+    'bench_struct': {
+        'name': 'bench_struct',
+        'attributes': [
+            {'name': 'a', 'type': 'signal', 'datatype': 'UWORD', 'offset': 0, 'compu_method': 'cm0', 'unit': ''},
+            {'name': 'b', 'type': 'signal', 'datatype': 'SLONG', 'offset': 4, 'compu_method': 'cm1', 'unit': ''},
+            {'name': 'c', 'type': 'parameter', 'datatype': 'FLOAT32_IEEE', 'offset': 8, 'compu_method': 'cm2',
+             'unit': ''},
+        ]
+    }
+}
+
+
+def legacy_process(db: Asap2Database):
+    """process_asap2_database before it was built on dict indexes"""
+    if db.db_desc:
+        desc = json.loads(Path(db.db_desc).read_text())
+        objs = []
+        for s in db.asap2_parameters + db.asap2_signals:
+            if s.db_desc:
+                objs.append(s)
+        for o in objs:
+            if o in db.asap2_parameters:
+                db.asap2_parameters.remove(o)
+            elif o in db.asap2_signals:
+                db.asap2_signals.remove(o)
+            for n in _gen_asap2_objects(desc[o.db_desc], o.name):
+                addr = hex(int(o.address, 0) + n['offset'])
+                name_splits = n['name'].split('.')
+                n_name = '.'.join(name_splits[:1] + name_splits[2:])
+                if n['type'] == 'parameter':
+                    db.asap2_parameters.append(Asap2Parameter(addr, None, n['compu_method'], 1,
+                                                              Datatype[n['datatype']], '', '', n_name,
+                                                              ParameterType.VALUE, None, None, n['unit'], ''))
+                if n['type'] == 'signal':
+                    db.asap2_signals.append(Asap2Signal(addr, None, n['compu_method'], 1, Datatype[n['datatype']],
+                                                        '', '', n_name, n['unit'], ''))
+    if not db.alignment:
+        db.alignment = Alignment(1, 4, 8, 8, 4, 2)
+    for s in db.asap2_parameters + db.asap2_signals:
+        s.parent = db
+        if s.compu_method:
+            cm = next((c for c in db.compu_methods if c.name == s.compu_method), None)
+            s.compu_method_ref = cm
+            s.identifier = '/'.join([db.name, s.name])
+            if not s.unit and cm.unit:
+                s.unit = cm.unit
+        if not s.count:
+            s.count = 1
+        if not s.alignment:
+            s.alignment = db.alignment
+    for s in db.asap2_parameters:
+        if s.ref_x:
+            s.ref_x_ref = next((p for p in db.asap2_parameters if p.name == s.ref_x), None)
+        if s.ref_y:
+            s.ref_y_ref = next((p for p in db.asap2_parameters if p.name == s.ref_y), None)
+
+
+def make_raw_database(n_symbols: int, n_compu_methods: int, desc_path: str) -> Asap2Database:
+    """unprocessed database, half parameters and half signals; every 10th parameter is a map with axes and
+    every 100th symbol is a struct expanded from `desc_path`"""
+    compu_methods = [CompuMethod(Coeffs(1.0 + i, 0.0), CompuMethodType.LINEAR, None, f'cm{i}', 'u')
+                     for i in range(n_compu_methods)]
+    parameters = []
+    signals = []
+    for i in range(n_symbols):
+        address = hex(0x3ffb0000 + 16 * i)
+        cm = f'cm{(i * 7919) % n_compu_methods}'
+        db_desc = 'bench_struct' if i % 100 == 99 else None
+        if i % 2:
+            signals.append(Asap2Signal(address, None, cm, 1, Datatype.UWORD, '', '', f'sig{i}', None, db_desc))
+        elif i % 20 == 0 and i >= 40:
+            parameters.append(Asap2Parameter(address, None, cm, 4, Datatype.UBYTE, '', '', f'map{i}',
+                                             ParameterType.MAP, f'par{i - 38}', f'par{i - 36}', None, db_desc))
+        else:
+            parameters.append(Asap2Parameter(address, None, cm, 1, Datatype.UBYTE, '', '', f'par{i}',
+                                             ParameterType.VALUE, None, None, None, db_desc))
+    return Asap2Database(None, parameters, signals, ByteOrder.MSB_LAST, compu_methods, DBType.ASAP2, desc_path,
+                         'bench')
+
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--compu-methods', type=int, default=300)
+    parser.add_argument('--legacy-max', type=int, default=10000,
+                        help='the original processing is skipped for larger databases, it is quadratic')
+    args = parser.parse_args()
+
+    schema = marshmallow_dataclass.class_schema(Asap2Database)()
+    with tempfile.TemporaryDirectory() as tmp:
+        desc_path = str(Path(tmp) / 'desc.json')
+        Path(desc_path).write_text(json.dumps(STRUCT_DESC))
+        print(f'{"symbols":>8} {"before [s]":>11} {"after [s]":>10} {"speedup":>8} {"load_db [s]":>12} '
+              f'{"cached [s]":>11}')
+        for n in args.symbols:
+            if n <= args.legacy_max:
+                before = timed(legacy_process, make_raw_database(n, args.compu_methods, desc_path))
+            else:
+                before = float('nan')
+            after = timed(process_asap2_database, make_raw_database(n, args.compu_methods, desc_path))
+            db_path = Path(tmp) / f'db{n}.json'
+            db_path.write_text(json.dumps(schema.dump(make_raw_database(n, args.compu_methods, desc_path))))
+            load = timed(DataPool().load_db, str(db_path))
+            cached = timed(DataPool().load_db, str(db_path))
+            print(f'{n:>8} {before:>11.3f} {after:>10.3f} {before / after:>7.1f}x {load:>12.3f} {cached:>11.3f}')
+
+
+if __name__ == '__main__':
+    main()
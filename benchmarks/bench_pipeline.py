@@ -0,0 +1,230 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# samples/second and per batch latency of every stage a DAQ packet passes from the serial port to the chart:
+#   parse   XcpOnSxi frame parsing of the received bytes
+#   decode  XcpClient._daq_thread decoding of the DAQ queue into sample blocks
+#   pool    DataPool.on_new_xcp_block buffering of the blocks
+#   sample  DataPool.on_new_xcp_signal buffering through the per sample adapter of XcpClient
+#   chart   ChartWidget.update_bus_message_internal, skipped if PySide2 and pyqtgraph are not installed
+# A batch is what arrives within one `--slice-ms` of the stream, the chart is updated once per 100 ms like its
+# timer does. `realtime` is the achieved samples/s divided by the samples/s the configuration produces.
+# run from the repository root: python -m benchmarks.bench_pipeline --output results.json
+
+import argparse
+import collections
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.common import make_database, signal_sizes, make_packets, latency_stats
+from data.DataPool import DataPool, SignalConfig
+from device.DaqDecoder import DaqDecoder
+from device.XcpClient import XcpClient, BinPacker
+from device.transport.XcpOnSxi import XcpOnSxi
+
+CHANNEL = 'bench_event'
+
+
+def _timed(func, batches):
+    latencies = []
+    for batch in batches:
+        start = time.perf_counter()
+        func(batch)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _slices(items, n_slices):
+    bounds = np.linspace(0, len(items), n_slices + 1).astype(int)
+    return [items[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def stage_parse(stream_chunks):
+    transport = XcpOnSxi({'PORT': 'unused'})
+    transport.timing.start()
+    buf = bytearray()
+
+    def parse(chunk):
+        buf.extend(chunk)
+        transport._process_frames(buf, 0)
+    latencies = _timed(parse, stream_chunks)
+    return latencies, list(transport.daqQueue)
+
+
+def stage_decode(client, queue_slices):
+    blocks = []
+    client.event_listeners[XcpClient.RECV_BLOCK] = [blocks.append]
+    client.event_listeners[XcpClient.RECV] = []
+    slice_blocks = []
+
+    def decode(entries):
+        blocks.clear()
+        client._process_daq_queue(collections.deque(entries))
+        slice_blocks.append(list(blocks))
+    return _timed(decode, queue_slices), slice_blocks
+
+
+def stage_pool(data_pool, slice_blocks):
+    def buffer(blocks):
+        for block in blocks:
+            data_pool.on_new_xcp_block(block)
+    return _timed(buffer, slice_blocks)
+
+
+def stage_sample(client, data_pool, slice_blocks):
+    client.event_listeners[XcpClient.RECV_BLOCK] = []
+    client.event_listeners[XcpClient.RECV] = [data_pool.on_new_xcp_signal]
+
+    def buffer(blocks):
+        for block in blocks:
+            client._emit_block(block)
+    return _timed(buffer, slice_blocks)
+
+
+def make_chart(db):
+    """ChartWidget showing all signals of `db`, None if the GUI packages are not installed"""
+    try:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PySide2.QtWidgets import QApplication
+        from widgets.ChartWidget import ChartWidget, SignalChartProperties
+    except ImportError:
+        return None
+    app = QApplication.instance() or QApplication([])
+    chart = ChartWidget()
+    chart._app = app
+    for s in db.asap2_signals:
+        chart.on_signal_added(SignalChartProperties(s.name, f'{db.name}/{s.name}', '#ff0000', [None], ''))
+    return chart
+
+
+def stage_chart(chart, n_updates):
+    def update(_):
+        chart._update_time = datetime.min
+        chart.update_bus_message_internal(None)
+    return _timed(update, range(n_updates))
+
+
+def run_config(n_signals, odt_size, rate, n_events, slice_ms, chart_enabled):
+    db = make_database(n_signals)
+    sizes = signal_sizes(db)
+    data_pool = DataPool()
+    data_pool._databases[db.name] = db
+    data_pool.signal_config = {sid: SignalConfig(sid, CHANNEL, rate, True) for sid in sizes}
+    objs = {sid: data_pool.get_obj_by_sid(sid) for sid in sizes}
+
+    odts = BinPacker.pack(sizes, odt_size)
+    daq_list = OrderedDict([(CHANNEL, odts)])
+    client = XcpClient('XcpOnSxi', {}, db)
+    client.daq_list = daq_list
+    client.daq_decoder = DaqDecoder(daq_list, 'IDF_ABS_ODT_NUMBER', objs, db.byte_order)
+    client.daq_decoder.bind_pids({CHANNEL: 0})
+
+    packets = make_packets(odts, 0, n_events * len(odts))
+    stream = b''.join(XcpOnSxi.encode(p) for p in packets)
+    duration = n_events / rate
+    n_slices = max(1, int(round(duration * 1000 / slice_ms)))
+    samples = n_events * n_signals
+
+    data_pool.on_start_measurement()
+    # receive timestamps as if the stream started with the measurement
+    start = data_pool.start_time.timestamp()
+    latencies = {}
+    latencies['parse'], queue = stage_parse(_slices(stream, n_slices))
+    queue = [(response, counter, length, start + (i // len(odts)) / rate)
+             for i, (response, counter, length, _) in enumerate(queue)]
+    latencies['decode'], slice_blocks = stage_decode(client, _slices(queue, n_slices))
+    latencies['pool'] = stage_pool(data_pool, slice_blocks)
+    data_pool.on_start_measurement()
+    data_pool._start_time = datetime.fromtimestamp(start)
+    latencies['sample'] = stage_sample(client, data_pool, slice_blocks)
+    points = 0
+    if chart_enabled:
+        chart = make_chart(db)
+        if chart is not None:
+            n_updates = max(1, int(duration * 10))
+            latencies['chart'] = stage_chart(chart, n_updates)
+            points = n_signals * n_events
+            chart.close()
+
+    results = []
+    for stage, lat in latencies.items():
+        total = sum(lat)
+        p50, p99 = latency_stats(lat)
+        count = points if stage == 'chart' else samples
+        # the chart redraws the whole window every update, its rate is compared with the update timer
+        required = count / duration
+        results.append({
+            'stage': stage,
+            'signals': n_signals,
+            'odt_size': odt_size,
+            'odts': len(odts),
+            'rate': rate,
+            'events': n_events,
+            'batches': len(lat),
+            'samples': count,
+            'seconds': total,
+            'samples_per_s': count / total if total else float('inf'),
+            'p50_ms': p50,
+            'p99_ms': p99,
+            'realtime': (count / total) / required if total else float('inf'),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DAQ pipeline throughput per stage')
+    parser.add_argument('--signals', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--odt-size', type=int, nargs='+', default=[13, 61, 125],
+                        help='payload bytes of an ODT, 13 for the ESP32 example slave')
+    parser.add_argument('--rate', type=float, nargs='+', default=[100, 1000, 10000], help='event rate in Hz')
+    parser.add_argument('--events', type=int, default=500, help='events per configuration')
+    parser.add_argument('--slice-ms', type=float, default=10.0)
+    parser.add_argument('--no-chart', action='store_true')
+    parser.add_argument('--output', help='writes the results as JSON to this file')
+    args = parser.parse_args()
+
+    print(f'{"stage":>6} {"signals":>7} {"odt":>4} {"rate":>6} {"samples/s":>12} {"p50 [ms]":>9} '
+          f'{"p99 [ms]":>9} {"realtime":>9}')
+    results = []
+    # the random payloads contain NaN and out of range floats
+    np.seterr(invalid='ignore', over='ignore')
+    for n_signals in args.signals:
+        for odt_size in args.odt_size:
+            for rate in args.rate:
+                for r in run_config(n_signals, odt_size, rate, args.events, args.slice_ms, not args.no_chart):
+                    results.append(r)
+                    print(f'{r["stage"]:>6} {r["signals"]:>7} {r["odt_size"]:>4} {r["rate"]:>6.0f} '
+                          f'{r["samples_per_s"]:>12.0f} {r["p50_ms"]:>9.3f} {r["p99_ms"]:>9.3f} '
+                          f'{r["realtime"]:>8.1f}x')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
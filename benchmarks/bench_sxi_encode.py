@@ -0,0 +1,66 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# frames/second of the SxI frame encoding in XcpOnSxi.send, the per byte loop against bulk replacement.
+# run from the repository root: python -m benchmarks.bench_sxi_encode
+
+import argparse
+import random
+
+from benchmarks.common import measure
+from device.transport.XcpOnSxi import XcpOnSxi
+
+
+def legacy_encode(frame):
+    """the encoding of XcpOnSxi.send before it used bulk replacement"""
+    packed = []
+    for d in frame:
+        if d == XcpOnSxi.SLIP_SYNC:
+            packed.extend([XcpOnSxi.SLIP_ESC, XcpOnSxi.ESC_SYNC])
+        elif d == XcpOnSxi.SLIP_ESC:
+            packed.extend([XcpOnSxi.SLIP_ESC, XcpOnSxi.ESC_ESC])
+        else:
+            packed.append(d)
+    length = len(packed)
+    checksum = (sum(packed) + length) % 256
+    return bytes([XcpOnSxi.SLIP_SYNC, length] + packed + [checksum])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=50000)
+    args = parser.parse_args()
+
+    transport = XcpOnSxi({'PORT': 'unused'})
+    rnd = random.Random(0)
+    print(f'{"frame size":>10} {"before [frm/s]":>15} {"after [frm/s]":>15} {"speedup":>8}')
+    for size in [8, 14, 64, 120]:
+        frames = [bytes(rnd.getrandbits(8) for _ in range(size)) for _ in range(args.frames)]
+        assert all(legacy_encode(f) == transport.encode(f) for f in frames[:1000])
+        before = measure(lambda: [legacy_encode(f) for f in frames])
+        after = measure(lambda: [transport.encode(f) for f in frames])
+        print(f'{size:>10} {len(frames) / before:>15.0f} {len(frames) / after:>15.0f} {before / after:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
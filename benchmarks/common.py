@@ -0,0 +1,83 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import random
+import time
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+from data.Asap2Database import Asap2Database, Asap2Signal, Datatype, ByteOrder, CompuMethod, CompuMethodType, \
+    Coeffs, DBType
+from data.Asap2DatabaseUtil import process_asap2_database, size_of_asap2_object
+
+DATATYPES = [Datatype.UBYTE, Datatype.SWORD, Datatype.ULONG, Datatype.FLOAT32_IEEE, Datatype.FLOAT64_IEEE]
+
+
+def make_database(n_signals: int, name: str = 'bench', base_address: int = 0x3ffb0000) -> Asap2Database:
+    """a processed database with `n_signals` signals of mixed datatypes at consecutive addresses"""
+    compu_methods = [
+        CompuMethod(None, CompuMethodType.IDENTICAL, None, 'identical', '-'),
+        CompuMethod(Coeffs(0.1, -40), CompuMethodType.LINEAR, None, 'linear', 'degC'),
+    ]
+    signals = []
+    address = base_address
+    for i in range(n_signals):
+        dt = DATATYPES[i % len(DATATYPES)]
+        cm = 'linear' if dt in [Datatype.SWORD, Datatype.FLOAT32_IEEE] else 'identical'
+        signals.append(Asap2Signal(hex(address), None, cm, 1, dt, '', '', f'sig{i}', None, None))
+        address += 8
+    db = Asap2Database(None, [], signals, ByteOrder.MSB_LAST, compu_methods, DBType.ASAP2, None, name)
+    process_asap2_database(db)
+    return db
+
+
+def signal_sizes(db: Asap2Database) -> Dict[str, int]:
+    return {f'{db.name}/{s.name}': size_of_asap2_object(s) for s in db.asap2_signals}
+
+
+def make_packets(odts: List[Dict[str, int]], first_pid: int, count: int, seed: int = 0) -> List[bytes]:
+    """`count` DAQ packets with absolute ODT numbers, cycling through all ODTs"""
+    rnd = random.Random(seed)
+    packets = []
+    for i in range(count):
+        odt_no = i % len(odts)
+        payload = bytes(rnd.getrandbits(8) for _ in range(sum(odts[odt_no].values())))
+        packets.append(bytes([first_pid + odt_no]) + payload)
+    return packets
+
+
+def measure(func, *args, repeat: int = 3) -> float:
+    """best wall time of `repeat` runs in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def latency_stats(latencies: List[float]) -> Tuple[float, float]:
+    """p50 and p99 of latencies in seconds, in milliseconds"""
+    p50, p99 = np.percentile(latencies, [50, 99]) if latencies else (0.0, 0.0)
+    return float(p50) * 1e3, float(p99) * 1e3
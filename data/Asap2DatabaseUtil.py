@@ -21,12 +21,20 @@ __copyright__ = """
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import collections
+import functools
 import struct
-from typing import Union, Tuple, List, Dict
+from typing import Union, Tuple, List, Dict, Any
 import json
 
+import numpy as np
+
 from data.Asap2Database import Asap2Parameter, Asap2Signal, Datatype, Asap2Database, ByteOrder, CompuMethod, \
-    CompuMethodType, Alignment, ParameterType
+    Alignment, ParameterType
+from data.CompiledCompuMethod import compile_compu_method
+
+# resolved location and conversion of a symbol, address is an int and size in bytes
+SymbolEntry = collections.namedtuple('SymbolEntry', ['obj', 'address', 'size', 'datatype', 'compu_method'])
 
 
 def _gen_asap2_objects(o: Dict, parent_name: str):
@@ -40,32 +48,42 @@ def _gen_asap2_objects(o: Dict, parent_name: str):
         yield ret
 
 
+def _expand_db_desc(db: Asap2Database):
+    """replaces the symbols described by a struct in db_desc with one symbol per struct member"""
+    from pathlib import Path
+    contents = Path(db.db_desc).read_text()
+    desc = json.loads(contents)
+    objs = [s for s in db.asap2_parameters + db.asap2_signals if s.db_desc]
+    if not objs:
+        return
+    db.asap2_parameters[:] = [p for p in db.asap2_parameters if not p.db_desc]
+    db.asap2_signals[:] = [s for s in db.asap2_signals if not s.db_desc]
+    for o in objs:
+        for n in _gen_asap2_objects(desc[o.db_desc], o.name):
+            addr = hex(int(o.address, 0) + n['offset'])
+            name_splits = n['name'].split('.')
+            n_name = '.'.join(name_splits[:1] + name_splits[2:])
+            if n['type'] == 'parameter':
+                p = Asap2Parameter(addr, None, n['compu_method'], 1, Datatype[n['datatype']],
+                                   '', '', n_name, ParameterType.VALUE, None, None, n['unit'], '')
+                db.asap2_parameters.append(p)
+            if n['type'] == 'signal':
+                s = Asap2Signal(addr, None, n['compu_method'], 1, Datatype[n['datatype']],
+                                '', '', n_name, n['unit'], '')
+                db.asap2_signals.append(s)
+
+
+def _first_by_name(objs) -> Dict[str, Any]:
+    """key: name, value: the first object of that name"""
+    index = {}
+    for o in objs:
+        index.setdefault(o.name, o)
+    return index
+
+
 def process_asap2_database(db: Asap2Database):
     if db.db_desc:
-        from pathlib import Path
-        contents = Path(db.db_desc).read_text()
-        desc = json.loads(contents)
-        objs = []
-        for s in db.asap2_parameters + db.asap2_signals:
-            if s.db_desc:
-                objs.append(s)
-        for o in objs:
-            if o in db.asap2_parameters:
-                db.asap2_parameters.remove(o)
-            elif o in db.asap2_signals:
-                db.asap2_signals.remove(o)
-            for n in _gen_asap2_objects(desc[o.db_desc], o.name):
-                addr = hex(int(o.address, 0) + n['offset'])
-                name_splits = n['name'].split('.')
-                n_name = '.'.join(name_splits[:1] + name_splits[2:])
-                if n['type'] == 'parameter':
-                    p = Asap2Parameter(addr, None, n['compu_method'], 1, Datatype[n['datatype']],
-                                       '', '', n_name, ParameterType.VALUE, None, None, n['unit'], '')
-                    db.asap2_parameters.append(p)
-                if n['type'] == 'signal':
-                    s = Asap2Signal(addr, None, n['compu_method'], 1, Datatype[n['datatype']],
-                                    '', '', n_name, n['unit'], '')
-                    db.asap2_signals.append(s)
+        _expand_db_desc(db)
     if not db.alignment:
         db.alignment = Alignment(
             alignment_byte=1,
@@ -88,57 +106,107 @@ def process_asap2_database(db: Asap2Database):
             db.alignment.alignment_float32_ieee = 4
         if not db.alignment.alignment_float64_ieee:
             db.alignment.alignment_float64_ieee = 8
-    for s in db.asap2_parameters + db.asap2_signals:
-        s.parent = db
-        if s.compu_method:
-            cm = next((c for c in db.compu_methods if c.name == s.compu_method), None)
-            s.compu_method_ref = cm
-            s.identifier = '/'.join([db.name, s.name])
-            if not s.unit and cm.unit:
-                s.unit = cm.unit
-        if not s.count:
-            s.count = 1
-        if s.alignment:
-            if not s.alignment.alignment_byte:
-                s.alignment.alignment_byte = db.alignment.alignment_byte
-            if not db.alignment.alignment_word:
-                s.alignment.alignment_word = db.alignment.alignment_word
-            if not db.alignment.alignment_long:
-                s.alignment.alignment_long = db.alignment.alignment_long
-            if not db.alignment.alignment_int64:
-                s.alignment.alignment_int64 = db.alignment.alignment_int64
-            if not db.alignment.alignment_float32_ieee:
-                s.alignment.alignment_float32_ieee = db.alignment.alignment_float32_ieee
-            if not db.alignment.alignment_float64_ieee:
-                s.alignment.alignment_float64_ieee = db.alignment.alignment_float64_ieee
-        else:
-            s.alignment = db.alignment
+    compu_methods = _first_by_name(db.compu_methods)
     for s in db.asap2_parameters:
-        if s.ref_x:
-            x = next((p for p in db.asap2_parameters if p.name == s.ref_x), None)
-            s.ref_x_ref = x
-        if s.ref_y:
-            y = next((p for p in db.asap2_parameters if p.name == s.ref_y), None)
-            s.ref_x_ref = y
+        _process_asap2_object(db, s, compu_methods)
+    for s in db.asap2_signals:
+        _process_asap2_object(db, s, compu_methods)
+    parameters = _first_by_name(db.asap2_parameters)
+    for s in db.asap2_parameters:
+        _resolve_axis_refs(s, parameters)
+    db.symbol_index = build_symbol_index(db)
+
+
+def _process_asap2_object(db: Asap2Database, s: Union[Asap2Parameter, Asap2Signal],
+                          compu_methods: Dict[str, CompuMethod]):
+    s.parent = db
+    if s.compu_method:
+        cm = compu_methods.get(s.compu_method)
+        s.compu_method_ref = cm
+        s.identifier = '/'.join([db.name, s.name])
+        if not s.unit and cm and cm.unit:
+            s.unit = cm.unit
+    if not s.count:
+        s.count = 1
+    if s.alignment:
+        if not s.alignment.alignment_byte:
+            s.alignment.alignment_byte = db.alignment.alignment_byte
+        if not s.alignment.alignment_word:
+            s.alignment.alignment_word = db.alignment.alignment_word
+        if not s.alignment.alignment_long:
+            s.alignment.alignment_long = db.alignment.alignment_long
+        if not s.alignment.alignment_int64:
+            s.alignment.alignment_int64 = db.alignment.alignment_int64
+        if not s.alignment.alignment_float32_ieee:
+            s.alignment.alignment_float32_ieee = db.alignment.alignment_float32_ieee
+        if not s.alignment.alignment_float64_ieee:
+            s.alignment.alignment_float64_ieee = db.alignment.alignment_float64_ieee
+    else:
+        s.alignment = db.alignment
+
+
+def _resolve_axis_refs(s: Asap2Parameter, parameters: Dict[str, Asap2Parameter]):
+    s.ref_x_ref = parameters.get(s.ref_x) if s.ref_x else None
+    s.ref_y_ref = parameters.get(s.ref_y) if s.ref_y else None
+
+
+def _symbol_entry(obj: Union[Asap2Parameter, Asap2Signal]) -> SymbolEntry:
+    return SymbolEntry(obj, int(obj.address, 0), size_of_asap2_object(obj), obj.datatype,
+                       getattr(obj, 'compu_method_ref', None))
+
+
+def build_symbol_index(db: Asap2Database) -> Dict[str, SymbolEntry]:
+    """key: symbol name. Of several symbols with the same name the first one wins, parameters come before
+    signals, the same as the linear search over asap2_parameters + asap2_signals the lookups used to do"""
+    index = {}
+    for s in db.asap2_parameters + db.asap2_signals:
+        if s.name not in index:
+            index[s.name] = _symbol_entry(s)
+    return index
+
+
+def find_symbol(db: Asap2Database, obj_name: str) -> Union[SymbolEntry, None]:
+    index = getattr(db, 'symbol_index', None)
+    if index is None:
+        index = db.symbol_index = build_symbol_index(db)
+    return index.get(obj_name)
 
 
 def find_asap2_object(db: Asap2Database, obj_name: str):
-    return next((s for s in db.asap2_parameters + db.asap2_signals if s.name == obj_name), None)
+    entry = find_symbol(db, obj_name)
+    return entry.obj if entry else None
+
+
+DATATYPE_SIZE = {
+    Datatype.A_INT64: 8,
+    Datatype.A_UINT64: 8,
+    Datatype.FLOAT32_IEEE: 4,
+    Datatype.FLOAT64_IEEE: 8,
+    Datatype.SBYTE: 1,
+    Datatype.SLONG: 4,
+    Datatype.SWORD: 2,
+    Datatype.UBYTE: 1,
+    Datatype.ULONG: 4,
+    Datatype.UWORD: 2
+}
+
+
+NUMPY_DATATYPE = {
+    Datatype.A_INT64: 'i8',
+    Datatype.A_UINT64: 'u8',
+    Datatype.FLOAT32_IEEE: 'f4',
+    Datatype.FLOAT64_IEEE: 'f8',
+    Datatype.SBYTE: 'i1',
+    Datatype.SLONG: 'i4',
+    Datatype.SWORD: 'i2',
+    Datatype.UBYTE: 'u1',
+    Datatype.ULONG: 'u4',
+    Datatype.UWORD: 'u2'
+}
 
 
 def size_of_datatype(dt: Datatype) -> int:
-    return {
-        Datatype.A_INT64: 8,
-        Datatype.A_UINT64: 8,
-        Datatype.FLOAT32_IEEE: 4,
-        Datatype.FLOAT64_IEEE: 8,
-        Datatype.SBYTE: 1,
-        Datatype.SLONG: 4,
-        Datatype.SWORD: 2,
-        Datatype.UBYTE: 1,
-        Datatype.ULONG: 4,
-        Datatype.UWORD: 2
-    }[dt]
+    return DATATYPE_SIZE[dt]
 
 
 def calc_deposit_from_datatype(dt: Datatype, alignment: Alignment) -> int:
@@ -184,33 +252,39 @@ def calc_phy_value_4_parameter(byts: bytes, obj: Asap2Parameter) -> \
         pass
 
 
+@functools.lru_cache(maxsize=None)
+def _raw_value_struct(datatype: Datatype, byte_order: ByteOrder) -> struct.Struct:
+    return struct.Struct(struct_format_of_byte_order(byte_order) + struct_format_of_datatype(datatype))
+
+
+def numpy_dtype_of_datatype(datatype: Datatype, byte_order: ByteOrder, deposit: int = 0) -> np.dtype:
+    """dtype of one element, a single field 'v' with `deposit` bytes per element if it is larger than the value.
+    The value is at the end of a larger deposit for MSB_FIRST, at its start for MSB_LAST"""
+    dtype = np.dtype(struct_format_of_byte_order(byte_order) + NUMPY_DATATYPE[datatype])
+    if deposit > dtype.itemsize:
+        offset = deposit - dtype.itemsize if byte_order == ByteOrder.MSB_FIRST else 0
+        return np.dtype({'names': ['v'], 'formats': [dtype], 'offsets': [offset], 'itemsize': deposit})
+    return dtype
+
+
 def bytes_to_single_raw_value(byts: bytes, datatype: Datatype, alignment: Alignment, byte_order: ByteOrder) -> \
         Union[int, float]:
-    bo = "big" if byte_order == ByteOrder.MSB_FIRST else "little"
-    fmt_endian = '>' if bo == "big" else '<'
-    if datatype in [Datatype.SBYTE, Datatype.SWORD, Datatype.SLONG, Datatype.A_INT64]:
-        return int.from_bytes(byts, byteorder=bo, signed=True)
-    elif datatype in [Datatype.UBYTE, Datatype.UWORD, Datatype.ULONG, Datatype.A_UINT64]:
-        return int.from_bytes(byts, byteorder=bo, signed=False)
-    elif datatype == Datatype.FLOAT32_IEEE:
-        return struct.unpack(f'{fmt_endian}f', byts)[0]
-    elif datatype == Datatype.FLOAT64_IEEE:
-        return struct.unpack(f'{fmt_endian}d', byts)[0]
+    """the value in `byts`, which may be a deposit larger than the datatype: the value is in its last bytes
+    for MSB_FIRST and in its first bytes for MSB_LAST"""
+    s = _raw_value_struct(datatype, byte_order)
+    return s.unpack_from(byts, len(byts) - s.size if byte_order == ByteOrder.MSB_FIRST else 0)[0]
 
 
 def raw_value_to_phy_value(raw_value: Union[int, float], compu_method: CompuMethod):
-    if not compu_method or compu_method.compu_method_type == CompuMethodType.IDENTICAL:
-        return raw_value
-    out = raw_value
-    if compu_method.compu_method_type == CompuMethodType.LINEAR:
-        val = raw_value * compu_method.coeffs.a + compu_method.coeffs.b
-        out = type(raw_value)(val)
-    elif compu_method.compu_method_type == CompuMethodType.DICT:
-        out = compu_method.dictionary[str(int(raw_value))]
-        return out
-    else:
-        raise Exception("unimplemented compu_method")
-    return type(raw_value)(out)
+    return compile_compu_method(compu_method).to_phy_value(raw_value)
+
+
+def bytes_to_raw_array(byts: bytes, count: int, datatype: Datatype, alignment: Alignment,
+                       byte_order: ByteOrder) -> np.ndarray:
+    """the raw values of an array of `count` elements, a view on `byts`"""
+    deposit = calc_deposit_from_datatype(datatype, alignment)
+    raw = np.frombuffer(byts, dtype=numpy_dtype_of_datatype(datatype, byte_order, deposit), count=count)
+    return raw['v'] if raw.dtype.names else raw
 
 
 def bytes_to_single_phy_value(byts: bytes, datatype: Datatype, alignment: Alignment, byte_order: ByteOrder,
@@ -223,17 +297,8 @@ def bytes_to_single_phy_value(byts: bytes, datatype: Datatype, alignment: Alignm
 def bytes_to_array_phy_value(byts: bytes, count: int, datatype: Datatype, alignment: Alignment, byte_order: ByteOrder,
                              compu_method: CompuMethod) \
         -> Tuple[List[int], List[Union[int, float]]]:
-    start = 0
-    deposit_size = calc_deposit_from_datatype(datatype, alignment)
-    ret_raw = []
-    ret_phy = []
-    for i in range(count):
-        raw_val, phy_val = bytes_to_single_phy_value(byts[start: start + deposit_size], datatype, alignment, byte_order,
-                                                     compu_method)
-        start += deposit_size
-        ret_raw.append(raw_val)
-        ret_phy.append(phy_val)
-    return ret_raw, ret_phy
+    raw = bytes_to_raw_array(byts, count, datatype, alignment, byte_order)
+    return raw.tolist(), compile_compu_method(compu_method).to_phy(raw).tolist()
 
 
 def calc_phy_value_4_signal(byts: bytes, obj: Asap2Signal) \
@@ -281,10 +346,8 @@ def calc_bytes_4_signal(phy_value: Union[int, float, List], obj: Asap2Signal) \
                                      obj.compu_method_ref)
 
 
-def raw_value_to_bytes(raw_value: Union[int, float], datatype: Datatype,
-                       byte_order: ByteOrder) -> bytes:
-    bo = "big" if byte_order == ByteOrder.MSB_FIRST else "little"
-    fmt_datatype = {
+def struct_format_of_datatype(dt: Datatype) -> str:
+    return {
         Datatype.SBYTE: 'b',
         Datatype.UBYTE: 'B',
         Datatype.SWORD: 'h',
@@ -295,29 +358,26 @@ def raw_value_to_bytes(raw_value: Union[int, float], datatype: Datatype,
         Datatype.A_UINT64: 'Q',
         Datatype.FLOAT32_IEEE: 'f',
         Datatype.FLOAT64_IEEE: 'd',
-    }[datatype]
-    fmt_endian = '>' if bo == "big" else '<'
-    return struct.pack(f'{fmt_endian}{fmt_datatype}', int(raw_value))
+    }[dt]
+
+
+def struct_format_of_byte_order(byte_order: ByteOrder) -> str:
+    return '>' if byte_order == ByteOrder.MSB_FIRST else '<'
+
+
+def is_integer_datatype(dt: Datatype) -> bool:
+    return dt not in (Datatype.FLOAT32_IEEE, Datatype.FLOAT64_IEEE)
+
+
+def raw_value_to_bytes(raw_value: Union[int, float], datatype: Datatype,
+                       byte_order: ByteOrder) -> bytes:
+    if is_integer_datatype(datatype):
+        raw_value = int(raw_value)
+    return _raw_value_struct(datatype, byte_order).pack(raw_value)
 
 
 def phy_value_to_raw_value(phy_value: Union[int, float, str], dt: Datatype, compu_method: CompuMethod):
-    if not compu_method or compu_method.compu_method_type == CompuMethodType.IDENTICAL:
-        return phy_value
-    out = None
-    if compu_method.compu_method_type == CompuMethodType.LINEAR:
-        val = (phy_value - compu_method.coeffs.b) / compu_method.coeffs.a
-        if dt in [Datatype.FLOAT32_IEEE, Datatype.FLOAT64_IEEE]:
-            out = float(val)
-        else:
-            out = int(val)
-    elif compu_method.compu_method_type == CompuMethodType.DICT:
-        dic = compu_method.dictionary
-        for k, v in dic.items():
-            if v == phy_value:
-                out = k
-    else:
-        raise Exception("unimplemented compu_method")
-    return out
+    return compile_compu_method(compu_method).to_raw_value(phy_value, is_integer_datatype(dt))
 
 
 def single_phy_value_to_bytes(phy_value: Union[int, float], dt: Datatype, bo: ByteOrder,
@@ -328,10 +388,14 @@ def single_phy_value_to_bytes(phy_value: Union[int, float], dt: Datatype, bo: By
 
 def array_phy_value_to_bytes(phy_value: List[Union[int, float]], dt: Datatype,
                              bo: ByteOrder, cm: CompuMethod) -> bytes:
-    ret = bytes()
-    for p in phy_value:
-        ret += single_phy_value_to_bytes(p, dt, bo, cm)
-    return ret
+    raw = np.asarray(compile_compu_method(cm).to_raw(np.asarray(phy_value), is_integer_datatype(dt)))
+    dtype = numpy_dtype_of_datatype(dt, bo)
+    if is_integer_datatype(dt) and raw.size:
+        # astype wraps around silently, raise like struct does for a single value
+        info = np.iinfo(dtype)
+        if raw.min() < info.min or raw.max() > info.max:
+            raise struct.error(f'{dt.value} values shall be within {info.min}..{info.max}')
+    return raw.astype(dtype).tobytes()
 
 
 def phy_value_to_bytes(phy_value: Union[int, float, List],
@@ -0,0 +1,150 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Union, Any
+
+import numpy as np
+
+from data.Asap2Database import CompuMethod, CompuMethodType
+
+
+class CompiledCompuMethod(object):
+    """Raw <-> physical conversion of one compu method, resolved once for single values and numpy arrays.
+
+    Integer raw values convert to integers like raw_value_to_phy_value does: the linear result is truncated
+    towards zero. DICT compu methods become a lookup table, a dense one indexed by the raw value when the keys
+    span at most DENSE_SPAN values, otherwise a sorted key array searched with np.searchsorted. The reverse
+    table maps each physical value to its smallest raw key.
+    """
+    DENSE_SPAN = 1 << 16
+
+    def __init__(self, compu_method: Union[CompuMethod, None]):
+        self.compu_method_type = compu_method.compu_method_type if compu_method else CompuMethodType.IDENTICAL
+        if self.compu_method_type == CompuMethodType.IDENTICAL:
+            pass
+        elif self.compu_method_type == CompuMethodType.LINEAR:
+            self.a = compu_method.coeffs.a
+            self.b = compu_method.coeffs.b
+        elif self.compu_method_type == CompuMethodType.DICT:
+            self.table = {int(k): v for k, v in compu_method.dictionary.items()}
+            keys = sorted(self.table.keys())
+            self.keys = np.array(keys, dtype=np.int64)
+            self.values = make_column([self.table[k] for k in keys])
+            self.reverse_table = {}
+            for k in keys:
+                self.reverse_table.setdefault(self.table[k], k)
+            self.offset = keys[0] if keys else 0
+            if keys and keys[-1] - keys[0] < self.DENSE_SPAN:
+                # position of each raw value in keys/values, -1 where the raw value has no entry
+                self.dense = np.full(keys[-1] - keys[0] + 1, -1, dtype=np.int64)
+                self.dense[self.keys - self.offset] = np.arange(len(keys))
+            else:
+                self.dense = None
+        else:
+            raise Exception("unimplemented compu_method")
+
+    def to_phy_value(self, raw_value: Union[int, float]) -> Any:
+        if self.compu_method_type == CompuMethodType.LINEAR:
+            return type(raw_value)(raw_value * self.a + self.b)
+        elif self.compu_method_type == CompuMethodType.DICT:
+            return self.table[int(raw_value)]
+        return raw_value
+
+    def to_phy(self, raw: np.ndarray) -> np.ndarray:
+        """converts a whole array of raw values"""
+        if self.compu_method_type == CompuMethodType.LINEAR:
+            phy = raw.astype(np.float64) * self.a + self.b
+            return phy if raw.dtype.kind == 'f' else np.trunc(phy).astype(np.int64)
+        elif self.compu_method_type == CompuMethodType.DICT:
+            return self.values[self._positions(raw)]
+        return raw
+
+    def to_raw_value(self, phy_value: Union[int, float, str], integer: bool = True) -> Union[int, float, str]:
+        """`integer`: the raw value is stored as an integer datatype"""
+        if self.compu_method_type == CompuMethodType.LINEAR:
+            raw_value = (phy_value - self.b) / self.a
+            return int(raw_value) if integer else float(raw_value)
+        elif self.compu_method_type == CompuMethodType.DICT:
+            return self.reverse_table[phy_value]
+        return phy_value
+
+    def to_raw(self, phy: np.ndarray, integer: bool = True) -> np.ndarray:
+        """converts a whole array of physical values"""
+        if self.compu_method_type == CompuMethodType.LINEAR:
+            raw = (np.asarray(phy, dtype=np.float64) - self.b) / self.a
+            return np.trunc(raw).astype(np.int64) if integer else raw
+        elif self.compu_method_type == CompuMethodType.DICT:
+            phy = np.asarray(phy)
+            reverse = self.reverse_table
+            if reverse and phy.dtype.kind in 'iuf' and all(type(v) in (int, float) for v in reverse.keys()):
+                # numeric tables are searched like the raw keys
+                values = np.array(sorted(reverse.keys()))
+                raws = np.array([reverse[v] for v in values.tolist()], dtype=np.int64)
+                positions = np.minimum(np.searchsorted(values, phy), len(values) - 1)
+                missing = values[positions] != phy
+                if missing.any():
+                    raise KeyError(phy[missing][0].item())
+                return raws[positions]
+            return np.fromiter((reverse[v] for v in phy.tolist()), dtype=np.int64, count=len(phy))
+        return phy
+
+    def _positions(self, raw: np.ndarray) -> np.ndarray:
+        keys = raw.astype(np.int64)
+        if self.dense is not None:
+            index = keys - self.offset
+            inside = (index >= 0) & (index < len(self.dense))
+            positions = np.full(len(keys), -1, dtype=np.int64)
+            positions[inside] = self.dense[index[inside]]
+        elif len(self.keys):
+            positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+            positions[self.keys[positions] != keys] = -1
+        else:
+            positions = np.full(len(keys), -1, dtype=np.int64)
+        missing = positions < 0
+        if missing.any():
+            raise KeyError(str(int(keys[missing][0])))
+        return positions
+
+
+def make_column(values: list) -> np.ndarray:
+    """numeric array of python numbers, object array of everything else (strings, lists, ...)"""
+    if all(type(v) in (int, float) for v in values):
+        return np.array(values)
+    col = np.empty(len(values), dtype=object)
+    for i, v in enumerate(values):
+        col[i] = v
+    return col
+
+
+def compile_compu_method(compu_method: Union[CompuMethod, None]) -> CompiledCompuMethod:
+    """the compiled form of `compu_method`, built on first use and kept with the compu method"""
+    if compu_method is None:
+        return _IDENTICAL
+    compiled = getattr(compu_method, '_compiled', None)
+    if compiled is None:
+        compiled = CompiledCompuMethod(compu_method)
+        compu_method._compiled = compiled
+    return compiled
+
+
+_IDENTICAL = CompiledCompuMethod(None)
@@ -22,29 +22,49 @@ __copyright__ = """
 """
 
 import collections
+import functools
 import json
+import time
 from datetime import datetime
 from threading import Lock
-from typing import Union, Dict
+from typing import Union, Dict, Tuple, Callable
 import numpy as np
 import marshmallow_dataclass
 from pathlib import Path
 
 from data.Asap2Database import Asap2Parameter, Asap2Signal, Asap2Database, CompuMethod, CompuMethodType, DBType
 from data.Asap2DatabaseUtil import process_asap2_database, find_asap2_object
+from data.SignalBuffer import SignalBuffer
+from data import DatabaseCache
+
+
+@functools.lru_cache(maxsize=None)
+def _asap2_schema():
+    return marshmallow_dataclass.class_schema(Asap2Database)()
 
 
 SignalConfig = collections.namedtuple('SignalConfig', ['sid', 'channel', 'rate', 'enabled'])
+# decoded samples of several signals sharing the same timestamps (seconds since epoch),
+# raw and phy map sid -> array with one value per timestamp
+SampleBlock = collections.namedtuple('SampleBlock', ['timestamps', 'raw', 'phy'])
 
 
 class DataPool(object):
     _instance = None
-    _signal_buffer = {}
+    _signal_buffer: Dict[str, SignalBuffer] = {}
     _signals = []
     _signal_config: Dict[str, SignalConfig] = {}
     _databases = {}
     _start_time = None
+    _clock: Union[Callable[[], float], None] = None
     _lock = Lock()
+    buffer_window = 120
+    # samples buffered of a signal whose rate is unknown, e.g. of an event channel without cycle
+    buffer_capacity = 1 << 16
+    # at most this many samples are buffered of a signal, whatever its rate
+    max_buffer_capacity = 1 << 22
+    _channel_rates: Dict[str, float] = {}  # key: event channel name, value: events per second
+    use_db_cache = True  # processed databases are cached next to their files, see DatabaseCache
 
     def __new__(cls):
         if cls._instance is None:
@@ -52,13 +72,19 @@ class DataPool(object):
         return cls._instance
 
     def load_db(self, db_path) -> Union[Asap2Database]:
-        content = Path(db_path).read_text()
+        db = DatabaseCache.load(db_path) if self.use_db_cache else None
+        if db is not None:
+            self._databases[db.name] = db
+            return db
+        content = Path(db_path).read_bytes()
         j = json.loads(content)
         if j['db_type'] == DBType.ASAP2.value:
-            asap2_schema = marshmallow_dataclass.class_schema(Asap2Database)()
+            asap2_schema = _asap2_schema()
             db = asap2_schema.load(j)
             process_asap2_database(db)
             self._databases[db.name] = db
+            if self.use_db_cache:
+                DatabaseCache.store(db_path, db, content)
             return db
 
     @property
@@ -98,13 +124,64 @@ class DataPool(object):
                 return cm.dictionary
 
     def on_new_xcp_signal(self, sid, raw_val, phy_val, timestamp):
+        # values of dictionary compu methods are buffered as raw value, the chart maps them to text by ticks
+        value = raw_val if isinstance(phy_val, str) else phy_val
         self._lock.acquire()
         new_x = (timestamp - self._start_time).total_seconds()
-        self._signal_buffer[sid] = np.append(self._signal_buffer[sid], [[new_x, phy_val]], axis=0)
-        if (new_x - float(self._signal_buffer[sid][0][0])) > 120:
-            self._signal_buffer[sid] = np.delete(self._signal_buffer[sid], 0, axis=0)
+        self._signal_buffer[sid].append(new_x, value)
         self._lock.release()
 
+    def on_new_xcp_block(self, block: SampleBlock):
+        if not len(block.timestamps) or self._start_time is None:
+            return
+        self._lock.acquire()
+        new_x = block.timestamps - self._start_time.timestamp()
+        for sid, phy in block.phy.items():
+            buf = self._signal_buffer.get(sid)
+            if buf is None:
+                continue
+            # values of dictionary compu methods are buffered as raw value, the chart maps them to text by ticks
+            values = phy if phy.dtype != object else block.raw[sid]
+            if values.dtype != object:
+                buf.extend(new_x, values)
+        self._lock.release()
+
+    def get_signal_data(self, sid, seconds=None) -> Union[Tuple[np.ndarray, np.ndarray], None]:
+        """zero-copy views of time and value of the buffered samples, optionally only the latest `seconds`"""
+        buf = self._signal_buffer.get(sid)
+        if buf is None:
+            return None
+        with self._lock:
+            return buf.view() if seconds is None else buf.latest(seconds)
+
+    def get_last_value(self, sid) -> Union[Tuple[float, float], None]:
+        buf = self._signal_buffer.get(sid)
+        if buf is None:
+            return None
+        with self._lock:
+            return buf.last()
+
+    def set_channel_rate(self, channel: str, rate: Union[float, None]):
+        """events per second of a DAQ event channel, None if it is not cyclic. Sizes the buffers of its signals"""
+        if rate:
+            self._channel_rates[channel] = rate
+        else:
+            self._channel_rates.pop(channel, None)
+
+    def _buffer_capacity(self, sid):
+        """enough samples for `buffer_window` seconds at the rate of the signal"""
+        sc = self._signal_config.get(sid)
+        if sc is None:
+            return self.buffer_capacity
+        if sc.channel == 'polling':
+            rate = 1000 / sc.rate if sc.rate else None
+        else:
+            rate = self._channel_rates.get(sc.channel)
+        if rate is None:
+            return self.buffer_capacity
+        # a bit more than the window so that jitter of the rate does not cut it short
+        return min(self.max_buffer_capacity, int(self.buffer_window * rate * 1.1) + 1)
+
     def measure_signal(self, sid: str):
         if sid in self._signals:
             return
@@ -121,6 +198,18 @@ class DataPool(object):
     def start_time(self):
         return self._start_time
 
+    def set_clock(self, clock: Union[Callable[[], float], None]):
+        """clock: current time of the measurement in seconds since epoch like the SampleBlock timestamps, None
+        for the wall clock. A replay installs its position here so that the views follow the replayed time"""
+        self._clock = clock
+
+    def now(self) -> float:
+        """seconds since the start of the measurement, on the scale of the buffered time, 0 if not measuring"""
+        if self._start_time is None:
+            return 0.0
+        clock = self._clock
+        return (clock() if clock is not None else time.time()) - self._start_time.timestamp()
+
     @property
     def signal_buffer(self):
         return self._signal_buffer
@@ -128,7 +217,7 @@ class DataPool(object):
     def on_start_measurement(self):
         self._signal_buffer = {}
         for sid in self._signals:
-            self._signal_buffer[sid] = np.stack([[], []], axis=1)
+            self._signal_buffer[sid] = SignalBuffer(self._buffer_capacity(sid), self.buffer_window)
         self._start_time = datetime.now()
 
     def on_stop_measurement(self):
@@ -0,0 +1,80 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+from data import PickleCache
+from data.Asap2Database import Asap2Database
+
+# bump when the processed database changes its layout, e.g. new attributes set by process_asap2_database
+CACHE_VERSION = 1
+CACHE_DIR = '__dbcache__'
+
+
+def cache_path(db_path) -> Path:
+    db_path = Path(db_path)
+    return db_path.parent / CACHE_DIR / (db_path.name + '.pickle')
+
+
+def _digest(path: Path) -> str:
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+
+def _source_key(path: Path, digest: Union[str, None] = None) -> Tuple[int, int, str]:
+    st = path.stat()
+    return st.st_mtime_ns, st.st_size, digest or _digest(path)
+
+
+def _is_fresh(sources: Dict[str, Tuple[int, int, str]]) -> bool:
+    """a source is unchanged if mtime and size are unchanged, or else if the content hash is unchanged"""
+    for path, (mtime, size, digest) in sources.items():
+        path = Path(path)
+        try:
+            st = path.stat()
+        except OSError:
+            return False
+        if (st.st_mtime_ns, st.st_size) == (mtime, size):
+            continue
+        if st.st_size != size or _digest(path) != digest:
+            return False
+    return True
+
+
+def load(db_path) -> Union[Asap2Database, None]:
+    """the processed database cached for the file `db_path`, None if there is no cache or it is stale.
+
+    The cache is a pickle and unpickling runs code, so it is only as trustworthy as the directory of the
+    database: whoever may write the database file next to it may write its __dbcache__ as well."""
+    return PickleCache.read(cache_path(db_path),
+                            lambda header: header.get('version') == CACHE_VERSION and _is_fresh(header['sources']))
+
+
+def store(db_path, db: Asap2Database, content: bytes = None):
+    """caches the processed database `db` loaded from `db_path`, `content` is the file content already read"""
+    db_path = Path(db_path)
+    sources = {str(db_path): _source_key(db_path, hashlib.sha1(content).hexdigest() if content else None)}
+    if db.db_desc:
+        sources[str(Path(db.db_desc))] = _source_key(Path(db.db_desc))
+    PickleCache.write(cache_path(db_path), {'version': CACHE_VERSION, 'sources': sources}, db)
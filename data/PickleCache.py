@@ -0,0 +1,67 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import gc
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Callable, Union
+
+# A cache file holds two pickles: a small header dict, checked before anything else is read, and the cached
+# object. Failures only cost the speed up, so neither function raises.
+
+
+def read(path: Path, is_valid: Callable[[dict], bool]) -> Union[Any, None]:
+    """the object cached in `path` if `is_valid` accepts its header, None otherwise"""
+    try:
+        with open(path, 'rb') as f:
+            header = pickle.load(f)
+            if not isinstance(header, dict) or not is_valid(header):
+                return None
+            # the cyclic collector would otherwise run over and over while large object graphs are created
+            enabled = gc.isenabled()
+            gc.disable()
+            try:
+                return pickle.load(f)
+            finally:
+                if enabled:
+                    gc.enable()
+    except Exception:
+        # missing, truncated or written by an incompatible version
+        return None
+
+
+def write(path: Path, header: dict, obj: Any):
+    """writes `header` and `obj` to a temporary file and replaces `path` with it, so readers never see a
+    partial cache"""
+    tmp = path.with_name(path.name + f'.{os.getpid()}.tmp')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, 'wb') as f:
+            pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except Exception:
+        # a read-only location or an object pickle can not handle
+        if tmp.exists():
+            tmp.unlink()
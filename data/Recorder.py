@@ -0,0 +1,251 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Union
+
+import numpy as np
+
+from data.DataPool import SampleBlock
+
+# A recording is a directory:
+#   recording.json  version, start time and the signals, key: sid, value: number of the signal
+#   s<n>.time       float64 timestamps (seconds since epoch) of signal n, appended chunk by chunk
+#   s<n>.value      float64 values of signal n, row by row matching s<n>.time
+#   chunks.idx      one CHUNK_RECORD per chunk written, the sparse time index of all signals
+RECORDING_VERSION = 1
+META_FILE = 'recording.json'
+INDEX_FILE = 'chunks.idx'
+# signal number, first row, rows, first and last timestamp of the chunk
+CHUNK_RECORD = struct.Struct('<IQIdd')
+
+
+def column_files(path: Path, n: int):
+    return path / f's{n}.time', path / f's{n}.value'
+
+
+class _Column(object):
+    """samples of one signal waiting for the next chunk and the files they are appended to"""
+
+    def __init__(self, n: int, path: Path):
+        self.n = n
+        time_path, value_path = column_files(path, n)
+        self.time_file = open(time_path, 'ab')
+        self.value_file = open(value_path, 'ab')
+        self.rows = 0
+        self.pending_t: List[np.ndarray] = []
+        self.pending_v: List[np.ndarray] = []
+        self.pending_rows = 0
+        self.pending_since = None
+
+    def close(self):
+        self.time_file.close()
+        self.value_file.close()
+
+
+class Recorder(object):
+    """Writes the decoded samples of a measurement to a recording, see the layout above.
+
+    `on_new_xcp_block` is a RECV_BLOCK listener, it only queues the block. A writer thread collects the
+    samples per signal and appends them as one chunk when CHUNK_ROWS samples are collected or the oldest
+    one waited FLUSH_INTERVAL seconds, so the memory held is bounded by the chunk size and nothing is
+    rewritten. Values of dictionary compu methods are recorded as raw value like DataPool buffers them,
+    non numeric columns (strings, arrays) are not recorded.
+
+    At most MAX_QUEUE_SAMPLES samples wait for the writer, several seconds of a writer stall at a million
+    samples per second. Counting samples instead of blocks keeps the slack independent of how many ODTs a
+    measurement has. When the writer falls behind that far, e.g. on a slow disk, further blocks are dropped
+    and counted in `dropped_blocks` and `dropped_samples`, so a measurement never stalls on the recording.
+    With `block=True` the producer waits instead, for offline decoding where nothing is lost by waiting.
+    """
+    CHUNK_ROWS = 1 << 14
+    FLUSH_INTERVAL = 1.0
+    MAX_QUEUE_SAMPLES = 1 << 23
+
+    def __init__(self, path, block=False):
+        self.path = Path(path)
+        self.block = block
+        self._queue: queue.Queue = queue.Queue()
+        # samples in the queue, a block larger than the limit is still taken into an empty queue
+        self._queued_samples = 0
+        self._queue_space = threading.Condition()
+        self._thread: Union[threading.Thread, None] = None
+        self._columns: Dict[str, _Column] = {}
+        self._signals: Dict[str, int] = {}
+        self._index_file = None
+        self._error: Union[Exception, None] = None
+        self.start_time = None
+        self.samples = 0
+        self.chunks = 0
+        self.skipped_columns = 0
+        # most samples waiting for the writer at once
+        self.max_queue = 0
+        self.dropped_blocks = 0
+        self.dropped_samples = 0
+
+    @property
+    def recording(self):
+        return self._thread is not None
+
+    def start(self, start_time: datetime = None):
+        """start_time: of the measurement, now by default"""
+        if self._thread is not None:
+            raise Exception('recorder is already running')
+        self.path.mkdir(parents=True, exist_ok=True)
+        if (self.path / META_FILE).exists():
+            raise Exception(f'{self.path} contains a recording already')
+        self.start_time = start_time or datetime.now()
+        self._write_meta()
+        self._index_file = open(self.path / INDEX_FILE, 'ab')
+        self._thread = threading.Thread(target=self._writer_thread, name='recorder', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """writes everything queued so far and closes the recording"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        if self.dropped_blocks:
+            logging.warning(f'{self.dropped_blocks} blocks, {self.dropped_samples} samples not recorded to '
+                            f'{self.path}, the writer fell behind')
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def on_new_xcp_block(self, block: SampleBlock):
+        if self._thread is not None and len(block.timestamps):
+            n = len(block.timestamps) * len(block.phy)
+            with self._queue_space:
+                if self.block:
+                    self._queue_space.wait_for(lambda: self._queued_samples + n <= self.MAX_QUEUE_SAMPLES
+                                               or not self._queued_samples)
+                elif self._queued_samples + n > self.MAX_QUEUE_SAMPLES and self._queued_samples:
+                    self.dropped_blocks += 1
+                    self.dropped_samples += n
+                    return
+                self._queued_samples += n
+            self._queue.put(block)
+
+    def _writer_thread(self):
+        try:
+            while True:
+                try:
+                    block = self._queue.get(timeout=self.FLUSH_INTERVAL / 2)
+                except queue.Empty:
+                    block = False
+                if block is None:
+                    break
+                if block is not False:
+                    self._dequeued(block)
+                    self._add_block(block)
+                self._flush(time.monotonic() - self.FLUSH_INTERVAL)
+            self._flush(None)
+        except Exception as e:
+            self._error = e
+            # keep draining so that the producers never block on a dead recorder
+            while True:
+                block = self._queue.get()
+                if block is None:
+                    break
+                self._dequeued(block)
+        finally:
+            for column in self._columns.values():
+                column.close()
+            self._index_file.close()
+
+    def _dequeued(self, block: SampleBlock):
+        with self._queue_space:
+            self.max_queue = max(self.max_queue, self._queued_samples)
+            self._queued_samples -= len(block.timestamps) * len(block.phy)
+            self._queue_space.notify_all()
+
+    def _add_block(self, block: SampleBlock):
+        timestamps = np.asarray(block.timestamps, dtype=np.float64)
+        now = time.monotonic()
+        for sid, phy in block.phy.items():
+            values = phy if phy.dtype != object else block.raw[sid]
+            if values.dtype == object or values.dtype.kind not in 'biuf':
+                self.skipped_columns += 1
+                continue
+            column = self._columns.get(sid)
+            if column is None:
+                column = self._add_signal(sid)
+            column.pending_t.append(timestamps)
+            column.pending_v.append(values.astype(np.float64, copy=False))
+            column.pending_rows += len(timestamps)
+            if column.pending_since is None:
+                column.pending_since = now
+            if column.pending_rows >= self.CHUNK_ROWS:
+                self._write_chunk(column)
+
+    def _add_signal(self, sid: str) -> _Column:
+        n = len(self._signals)
+        self._signals[sid] = n
+        self._write_meta()
+        column = _Column(n, self.path)
+        self._columns[sid] = column
+        return column
+
+    def _flush(self, older_than: Union[float, None]):
+        """writes the chunks of all signals with samples waiting since before `older_than`, all if None"""
+        for column in self._columns.values():
+            if column.pending_rows and (older_than is None or column.pending_since <= older_than):
+                self._write_chunk(column)
+
+    def _write_chunk(self, column: _Column):
+        t = np.concatenate(column.pending_t) if len(column.pending_t) > 1 else column.pending_t[0]
+        v = np.concatenate(column.pending_v) if len(column.pending_v) > 1 else column.pending_v[0]
+        column.time_file.write(t.tobytes())
+        column.value_file.write(v.tobytes())
+        column.time_file.flush()
+        column.value_file.flush()
+        # the index only refers to data already handed to the OS
+        self._index_file.write(CHUNK_RECORD.pack(column.n, column.rows, len(t), t[0], t[-1]))
+        self._index_file.flush()
+        column.rows += len(t)
+        column.pending_t = []
+        column.pending_v = []
+        column.pending_rows = 0
+        column.pending_since = None
+        self.samples += len(t)
+        self.chunks += 1
+
+    def _write_meta(self):
+        meta = {
+            'version': RECORDING_VERSION,
+            'start_time': self.start_time.timestamp(),
+            'signals': self._signals,
+        }
+        tmp = self.path / (META_FILE + '.tmp')
+        tmp.write_text(json.dumps(meta, indent=1))
+        os.replace(tmp, self.path / META_FILE)
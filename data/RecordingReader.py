@@ -0,0 +1,140 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+
+from data.Recorder import RECORDING_VERSION, META_FILE, INDEX_FILE, CHUNK_RECORD, column_files
+
+# CHUNK_RECORD as numpy dtype, so the whole index is read at once
+CHUNK_DTYPE = np.dtype([('n', '<u4'), ('row', '<u8'), ('rows', '<u4'), ('t_first', '<f8'), ('t_last', '<f8')])
+assert CHUNK_DTYPE.itemsize == CHUNK_RECORD.size
+
+
+class _SignalIndex(object):
+    """chunks of one signal in row order and the memory maps of its columns"""
+
+    def __init__(self, path: Path, n: int, chunks: np.ndarray):
+        self.n = n
+        self.rows = int(chunks['row'][-1] + chunks['rows'][-1]) if len(chunks) else 0
+        self.row = chunks['row'].astype(np.int64)
+        self.t_first = chunks['t_first']
+        self.t_last = chunks['t_last']
+        time_path, value_path = column_files(path, n)
+        if self.rows:
+            self.time = np.memmap(time_path, dtype=np.float64, mode='r', shape=(self.rows,))
+            self.value = np.memmap(value_path, dtype=np.float64, mode='r', shape=(self.rows,))
+        else:
+            self.time = self.value = np.empty(0, dtype=np.float64)
+
+    def rows_between(self, t0: Union[float, None], t1: Union[float, None]) -> Tuple[int, int]:
+        """[first, last) rows with t0 <= time <= t1, the chunks are searched first, then the rows of the
+        chunks at the borders"""
+        first, last = 0, self.rows
+        if t0 is not None:
+            chunk = int(np.searchsorted(self.t_last, t0, side='left'))
+            if chunk == len(self.row):
+                return self.rows, self.rows
+            start = int(self.row[chunk])
+            first = start + int(np.searchsorted(self.time[start:self._chunk_end(chunk)], t0, side='left'))
+        if t1 is not None:
+            chunk = int(np.searchsorted(self.t_first, t1, side='right')) - 1
+            if chunk < 0:
+                return first, first
+            start = int(self.row[chunk])
+            last = start + int(np.searchsorted(self.time[start:self._chunk_end(chunk)], t1, side='right'))
+        return first, max(first, last)
+
+    def _chunk_end(self, chunk: int) -> int:
+        return int(self.row[chunk + 1]) if chunk + 1 < len(self.row) else self.rows
+
+
+class RecordingReader(object):
+    """Reads a recording written by Recorder without loading it into memory.
+
+    The columns of each signal are memory mapped and the chunk index is kept per signal, so a query for
+    a time range is two binary searches over the chunks and two inside the chunks at the borders. The
+    results are read only views of the mapped files, the OS pages in what is actually touched.
+
+    Only chunks already in the index are visible, `refresh` picks up the chunks a running recorder wrote
+    since.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.start_time = None
+        self._signals: Dict[str, _SignalIndex] = {}
+        self.refresh()
+
+    def refresh(self):
+        meta = json.loads((self.path / META_FILE).read_text())
+        if meta.get('version') != RECORDING_VERSION:
+            raise Exception(f'{self.path} has recording version {meta.get("version")}, '
+                            f'{RECORDING_VERSION} is supported')
+        self.start_time = meta['start_time']
+        index = np.fromfile(self.path / INDEX_FILE, dtype=CHUNK_DTYPE)
+        # a record cut off by a crash is dropped by fromfile already, chunks are in row order per signal
+        index = index[np.lexsort((index['row'], index['n']))]
+        bounds = np.searchsorted(index['n'], np.arange(len(meta['signals']) + 1))
+        self._signals = {sid: _SignalIndex(self.path, n, index[bounds[n]:bounds[n + 1]])
+                         for sid, n in meta['signals'].items()}
+
+    @property
+    def signals(self) -> List[str]:
+        return list(self._signals.keys())
+
+    def __contains__(self, sid):
+        return sid in self._signals
+
+    def __len__(self):
+        return len(self._signals)
+
+    def samples(self, sid: str) -> int:
+        return self._signals[sid].rows
+
+    def time_range(self, sid: str = None) -> Union[Tuple[float, float], None]:
+        """first and last timestamp of a signal or of the whole recording, None if there are no samples"""
+        indexes = [self._signals[sid]] if sid is not None else self._signals.values()
+        ranges = [(float(s.t_first[0]), float(s.t_last[-1])) for s in indexes if s.rows]
+        if not ranges:
+            return None
+        return min(r[0] for r in ranges), max(r[1] for r in ranges)
+
+    def read(self, sid: str, t0: float = None, t1: float = None) -> Tuple[np.ndarray, np.ndarray]:
+        """zero-copy views of the timestamps and values of `sid` with t0 <= timestamp <= t1, an open end
+        if None"""
+        s = self._signals[sid]
+        first, last = s.rows_between(t0, t1)
+        return s.time[first:last], s.value[first:last]
+
+    def query(self, sids: Iterable[str], t0: float = None, t1: float = None) -> \
+            Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """read of several signals, key: sid"""
+        return {sid: self.read(sid, t0, t1) for sid in sids}
+
+    def close(self):
+        """drops the memory maps, views handed out before keep their map alive"""
+        self._signals = {}
@@ -0,0 +1,127 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Tuple, Union
+
+import numpy as np
+
+
+class SignalBuffer(object):
+    """Fixed capacity store of the (time, value) samples of one signal.
+
+    The storage is twice the capacity. New samples are written behind the valid region, when the end of the
+    storage is reached the valid region is copied to the front of a new storage. So the valid region is always
+    contiguous and can be handed out as views without copying, while each sample is copied at most once per
+    `capacity` appends.
+
+    A sample is never overwritten once it is written: the storage behind the views returned by `view` and
+    `latest` is replaced instead of reused, so the views stay valid while another thread keeps appending.
+    """
+
+    def __init__(self, capacity: int, window: Union[float, None] = None):
+        if capacity <= 0:
+            raise ValueError('capacity of a signal buffer shall be positive')
+        self._capacity = capacity
+        self._window = window
+        self._time = np.empty(2 * capacity, dtype=np.float64)
+        self._value = np.empty(2 * capacity, dtype=np.float64)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def window(self):
+        return self._window
+
+    def clear(self):
+        if self._end:
+            self._time = np.empty_like(self._time)
+            self._value = np.empty_like(self._value)
+        self._start = 0
+        self._end = 0
+
+    def _compact(self):
+        n = self._end - self._start
+        time = np.empty_like(self._time)
+        value = np.empty_like(self._value)
+        time[:n] = self._time[self._start:self._end]
+        value[:n] = self._value[self._start:self._end]
+        self._time = time
+        self._value = value
+        self._start = 0
+        self._end = n
+
+    def _trim(self):
+        if self._end - self._start > self._capacity:
+            self._start = self._end - self._capacity
+        if self._window is not None and self._end > self._start:
+            oldest = self._end - 1
+            limit = self._time[oldest] - self._window
+            if self._time[self._start] < limit:
+                self._start += int(np.searchsorted(self._time[self._start:self._end], limit, side='left'))
+
+    def append(self, t: float, value: float):
+        if self._end == len(self._time):
+            self._compact()
+        self._time[self._end] = t
+        self._value[self._end] = value
+        self._end += 1
+        self._trim()
+
+    def extend(self, t: np.ndarray, value: np.ndarray):
+        n = len(t)
+        if n == 0:
+            return
+        if n >= self._capacity:
+            t = t[-self._capacity:]
+            value = value[-self._capacity:]
+            n = self._capacity
+            self.clear()
+        elif self._end + n > len(self._time):
+            self._compact()
+        self._time[self._end:self._end + n] = t
+        self._value[self._end:self._end + n] = value
+        self._end += n
+        self._trim()
+
+    def view(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self._time[self._start:self._end], self._value[self._start:self._end]
+
+    def latest(self, seconds: float) -> Tuple[np.ndarray, np.ndarray]:
+        """zero-copy views of the samples within the last `seconds` before the newest one"""
+        if self._end == self._start:
+            return self.view()
+        t = self._time[self._start:self._end]
+        first = self._start + int(np.searchsorted(t, t[-1] - seconds, side='left'))
+        return self._time[first:self._end], self._value[first:self._end]
+
+    def last(self) -> Union[Tuple[float, float], None]:
+        if self._end == self._start:
+            return None
+        return float(self._time[self._end - 1]), float(self._value[self._end - 1])
@@ -0,0 +1,354 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import collections
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+
+from data import Asap2DatabaseUtil
+from data.Asap2Database import Asap2Database, ByteOrder
+from data.DataPool import DataPool, SampleBlock
+from data.Recorder import Recorder
+from device.DaqDecoder import DaqDecoder
+
+# A capture is a single file of raw DAQ packets as received from the transport:
+#   CAPTURE_MAGIC, u32 size of the header, header as JSON (see XcpClient.start_measurement)
+#   then batches, one per drain of the DAQ queue:
+#     BATCH_HEADER          number of packets n, size of the payload in bytes
+#     f8[n]                 timestamps, seconds since epoch
+#     u2[n]                 transport counters
+#     u2[n]                 packet lengths
+#     u1[sum of lengths]    the packets, identification field included, back to back
+# all little endian. The layout of the DAQ lists is in the header, so a capture is decoded later
+# without the slave, see decode_capture.
+CAPTURE_MAGIC = b'DDPDAQ\r\n'
+CAPTURE_VERSION = 1
+CAPTURE_HEADER_SIZE = struct.Struct('<I')
+BATCH_HEADER = struct.Struct('<II')
+CaptureBatch = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]  # timestamps, counters, lengths, payload
+
+# batches are decoded together in byte ranges of this size, larger ranges when decoding in parallel
+# so that each worker gets a few ranges, up to RANGE_BYTES
+DECODE_BYTES = 1 << 22
+RANGE_BYTES = 1 << 26
+
+
+def layout_digest(objs: Dict[str, object], byte_order: ByteOrder) -> str:
+    """hash of everything in the database the decoding of the signals `objs` depends on, numbers are
+    normalized so that it is the same for a database built in memory and the one loaded from its JSON file"""
+    h = hashlib.sha1(str(byte_order).encode())
+    for sid in sorted(objs.keys()):
+        obj = objs[sid]
+        cm = getattr(obj, 'compu_method_ref', None)
+        h.update(repr((sid, obj.address, str(obj.datatype), obj.count, str(getattr(obj, 'parameter_type', None)),
+                       None if cm is None else (str(cm.compu_method_type),
+                                                cm.coeffs and (float(cm.coeffs.a), float(cm.coeffs.b)),
+                                                cm.dictionary and sorted((str(k), str(v))
+                                                                         for k, v in cm.dictionary.items())))).encode())
+    return h.hexdigest()
+
+
+class DaqCapture(object):
+    """Appends the raw packets of the DAQ queue to a capture file.
+
+    `append` only queues the drained packets, a writer thread packs them into one batch and writes it,
+    so the cost in the DAQ thread is a list per drain and not a decode per packet.
+    """
+
+    def __init__(self, path, header: dict):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.header = dict(header, version=CAPTURE_VERSION)
+        self._file = open(self.path, 'xb')
+        header_bytes = json.dumps(self.header).encode()
+        self._file.write(CAPTURE_MAGIC + CAPTURE_HEADER_SIZE.pack(len(header_bytes)) + header_bytes)
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._error: Union[Exception, None] = None
+        self.packets = 0
+        self.batches = 0
+        self.bytes = self._file.tell()
+        self._thread = threading.Thread(target=self._writer_thread, name='daq capture', daemon=True)
+        self._thread.start()
+
+    def append(self, packets: List[tuple]):
+        """packets: (response, counter, length, timestamp) as taken from the DAQ queue of the transport"""
+        if packets:
+            self._queue.put((packets, time.time()))
+
+    def close(self):
+        """writes everything queued so far and closes the file"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _writer_thread(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                self._write_batch(*item)
+        except Exception as e:
+            self._error = e
+            while self._queue.get() is not None:
+                pass
+        finally:
+            self._file.close()
+
+    def _write_batch(self, packets: List[tuple], received: float):
+        n = len(packets)
+        responses, counters, _, timestamps = zip(*packets)
+        timestamps = np.fromiter(timestamps, dtype='<f8', count=n)
+        # the transport leaves the timestamps 0 unless it creates them, the drain time is the best guess then
+        timestamps[timestamps == 0] = received
+        counters = np.fromiter(counters, dtype=np.int64, count=n).astype('<u2')
+        lengths = np.fromiter(map(len, responses), dtype='<u2', count=n)
+        payload = b''.join(responses)
+        f = self._file
+        f.write(BATCH_HEADER.pack(n, len(payload)))
+        f.write(timestamps.tobytes())
+        f.write(counters.tobytes())
+        f.write(lengths.tobytes())
+        f.write(payload)
+        f.flush()
+        self.packets += n
+        self.batches += 1
+        self.bytes += BATCH_HEADER.size + 12 * n + len(payload)
+
+
+def read_header(f) -> dict:
+    """reads the header of the capture open as `f`, leaves `f` at the first batch"""
+    if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+        raise Exception(f'{f.name} is not a DAQ capture')
+    size, = CAPTURE_HEADER_SIZE.unpack(f.read(CAPTURE_HEADER_SIZE.size))
+    header = json.loads(f.read(size))
+    if header.get('version') != CAPTURE_VERSION:
+        raise Exception(f'{f.name} has capture version {header.get("version")}, {CAPTURE_VERSION} is supported')
+    return header
+
+
+def batch_ranges(f, range_bytes: int) -> List[Tuple[int, int]]:
+    """splits the batches from the current position of `f` on into (start, end) byte ranges of about
+    `range_bytes`, only the batch headers are read. A batch cut off at the end of the file is dropped."""
+    ranges = []
+    start = f.tell()
+    size = os.fstat(f.fileno()).st_size
+    if size <= start:
+        return ranges
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        range_start = pos = start
+        while pos + BATCH_HEADER.size <= size:
+            n, payload_size = BATCH_HEADER.unpack_from(m, pos)
+            end = pos + BATCH_HEADER.size + 12 * n + payload_size
+            if end > size:
+                break
+            pos = end
+            if pos - range_start >= range_bytes:
+                ranges.append((range_start, pos))
+                range_start = pos
+        if pos > range_start:
+            ranges.append((range_start, pos))
+    return ranges
+
+
+def iter_batches(buf: bytes) -> Iterator[CaptureBatch]:
+    """the batches in `buf`, which holds whole batches only, as arrays viewing `buf`"""
+    pos = 0
+    while pos < len(buf):
+        n, payload_size = BATCH_HEADER.unpack_from(buf, pos)
+        pos += BATCH_HEADER.size
+        yield (np.frombuffer(buf, dtype='<f8', count=n, offset=pos),
+               np.frombuffer(buf, dtype='<u2', count=n, offset=pos + 8 * n),
+               np.frombuffer(buf, dtype='<u2', count=n, offset=pos + 10 * n),
+               np.frombuffer(buf, dtype=np.uint8, count=payload_size, offset=pos + 12 * n))
+        pos += 12 * n + payload_size
+
+
+def concat_batches(batches: List[CaptureBatch]) -> CaptureBatch:
+    if len(batches) == 1:
+        return batches[0]
+    return tuple(np.concatenate(parts) for parts in zip(*batches))
+
+
+def decode_batch(decoder: DaqDecoder, timestamps: np.ndarray, lengths: np.ndarray,
+                 payload: np.ndarray) -> List[SampleBlock]:
+    """decodes the packets of a batch, one SampleBlock per ODT in the order the packets were received"""
+    lengths = lengths.astype(np.int64)
+    offsets = np.zeros(len(lengths), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+    keys = decoder.packet_keys(payload, offsets, lengths)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else []
+    blocks = []
+    for start, end in zip(starts, list(starts[1:]) + [len(keys)]):
+        odt = decoder.odt_by_key(int(keys[start]))
+        if odt is None:
+            continue
+        sel = order[start:end]
+        sel = sel[lengths[sel] >= odt.size]
+        if not len(sel):
+            continue
+        records = payload[offsets[sel][:, None] + np.arange(odt.size)]
+        raw, phy = odt.decode_buffer(records)
+        blocks.append(SampleBlock(timestamps[sel], raw, phy))
+    return blocks
+
+
+def layout_objs(header: dict, db: Asap2Database, check_digest=True) -> Dict[str, object]:
+    """the objects of the signals in the DAQ layout of a capture header, looked up in `db`"""
+    if header['db'] != db.name:
+        raise Exception(f'the capture is of database {header["db"]}, not {db.name}')
+    objs = {}
+    for odts in header['daq_list'].values():
+        for odt in odts:
+            for sid in odt.keys():
+                entry = Asap2DatabaseUtil.find_symbol(db, sid.split('/')[-1])
+                if entry is None:
+                    raise Exception(f'{sid} not found in {db.name}')
+                objs[sid] = entry.obj
+    if check_digest and layout_digest(objs, db.byte_order) != header['db_digest']:
+        raise Exception(f'the signals of the capture differ in {db.name}')
+    return objs
+
+
+def decoder_of_header(header: dict, objs: Dict[str, object], byte_order: ByteOrder) -> DaqDecoder:
+    """the decoder of the DAQ layout stored in a capture header, see layout_objs"""
+    decoder = DaqDecoder(header['daq_list'], header['identification_field'], objs, byte_order,
+                         header['slave_byte_order'])
+    decoder.bind_pids(header['daq_list_pid'])
+    return decoder
+
+
+def _recordable(block: SampleBlock) -> SampleBlock:
+    """the columns of `block` as the Recorder takes them: numeric physical values as float64 and the raw
+    values only where the physical ones are not numeric"""
+    raw = {}
+    phy = {}
+    for sid, values in block.phy.items():
+        if values.dtype == object:
+            raw[sid] = block.raw[sid]
+            phy[sid] = values
+        elif values.dtype.kind in 'biuf':
+            phy[sid] = values.astype(np.float64, copy=False)
+        else:
+            phy[sid] = values
+    return SampleBlock(block.timestamps.copy(), raw, phy)
+
+
+_worker = None  # path and decoder of a decode process, see _init_worker
+
+
+def _init_worker(path, header: dict, objs: Dict[str, object], byte_order: ByteOrder):
+    global _worker
+    _worker = (path, decoder_of_header(header, objs, byte_order))
+
+
+def _decode_range(start: int, end: int, decoder: DaqDecoder = None, path=None) -> List[SampleBlock]:
+    """decodes the batches in the byte range of a capture, by the decoder of the process if not given"""
+    if decoder is None:
+        path, decoder = _worker
+    with open(path, 'rb') as f:
+        f.seek(start)
+        buf = f.read(end - start)
+    timestamps, _, lengths, payload = concat_batches(list(iter_batches(buf)))
+    return [_recordable(block) for block in decode_batch(decoder, timestamps, lengths, payload)]
+
+
+def decode_capture(path, db: Asap2Database, out, check_digest=True, workers: int = 1) -> Recorder:
+    """decodes the capture `path` into a new recording `out`, returns the stopped recorder.
+
+    The capture is split into byte ranges on batch boundaries. With more than one worker the ranges are
+    decoded in a pool of processes, each one compiles the ODT decoders once. The results are recorded in
+    the order of the ranges, so the samples of each signal stay in the order they were received.
+    """
+    with open(path, 'rb') as f:
+        header = read_header(f)
+        objs = layout_objs(header, db, check_digest)
+        size = os.fstat(f.fileno()).st_size
+        range_bytes = min(max(size // (workers * 4), DECODE_BYTES), RANGE_BYTES) if workers > 1 else DECODE_BYTES
+        ranges = batch_ranges(f, range_bytes)
+    recorder = Recorder(out, block=True)
+    recorder.start(datetime.fromtimestamp(header['start_time']))
+    try:
+        if workers <= 1 or len(ranges) <= 1:
+            decoder = decoder_of_header(header, objs, db.byte_order)
+            for start, end in ranges:
+                for block in _decode_range(start, end, decoder, path):
+                    recorder.on_new_xcp_block(block)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(path, header, objs, db.byte_order)) as pool:
+                # a few ranges ahead of the recorder keep the workers busy without holding the whole capture
+                pending = collections.deque()
+                ranges = iter(ranges)
+                for start, end in itertools.islice(ranges, 2 * workers):
+                    pending.append(pool.submit(_decode_range, start, end))
+                while pending:
+                    blocks = pending.popleft().result()
+                    for start, end in itertools.islice(ranges, 1):
+                        pending.append(pool.submit(_decode_range, start, end))
+                    for block in blocks:
+                        recorder.on_new_xcp_block(block)
+    finally:
+        recorder.stop()
+    return recorder
+
+
+def main():
+    parser = argparse.ArgumentParser(description='decodes a DAQ capture into a recording')
+    parser.add_argument('capture')
+    parser.add_argument('--db', required=True, help='the database the capture was taken with')
+    parser.add_argument('--out', help='directory of the recording, next to the capture by default')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes decoding in parallel')
+    parser.add_argument('--force', action='store_true', help='decode even if the signals changed in the database')
+    args = parser.parse_args()
+    db = DataPool().load_db(args.db)
+    out = args.out or str(Path(args.capture).with_suffix(''))
+    start = time.perf_counter()
+    recorder = decode_capture(args.capture, db, out, check_digest=not args.force, workers=args.workers)
+    print(f'{recorder.samples} samples in {recorder.chunks} chunks decoded to {out} '
+          f'in {time.perf_counter() - start:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import struct
+from typing import Dict, List, Union, Callable, Tuple, Any
+
+import numpy as np
+
+from data.Asap2Database import Asap2Parameter, Asap2Signal, ParameterType, ByteOrder
+from data.Asap2DatabaseUtil import struct_format_of_datatype, struct_format_of_byte_order, bytes_to_phy_value
+from data.CompiledCompuMethod import compile_compu_method, make_column
+
+# size of the identification field in front of the ODT data, by DAQ_KEY_BYTE identification field type
+IDENTIFICATION_FIELD_SIZE = {
+    'IDF_ABS_ODT_NUMBER': 1,
+    'IDF_REL_ODT_NUMBER_ABS_DAQ_LIST_NUMBER_BYTE': 2,
+    'IDF_REL_ODT_NUMBER_ABS_DAQ_LIST_NUMBER_WORD': 3,
+    'IDF_REL_ODT_NUMBER_ABS_DAQ_LIST_NUMBER_WORD_ALIGNED': 4
+}
+
+
+def _compile_field(obj: Union[Asap2Parameter, Asap2Signal], size: int, byte_order: ByteOrder) -> \
+        Tuple[str, Callable[[Any], Tuple[Any, Any]]]:
+    """struct format and raw -> (raw, phy) conversion of one signal inside an ODT. The value is at the end of
+    a deposit larger than the datatype for MSB_FIRST, at its start for MSB_LAST, see bytes_to_single_raw_value"""
+    if type(obj) is Asap2Signal or (type(obj) is Asap2Parameter and obj.parameter_type == ParameterType.VALUE):
+        fmt = struct_format_of_datatype(obj.datatype)
+        padding = size - struct.calcsize('<' + fmt)
+        if padding >= 0:
+            to_phy = compile_compu_method(getattr(obj, 'compu_method_ref', None)).to_phy_value
+            if byte_order == ByteOrder.MSB_FIRST:
+                return 'x' * padding + fmt, lambda raw: (raw, to_phy(raw))
+            return fmt + 'x' * padding, lambda raw: (raw, to_phy(raw))
+    # arrays, strings and everything else go through the generic path on the raw bytes
+    return f'{size}s', lambda raw: bytes_to_phy_value(raw, obj)
+
+
+class OdtDecoder(object):
+    """decodes all signals of one ODT with a single unpack_from"""
+
+    def __init__(self, daq_list_no: int, odt_no: int, header_size: int,
+                 odt: Dict[str, int], objs: Dict[str, Union[Asap2Parameter, Asap2Signal]], byte_order: ByteOrder):
+        self.daq_list_no = daq_list_no
+        self.odt_no = odt_no
+        self.header_size = header_size
+        self.sids: List[str] = list(odt.keys())
+        fmt = struct_format_of_byte_order(byte_order)
+        self.converters = []
+        self.column_converters = []
+        dtype_formats = []
+        dtype_offsets = []
+        offset = header_size
+        for sid, size in odt.items():
+            obj = objs[sid]
+            field_fmt, converter = _compile_field(obj, size, byte_order)
+            fmt += field_fmt
+            self.converters.append(converter)
+            code = field_fmt.strip('x')
+            dtype_offsets.append(offset + len(field_fmt) - len(field_fmt.lstrip('x')))
+            offset += size
+            if field_fmt.endswith('s'):
+                # void keeps trailing NUL bytes, numpy's S dtype strips them
+                dtype_formats.append(f'V{size}')
+                self.column_converters.append(None)
+            else:
+                # struct 'l'/'L' are 4 bytes in standard size, numpy follows the platform's C long
+                dtype_formats.append(np.dtype(fmt[0] + {'l': 'i4', 'L': 'u4'}.get(code, code)))
+                self.column_converters.append(compile_compu_method(getattr(obj, 'compu_method_ref', None)).to_phy)
+        self.struct = struct.Struct(fmt)
+        self.size = header_size + self.struct.size
+        self.dtype = np.dtype({'names': [f'f{i}' for i in range(len(self.sids))],
+                               'formats': dtype_formats,
+                               'offsets': dtype_offsets,
+                               'itemsize': self.size})
+
+    def unpack(self, response: bytes) -> tuple:
+        return self.struct.unpack_from(response, self.header_size)
+
+    def decode(self, response: bytes) -> List[Tuple[str, Any, Any]]:
+        """returns [(sid, raw value, physical value)] of all signals in the ODT"""
+        raws = self.struct.unpack_from(response, self.header_size)
+        return [(sid, *conv(raw)) for sid, conv, raw in zip(self.sids, self.converters, raws)]
+
+    def decode_block(self, responses: List[bytes]) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """decodes packets of this ODT at once, returns raw and physical columns keyed by sid"""
+        size = self.size
+        buf = b''.join(r if len(r) == size else r[:size] for r in responses)
+        return self.decode_buffer(buf)
+
+    def decode_buffer(self, buf) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """decodes a buffer of consecutive packets of this ODT, each exactly `size` bytes"""
+        records = np.frombuffer(buf, dtype=self.dtype)
+        raw = {}
+        phy = {}
+        for i, (sid, conv) in enumerate(zip(self.sids, self.column_converters)):
+            column = records[f'f{i}']
+            if conv is None:
+                values = [self.converters[i](bytes(r)) for r in column.tolist()]
+                raw[sid] = make_column([v[0] for v in values])
+                phy[sid] = make_column([v[1] for v in values])
+            else:
+                raw[sid] = column
+                phy[sid] = conv(column)
+        return raw, phy
+
+
+class DaqDecoder(object):
+    """ODT decoders of all DAQ lists of a measurement and the lookup from DAQ packet header to ODT
+
+    The decoders are compiled once when the measurement is set up, the PIDs are bound when the DAQ lists
+    are started since only then the slave reports the first PID of each list.
+    """
+
+    def __init__(self, daq_list: Dict[str, List[Dict[str, int]]], identification_field: str,
+                 objs: Dict[str, Union[Asap2Parameter, Asap2Signal]], byte_order: ByteOrder,
+                 slave_byte_order: str = 'INTEL'):
+        self.identification_field = identification_field
+        self.header_size = IDENTIFICATION_FIELD_SIZE[identification_field]
+        self.channels: List[str] = list(daq_list.keys())
+        self.odts: List[List[OdtDecoder]] = []
+        for daq_list_no, odts in enumerate(daq_list.values()):
+            self.odts.append([OdtDecoder(daq_list_no, odt_no, self.header_size, odt, objs, byte_order)
+                              for odt_no, odt in enumerate(odts)])
+        self._daq_list_number = struct.Struct('<H' if slave_byte_order == 'INTEL' else '>H')
+        self._pid_table: List[Union[OdtDecoder, None]] = [None] * 256
+
+    def bind_pids(self, first_pids: Dict[str, int]):
+        """first_pids: key: channel name, value: first PID of the DAQ list reported by START_STOP_DAQ_LIST"""
+        self._pid_table = [None] * 256
+        for channel, odts in zip(self.channels, self.odts):
+            if channel not in first_pids:
+                continue
+            last_pid = first_pids[channel] + len(odts) - 1
+            if first_pids[channel] < 0 or last_pid > 0xFF:
+                raise Exception(f'PIDs {first_pids[channel]}..{last_pid} of the DAQ list of {channel} '
+                                f'exceed the identification field')
+            for odt in odts:
+                self._pid_table[first_pids[channel] + odt.odt_no] = odt
+
+    def lookup(self, response: bytes) -> Union[OdtDecoder, None]:
+        if self.header_size == 1:
+            odt = self._pid_table[response[0]]
+        else:
+            if self.header_size == 2:
+                daq_list_no = response[1]
+            else:
+                daq_list_no = self._daq_list_number.unpack_from(response, self.header_size - 2)[0]
+            if daq_list_no >= len(self.odts) or response[0] >= len(self.odts[daq_list_no]):
+                return None
+            odt = self.odts[daq_list_no][response[0]]
+        if odt is None or len(response) < odt.size:
+            return None
+        return odt
+
+    def packet_keys(self, payload: np.ndarray, offsets: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        """lookup keys of the packets at `offsets` with `lengths` in the uint8 array `payload`, -1 for packets
+        too short for the identification field. See odt_by_key."""
+        last = max(len(payload) - 1, 0)
+
+        def field(i):
+            return payload[np.minimum(offsets + i, last)].astype(np.int64)
+        if self.header_size == 1:
+            keys = field(0)
+        elif self.header_size == 2:
+            keys = field(1) * 256 + field(0)
+        else:
+            low, high = field(self.header_size - 2), field(self.header_size - 1)
+            if self._daq_list_number.format.startswith('>'):
+                low, high = high, low
+            keys = (high * 256 + low) * 256 + field(0)
+        keys[lengths < self.header_size] = -1
+        return keys
+
+    def odt_by_key(self, key: int) -> Union[OdtDecoder, None]:
+        """the ODT of a key returned by packet_keys: the PID or DAQ list number * 256 + ODT number"""
+        if key < 0:
+            return None
+        if self.header_size == 1:
+            return self._pid_table[key]
+        daq_list_no, odt_no = divmod(key, 256)
+        if daq_list_no >= len(self.odts) or odt_no >= len(self.odts[daq_list_no]):
+            return None
+        return self.odts[daq_list_no][odt_no]
@@ -45,7 +45,9 @@ class DeviceBase:
         pass
 
     @abstractmethod
-    def start_measurement(self):
+    def start_measurement(self, start_barrier=None):
+        """start_barrier: threading.Barrier to wait on right before the measurement actually starts, so that
+        several devices start together"""
         pass
 
     @abstractmethod
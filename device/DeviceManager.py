@@ -21,23 +21,42 @@ __copyright__ = """
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import Dict
+from pathlib import Path
+from typing import Dict, Callable, Union
 
 from device.DeviceBase import DeviceBase
+from device.ReplayDevice import ReplayDevice
 from device.XcpClient import XcpClient
 from data.DataPool import DataPool
+from data.Recorder import Recorder
 
 
 class TransportType(Enum):
     XcpOnSxi = "XcpOnSxi"
+    Replay = "Replay"  # plays the recording at "recording", "speed" is the replay speed, null as fast as possible
+
+
+class DeviceError(Exception):
+    """errors of a lifecycle operation, key: device name, value: exception raised by that device"""
+
+    def __init__(self, operation: str, errors: Dict[str, Exception]):
+        self.operation = operation
+        self.errors = errors
+        super(DeviceError, self).__init__('\n'.join(f'{name}: {e}' for name, e in errors.items()))
 
 
 class DeviceManager(object):
+    START_TIMEOUT = 10.0  # seconds the devices wait for each other before starting the measurement
+
     _instance = None
     _data_pool = DataPool()
     _devices: Dict[str, DeviceBase] = {}
     _connected = False
+    _recorder: Union[Recorder, None] = None
+    _finished_listeners = []
 
     def __new__(cls):
         if cls._instance is None:
@@ -48,9 +67,24 @@ class DeviceManager(object):
         for dev_cfg in config:
             for db_path in dev_cfg['database']:
                 db = self._data_pool.load_db(db_path)
-                dev = XcpClient(dev_cfg['transport'], dev_cfg, db)
+                if dev_cfg['transport'] == TransportType.Replay.value:
+                    dev = ReplayDevice(dev_cfg['recording'], dev_cfg.get('speed', 1.0), db)
+                else:
+                    dev = XcpClient(dev_cfg['transport'], dev_cfg, db)
                 self._devices[dev_cfg['name']] = dev
-                dev.add_event_listener(XcpClient.RECV, self._data_pool.on_new_xcp_signal)
+                dev.add_event_listener(XcpClient.RECV_BLOCK, self._data_pool.on_new_xcp_block)
+                if isinstance(dev, ReplayDevice):
+                    dev.add_event_listener(ReplayDevice.STOP_MEASUREMENT, self._on_replay_finished)
+
+    def add_measurement_finished_listener(self, listener: Callable[[], None]):
+        """listener() is called from a device thread when the measurement ends by itself, i.e. when all
+        devices are replays and all of them reached the end of their recording"""
+        self._finished_listeners.append(listener)
+
+    def _on_replay_finished(self):
+        if all(isinstance(dev, ReplayDevice) and dev.finished for dev in self._devices.values()):
+            for f in self._finished_listeners:
+                f()
 
     def get_device_by_db_name(self, db_name):
         for dev in self._devices.values():
@@ -69,31 +103,92 @@ class DeviceManager(object):
             if dev.db.name == db_name:
                 return dev.upload(sid)
 
+    def _run_parallel(self, func: Callable[[DeviceBase], None]) -> Dict[str, Exception]:
+        """calls func for all devices at once, returns the exceptions by device name"""
+        if not self._devices:
+            return {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=len(self._devices)) as pool:
+            futures = {name: pool.submit(func, dev) for name, dev in self._devices.items()}
+            for name, future in futures.items():
+                e = future.exception()
+                if e is not None:
+                    errors[name] = e
+        return errors
+
     def connect(self):
-        try:
-            for dev in self._devices.values():
-                dev.connect()
-        except Exception as e:
-            print(str(e))
-            for dev in self._devices.values():
-                dev.disconnect()
+        errors = self._run_parallel(lambda dev: dev.connect())
+        if errors:
+            def close(dev):
+                try:
+                    dev.disconnect()
+                except Exception:
+                    pass
                 dev.close()
-            return
+            self._run_parallel(close)
+            raise DeviceError('connect', errors)
         self._connected = True
 
     def disconnect(self):
-        for dev in self._devices.values():
-            dev.disconnect()
+        errors = self._run_parallel(lambda dev: dev.disconnect())
         self._connected = False
+        if errors:
+            raise DeviceError('disconnect', errors)
 
     def start_measurement(self):
-        for dev in self._devices.values():
-            dev.setup_measurement()
-            dev.start_measurement()
+        errors = self._run_parallel(lambda dev: dev.setup_measurement())
+        if errors:
+            raise DeviceError('setup measurement', errors)
+        # the slow part is done, the devices start their DAQ lists together
+        barrier = threading.Barrier(len(self._devices), timeout=self.START_TIMEOUT)
+
+        def start(dev):
+            try:
+                dev.start_measurement(barrier)
+            except Exception:
+                barrier.abort()
+                raise
+        errors = self._run_parallel(start)
+        if errors:
+            self._run_parallel(lambda dev: dev.stop_measurement())
+            raise DeviceError('start measurement', errors)
 
     def stop_measurement(self):
+        errors = self._run_parallel(lambda dev: dev.stop_measurement())
+        if errors:
+            raise DeviceError('stop measurement', errors)
+
+    def start_recording(self, path) -> Recorder:
+        """records the samples of all devices to the recording directory `path` until stop_recording"""
+        if self._recorder is not None:
+            raise Exception('recording is already running')
+        recorder = Recorder(path)
+        recorder.start()
+        for dev in self._devices.values():
+            dev.add_event_listener(XcpClient.RECV_BLOCK, recorder.on_new_xcp_block)
+        self._recorder = recorder
+        return recorder
+
+    def stop_recording(self) -> Union[Recorder, None]:
+        recorder = self._recorder
+        if recorder is None:
+            return None
+        self._recorder = None
         for dev in self._devices.values():
-            dev.stop_measurement()
+            dev.remove_event_listener(XcpClient.RECV_BLOCK, recorder.on_new_xcp_block)
+        recorder.stop()
+        return recorder
+
+    def set_capture(self, directory, live_decode=True):
+        """captures the raw DAQ packets of each device to `directory`/<device name>.daq during the next
+        measurement, None to stop capturing. See XcpClient.set_capture"""
+        for name, dev in self._devices.items():
+            if isinstance(dev, XcpClient):
+                dev.set_capture(None if directory is None else Path(directory) / f'{name}.daq', live_decode)
+
+    @property
+    def recorder(self) -> Union[Recorder, None]:
+        return self._recorder
 
     def close(self):
         for dev in self._devices.values():
@@ -0,0 +1,63 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import hashlib
+import os
+from pathlib import Path
+from typing import Union
+
+from data import PickleCache
+
+# bump when the cached capabilities change their layout
+CACHE_VERSION = 1
+
+# everything XcpClient.connect enumerates from a slave besides the connect response
+EcuCapabilities = collections.namedtuple('EcuCapabilities', 'daq_processor_info daq_resolution_info event_channels')
+
+
+def identity_key(*parts) -> str:
+    """key of a slave, from its identification and the properties reported on connect"""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def cache_dir() -> Path:
+    """per user cache directory: %LOCALAPPDATA%\\DaDuPo on windows, $XDG_CACHE_HOME/dadupo or ~/.cache/dadupo
+    elsewhere, so the cache neither depends on the working directory nor is shared with other users"""
+    if os.name == 'nt' and os.environ.get('LOCALAPPDATA'):
+        return Path(os.environ['LOCALAPPDATA']) / 'DaDuPo'
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'dadupo'
+
+
+def cache_path(key: str) -> Path:
+    return cache_dir() / f'ecu-{key}.pickle'
+
+
+def load(key: str) -> Union[EcuCapabilities, None]:
+    """the capabilities cached for the slave `key`, None if there are none"""
+    return PickleCache.read(cache_path(key),
+                            lambda header: header.get('version') == CACHE_VERSION and header.get('key') == key)
+
+
+def store(key: str, capabilities: EcuCapabilities):
+    PickleCache.write(cache_path(key), {'version': CACHE_VERSION, 'key': key}, capabilities)
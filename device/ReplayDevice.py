@@ -0,0 +1,212 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Union
+
+from data.Asap2Database import Asap2Database, CompuMethodType
+from data.Asap2DatabaseUtil import is_integer_datatype
+from data.CompiledCompuMethod import compile_compu_method
+from data.DataPool import DataPool, SampleBlock
+from data.RecordingReader import RecordingReader
+from device.DeviceBase import DeviceBase
+
+
+class ReplayDevice(DeviceBase):
+    """Plays a recording back as if it was measured, no ECU needed.
+
+    The samples are emitted as RECV_BLOCK events like XcpClient does, with the timestamps moved to the
+    start of the replay, so DataPool and the widgets see a live measurement. `speed` is the factor of the
+    recording time to the wall time, None replays as fast as possible. While replaying, the DataPool clock
+    follows the replay position.
+    """
+    START_MEASUREMENT = 'start_measurement'
+    STOP_MEASUREMENT = 'stop_measurement'  # listener(), called when the end of the recording is reached
+    RECV_BLOCK = 'recv_block'
+    TICK = 0.02        # seconds of wall time between two emits
+    FAST_STEP = 1.0    # seconds of recording time per emit when replaying as fast as possible
+
+    def __init__(self, path, speed: Union[float, None] = 1.0, db: Asap2Database = None):
+        self.path = path
+        self.db = db
+        self.data_pool = DataPool()
+        self.reader: Union[RecordingReader, None] = None
+        self.sids: List[str] = []
+        self.connected = False
+        self.run_measurement = False
+        self.finished = False
+        self.samples = 0
+        self.replay_thread = None
+        self._speed = speed
+        self._begin = 0.0        # first timestamp of the recording
+        self._duration = 0.0
+        self._origin = 0.0       # timestamp the beginning of the recording is replayed at
+        self._position = 0.0     # seconds of the recording replayed
+        self._anchor_position = 0.0
+        self._anchor_wall = 0.0
+        self._cursors: Dict[str, int] = {}
+        self.event_listeners = {self.RECV_BLOCK: [], self.START_MEASUREMENT: [], self.STOP_MEASUREMENT: []}
+        self.lock = threading.Lock()
+
+    @property
+    def speed(self) -> Union[float, None]:
+        return self._speed
+
+    @speed.setter
+    def speed(self, value: Union[float, None]):
+        self.lock.acquire()
+        self._anchor_position = self._position
+        self._anchor_wall = time.perf_counter()
+        self._speed = value
+        self.lock.release()
+
+    @property
+    def position(self) -> float:
+        """seconds of the recording replayed so far"""
+        return self._position
+
+    @property
+    def duration(self) -> float:
+        return self._duration
+
+    def clock(self) -> float:
+        """the replayed time, installed as DataPool clock during the replay"""
+        return self._origin + self._position
+
+    def connect(self):
+        self.reader = RecordingReader(self.path)
+        self.connected = True
+
+    def disconnect(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        self.connected = False
+
+    def close(self):
+        self.run_measurement = False
+
+    def download(self, name, value):
+        raise Exception(f'{name} can not be calibrated in a replay')
+
+    def upload(self, name):
+        """(raw, phy) of a recorded signal at the replay position like XcpClient.upload, None if it is not
+        recorded or has no sample yet"""
+        if self.reader is None or name not in self.reader:
+            return None
+        t, v = self.reader.read(name, None, self._begin + self._position)
+        if not len(v):
+            return None
+        value = v[-1].item()
+        obj = self.data_pool.get_obj_by_sid(name)
+        cm = getattr(obj, 'compu_method_ref', None)
+        if obj is None or cm is None:
+            return value, value
+        compiled = compile_compu_method(cm)
+        if cm.compu_method_type == CompuMethodType.DICT:
+            # the recorder keeps the raw value of dictionary compu methods
+            raw = int(value)
+            return raw, compiled.to_phy_value(raw)
+        return compiled.to_raw_value(value, is_integer_datatype(obj.datatype)), value
+
+    def setup_measurement(self):
+        """replays the recorded signals of the database that are enabled in the measurement configuration,
+        all recorded signals of the database if none is configured"""
+        self.reader.refresh()
+        recorded = [sid for sid in self.reader.signals
+                    if self.db is None or sid.split('/')[0] == self.db.name]
+        config = self.data_pool.signal_config
+        enabled = [sid for sid in recorded if sid in config and config[sid].enabled]
+        self.sids = enabled if any(sc.enabled for sc in config.values()) else recorded
+        time_range = self.reader.time_range()
+        self._begin, end = time_range if time_range else (0.0, 0.0)
+        self._duration = end - self._begin
+
+    def start_measurement(self, start_barrier=None):
+        self._cursors = {sid: 0 for sid in self.sids}
+        self._position = 0.0
+        self._anchor_position = 0.0
+        self.finished = False
+        self.samples = 0
+        if start_barrier is not None:
+            start_barrier.wait()
+        self._origin = time.time()
+        self._anchor_wall = time.perf_counter()
+        self.run_measurement = True
+        self.data_pool.set_clock(self.clock)
+        self.replay_thread = threading.Thread(target=self._replay_thread, name='replay', daemon=True)
+        self.replay_thread.start()
+
+    def stop_measurement(self):
+        self.run_measurement = False
+        if self.replay_thread is not None and self.replay_thread is not threading.current_thread():
+            self.replay_thread.join()
+        self.replay_thread = None
+        self.data_pool.set_clock(None)
+
+    def _replay_thread(self):
+        start = time.perf_counter()
+        while self.run_measurement:
+            self.lock.acquire()
+            if self._speed is None:
+                target = self._position + self.FAST_STEP
+            else:
+                target = self._anchor_position + (time.perf_counter() - self._anchor_wall) * self._speed
+            self.lock.release()
+            target = min(target, self._duration)
+            self._emit_until(target)
+            self._position = target
+            if target >= self._duration:
+                self.finished = True
+                break
+            if self._speed is not None:
+                time.sleep(self.TICK)
+        elapsed = time.perf_counter() - start
+        logging.info(f'replayed {self._position:.1f} s of {self.path} in {elapsed:.1f} s, {self.samples} samples')
+        if self.finished:
+            for f in self.event_listeners[self.STOP_MEASUREMENT]:
+                f()
+
+    def _emit_until(self, position: float):
+        """emits the samples of each signal recorded up to `position`, one block per signal"""
+        shift = self._origin - self._begin
+        for sid in self.sids:
+            t, v = self.reader.read(sid, None, self._begin + position)
+            cursor = self._cursors[sid]
+            if len(t) <= cursor:
+                continue
+            self._cursors[sid] = len(t)
+            self.samples += len(t) - cursor
+            values = v[cursor:]
+            block = SampleBlock(t[cursor:] + shift, {sid: values}, {sid: values})
+            for f in self.event_listeners[self.RECV_BLOCK]:
+                f(block)
+
+    def add_event_listener(self, event, listener):
+        self.event_listeners[event].append(listener)
+
+    def remove_event_listener(self, event, listener):
+        if listener in self.event_listeners[event]:
+            self.event_listeners[event].remove(listener)
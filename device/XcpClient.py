@@ -23,6 +23,8 @@ __copyright__ = """
 
 import binascii
 import collections
+import contextlib
+import heapq
 import logging
 import math
 import struct
@@ -42,20 +44,23 @@ from pyxcp.master.base import MasterBaseType
 from pyxcp.transport.base import BaseTransport, createTransport
 from pyxcp.types import GetDaqResolutionInfoResponse
 
-from pprint import pprint
 from typing import Dict, List, Tuple, Union
 
 from data import Asap2DatabaseUtil
 from data.Asap2Database import Asap2Database
-from data.Asap2DatabaseUtil import size_of_asap2_object
-from data.DataPool import DataPool, SignalConfig
+import numpy as np
+
+from data.CompiledCompuMethod import make_column
+from data.DataPool import DataPool, SignalConfig, SampleBlock
+from device.DaqCapture import DaqCapture, layout_digest
+from device.DaqDecoder import DaqDecoder, IDENTIFICATION_FIELD_SIZE
+from device import EcuCache
 from device.DeviceBase import DeviceBase
 from device.transport import *
 
 
 class MyMaster(Master):
 
-
     @staticmethod
     def seed2key(seed):
         return SeedNKeyResult.ACK, seed[:4] + bytes([0] * 5)
@@ -132,43 +137,207 @@ class MyMaster(Master):
                 raise SeedNKeyError("SeedAndKey DLL returned: {}".format(SeedNKeyResult(result).name))
 
 
+# one ODT entry, `signals` (key: sid, value: size) lie back to back from `address` on
+OdtEntry = collections.namedtuple('OdtEntry', 'address size signals')
+
+
 class BinPacker(object):
+    # item counts up to this are packed exactly, larger sets first-fit-decreasing
+    EXACT_LIMIT = 16
+    # upper bound of the nodes searched by the exact packing
+    EXACT_BUDGET = 100000
+
     def __init__(self):
         pass
 
     @staticmethod
-    def pack(items: Dict[str, int], bin_size: int):
-        # sorted by value in descending order
-        bins: List[typing.OrderedDict[str, int]] = []
-        bins_storage: List[int] = []
-        sorted_items = dict(sorted(items.items(), key=lambda pair: pair[1], reverse=True))
-        for var_name, var_size in sorted_items.items():
-            c_storage = []
-            c_index = []
-            filtered = [(i, b) for i, b in enumerate(bins_storage) if b + var_size <= bin_size]
-            if filtered:
-                c_index, c_storage = zip(*filtered)
-            if c_storage:
-                selected_index = c_index[c_storage.index(max(c_storage))]
-                bins_storage[selected_index] += var_size
-                bins[selected_index][var_name] = var_size
-            else:
-                # no bin found, open a new bin
-                bins_storage.append(var_size)
-                new_bin = OrderedDict()
-                new_bin[var_name] = var_size
-                bins.append(new_bin)
+    def coalesce(signals: Dict[str, Tuple[int, int]], max_entry_size: int, granularity: int = 1) -> List[OdtEntry]:
+        """merges signals (key: sid, value: (address, size)) at contiguous addresses into single ODT entries
+        of at most `max_entry_size` bytes"""
+        max_entry_size -= max_entry_size % granularity
+        entries = []
+        address = end = None
+        members = None
+        for sid, (addr, size) in sorted(signals.items(), key=lambda pair: pair[1]):
+            if members is not None and addr == end and end + size - address <= max_entry_size:
+                members[sid] = size
+                end += size
+                continue
+            if members is not None:
+                entries.append(OdtEntry(address, end - address, members))
+            address, end, members = addr, addr + size, OrderedDict([(sid, size)])
+        if members is not None:
+            entries.append(OdtEntry(address, end - address, members))
+        return entries
+
+    @staticmethod
+    def pack(items: Dict[str, int], bin_size: int, max_items: int = 0xFF):
+        """distributes the items (key: name, value: size) to as few bins of `bin_size` as possible, with at most
+        `max_items` items per bin. Small sets are solved exactly, larger ones first-fit-decreasing."""
+        sizes = sorted(items.items(), key=lambda pair: pair[1], reverse=True)
+        for name, size in sizes:
+            if size > bin_size:
+                raise Exception(f'{name} does not fit into a bin of {bin_size} bytes')
+        assignment = BinPacker._first_fit_decreasing([size for _, size in sizes], bin_size, max_items)
+        n_bins = max(assignment) + 1 if assignment else 0
+        lower_bound = max(math.ceil(sum(items.values()) / bin_size), math.ceil(len(items) / max_items))
+        if n_bins > lower_bound and len(sizes) <= BinPacker.EXACT_LIMIT:
+            exact = BinPacker._pack_exact([size for _, size in sizes], bin_size, max_items, n_bins, lower_bound)
+            if exact:
+                assignment = exact
+                n_bins = max(assignment) + 1
+        bins: List[typing.OrderedDict[str, int]] = [OrderedDict() for _ in range(n_bins)]
+        for (name, size), b in zip(sizes, assignment):
+            bins[b][name] = size
         return bins
 
+    @staticmethod
+    def _first_fit_decreasing(sizes: List[int], bin_size: int, max_items: int) -> List[int]:
+        """sizes in descending order, returns the bin index of each item"""
+        assignment = []
+        counts = []
+        # indices of the open bins by their free space, the first fitting bin is the smallest index
+        # among the heaps of free space >= size
+        by_free: List[List[int]] = [[] for _ in range(bin_size + 1)]
+        for size in sizes:
+            candidates = [(heap[0], free) for free, heap in enumerate(by_free[size:], size) if heap]
+            if candidates:
+                i, free = min(candidates)
+                heapq.heappop(by_free[free])
+            else:
+                i, free = len(counts), bin_size
+                counts.append(0)
+            counts[i] += 1
+            if counts[i] < max_items and free > size:
+                heapq.heappush(by_free[free - size], i)
+            assignment.append(i)
+        return assignment
+
+    @staticmethod
+    def _pack_exact(sizes: List[int], bin_size: int, max_items: int, upper_bound: int, lower_bound: int) \
+            -> Union[List[int], None]:
+        """depth first search for an assignment with less than `upper_bound` bins, sizes in descending order.
+        Returns None if there is none or the search budget is used up."""
+        best = None
+        best_bins = upper_bound
+        assignment = [0] * len(sizes)
+        free = []
+        counts = []
+        nodes = 0
+        remaining = [sum(sizes[k:]) for k in range(len(sizes) + 1)]
+
+        def search(k):
+            nonlocal best, best_bins, nodes
+            nodes += 1
+            if nodes > BinPacker.EXACT_BUDGET:
+                return True
+            if len(free) + math.ceil(max(0, remaining[k] - sum(free)) / bin_size) >= best_bins:
+                return False
+            if k == len(sizes):
+                best, best_bins = list(assignment), len(free)
+                return best_bins <= lower_bound
+            size = sizes[k]
+            tried = set()
+            for i in range(len(free)):
+                # bins with the same free space and item count are interchangeable
+                if free[i] < size or counts[i] >= max_items or (free[i], counts[i]) in tried:
+                    continue
+                tried.add((free[i], counts[i]))
+                free[i] -= size
+                counts[i] += 1
+                assignment[k] = i
+                done = search(k + 1)
+                free[i] += size
+                counts[i] -= 1
+                if done:
+                    return True
+            if len(free) + 1 < best_bins:
+                free.append(bin_size - size)
+                counts.append(1)
+                assignment[k] = len(free) - 1
+                done = search(k + 1)
+                free.pop()
+                counts.pop()
+                if done:
+                    return True
+            return False
+
+        search(0)
+        return best
+
 
 EventChannel = collections.namedtuple('EventChannel', 'name info channel_number')
+DaqSetupTiming = collections.namedtuple('DaqSetupTiming', 'odts entries commands seconds')
+# one upload of a polling group, members: [(sid, offset in the span, size, obj)]
+PollingSpan = collections.namedtuple('PollingSpan', 'address size members')
+# seconds of the EVENT_CHANNEL_TIME_UNIT reported by GET_DAQ_EVENT_INFO
+EVENT_CHANNEL_TIME_UNIT = {'1NS': 1e-9, '10NS': 1e-8, '100NS': 1e-7, '1US': 1e-6, '10US': 1e-5, '100US': 1e-4,
+                           '1MS': 1e-3, '10MS': 1e-2, '100MS': 1e-1, '1S': 1.0,
+                           '1PS': 1e-12, '10PS': 1e-11, '100PS': 1e-10}
+
+
+def event_channel_period(info) -> Union[float, None]:
+    """cycle of an event channel in seconds, None if the channel is not cyclic"""
+    unit = EVENT_CHANNEL_TIME_UNIT.get(str(info.eventChannelTimeUnit).split('_')[-1])
+    if not info.eventChannelTimeCycle or unit is None:
+        return None
+    return info.eventChannelTimeCycle * unit
+
+
+def plan_polling_spans(signals: List[Tuple[str, int, int, typing.Any]], max_size: int) -> List[PollingSpan]:
+    """merges signals (sid, address, size, obj) into as few address spans of at most `max_size` bytes as possible,
+    bytes in gaps between the signals are read along. Signals larger than `max_size` get a span of their own."""
+    spans = []
+    start = end = None
+    members = []
+    for sid, addr, size, obj in sorted(signals, key=lambda sig: (sig[1], sig[2])):
+        if members and max(end, addr + size) - start <= max_size:
+            end = max(end, addr + size)
+        else:
+            if members:
+                spans.append(PollingSpan(start, end - start, members))
+            start, end, members = addr, addr + size, []
+        members.append((sid, addr - start, size, obj))
+    if members:
+        spans.append(PollingSpan(start, end - start, members))
+    return spans
+
+
+# errors of a polling read that only cost the values of that cycle, the serial exceptions are OSErrors
+POLLING_ERRORS = (types.XcpResponseError, types.XcpTimeoutError, types.FrameSizeError, OSError)
+
+
+class PollingStats(object):
+    """how late the cycles of a polling group start against their deadlines, in seconds"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.cycles = 0
+        self.skipped = 0
+        self.late_total = 0.0
+        self.late_max = 0.0
+
+    def record(self, lateness):
+        self.cycles += 1
+        self.late_total += lateness
+        self.late_max = max(self.late_max, lateness)
+
+    @property
+    def late_mean(self):
+        return self.late_total / self.cycles if self.cycles else 0.0
+
+    def __repr__(self):
+        return f'{self.interval}ms: {self.cycles} cycles, {self.skipped} skipped, ' \
+               f'late mean {self.late_mean * 1000:.2f}ms max {self.late_max * 1000:.2f}ms'
 
 
 class XcpClient(DeviceBase):
     START_MEASUREMENT = 'start_measurement'
     STOP_MEASUREMENT = 'stop_measurement'
-    RECV = 'recv'
+    RECV = 'recv'              # listener(sid, raw, phy, datetime), called per sample
+    RECV_BLOCK = 'recv_block'  # listener(SampleBlock), called per ODT or polling group
     ERROR = 'error'
+    use_ecu_cache = True  # capabilities discovered on connect are cached by slave identity, see EcuCache
 
     def __init__(self, transport, config, db):
         import os
@@ -181,21 +350,37 @@ class XcpClient(DeviceBase):
         self.connected = False
         self.event_channels: Dict[str, EventChannel] = {}
         self.daq_list = OrderedDict()
+        self.daq_entries: typing.OrderedDict[str, List[List[OdtEntry]]] = OrderedDict()
         self.daq_resolution_info: Union[None, GetDaqResolutionInfoResponse] = None
         self.polling_thread = None
         self.daq_thread = None
         self.run_measurement = False
-        self.polling_signals = {}  # key: interval, value: [sid]
+        self.polling_signals = {}  # key: interval, value: [(sid, addr, size, obj)]
+        self.polling_plan: Dict[int, List[PollingSpan]] = {}  # key: interval
+        self.polling_stats: Dict[int, PollingStats] = {}
         self.daq_signals = {}      # key: channel name, value: [sid]
         self.asap2_objs = {}
         self.daq_processor_info = None
         self.daq_list_pid = {}
-        self.event_listeners = {self.RECV: [], self.ERROR: [], self.START_MEASUREMENT: [], self.STOP_MEASUREMENT: []}
+        self.daq_decoder: Union[None, DaqDecoder] = None
+        # layout of the DAQ lists configured on the slave during this connection, None if unknown
+        self.daq_fingerprint = None
+        # support of WRITE_DAQ_MULTIPLE by the slave, None until probed
+        self.write_daq_multiple: Union[None, bool] = None
+        self.daq_setup_timing: typing.OrderedDict[str, DaqSetupTiming] = OrderedDict()
+        # raw DAQ packets are written to capture_path during the next measurements, see set_capture
+        self.capture_path = None
+        self.capture_live_decode = True
+        self.capture: Union[None, DaqCapture] = None
+        self.event_listeners = {self.RECV: [], self.RECV_BLOCK: [], self.ERROR: [], self.START_MEASUREMENT: [],
+                                self.STOP_MEASUREMENT: []}
         self.lock = threading.Lock()
 
     def connect(self):
         ecu = MyMaster(self.transport, self.config)
         self.ecu = ecu
+        self.daq_fingerprint = None
+        self.write_daq_multiple = None
         ecu.connect()
         self.connected = True
         if ecu.slaveProperties.optionalCommMode:
@@ -210,21 +395,51 @@ class XcpClient(DeviceBase):
             ecu.cond_unlock('daq')
         if protection_status['calpag']:
             ecu.cond_unlock('calpag')
-        # gid = ecu.getId(0x1)
-        # result = ecu.fetch(gid.length)
-        daq_processor_info = ecu.getDaqProcessorInfo()
-        self.daq_processor_info = daq_processor_info
-        # pprint(daq_processor_info)
-        if daq_processor_info.daqProperties.daqConfigType == 'STATIC':
+        key = self._identity_key()
+        capabilities = EcuCache.load(key) if self.use_ecu_cache else None
+        if capabilities is None:
+            capabilities = self._discover_capabilities()
+            if self.use_ecu_cache:
+                EcuCache.store(key, capabilities)
+        else:
+            logging.debug(f'capabilities of {self.db.name} taken from the cache')
+        self.daq_processor_info = capabilities.daq_processor_info
+        self.daq_resolution_info = capabilities.daq_resolution_info
+        self.event_channels = OrderedDict((ec.name, ec) for ec in capabilities.event_channels)
+        for name, ec in self.event_channels.items():
+            period = event_channel_period(ec.info)
+            self.data_pool.set_channel_rate(name, 1 / period if period else None)
+        if self.daq_processor_info.daqProperties.daqConfigType == 'STATIC':
             raise Exception("static daq is not implemented")
         # todo: overload indication
-        self.daq_resolution_info = ecu.getDaqResolutionInfo()
 
+    def _identity_key(self):
+        """GET_ID and the properties of the connect response identify the slave for the capability cache"""
+        props = self.ecu.slaveProperties
+        identification = b''
+        try:
+            gid = self.ecu.getId(0x1)
+            if gid.mode & 0x01:
+                identification = bytes(gid.identification)
+            elif gid.length:
+                identification = self.ecu.fetch(gid.length)
+        except types.XcpResponseError:
+            # GET_ID is optional, the port at least tells apart slaves of the same kind
+            identification = self.config.get('port', '')
+        return EcuCache.identity_key(self.db.name, identification, props.byteOrder, props.maxCto, props.maxDto,
+                                     props.slaveBlockMode, props.protocolLayerVersion, props.transportLayerVersion)
+
+    def _discover_capabilities(self) -> EcuCache.EcuCapabilities:
+        ecu = self.ecu
+        daq_processor_info = ecu.getDaqProcessorInfo()
+        daq_resolution_info = ecu.getDaqResolutionInfo()
+        event_channels = []
         for ecn in range(daq_processor_info.maxEventChannel):
             eci = ecu.getDaqEventInfo(ecn)
             data = ecu.upload(eci.eventChannelNameLength)
             name = data.rstrip(b'\x00').decode("latin1")
-            self.event_channels[name] = EventChannel(name, eci, ecn)
+            event_channels.append(EventChannel(name, eci, ecn))
+        return EcuCache.EcuCapabilities(daq_processor_info, daq_resolution_info, event_channels)
 
     def get_daq_event_channels(self):
         res = {}
@@ -238,19 +453,23 @@ class XcpClient(DeviceBase):
     def setup_measurement(self):
         self.asap2_objs = {}
         self.polling_signals = {}
+        self.polling_plan = {}
         self.daq_signals = {}
         self.daq_list = OrderedDict()
+        self.daq_entries = OrderedDict()
         self.daq_list_pid = {}
         signal_addrs = {}
         signal_sizes = {}
-        odt_size = self.daq_resolution_info.maxOdtEntrySizeDaq
+        identification_field = self.daq_processor_info.daqKeyByte.Identification_Field
+        odt_size = self.ecu.slaveProperties.maxDto - IDENTIFICATION_FIELD_SIZE[identification_field]
+        entry_size = min(self.daq_resolution_info.maxOdtEntrySizeDaq, odt_size)
         granularity_size = self.daq_resolution_info.granularityOdtEntrySizeDaq
         for sid, sc in self.data_pool.signal_config.items():
             db_name = sid.split('/')[0]
             if not sc.enabled or db_name != self.db.name:
                 continue
             addr, size, obj = self.get_addr_size_by_name(sid.split('/')[-1])
-            if size > odt_size:
+            if size > entry_size and sc.channel != 'polling':
                 raise Exception(f'size of {sid} is too large')
             if addr % granularity_size != 0 or size % granularity_size != 0:
                 raise Exception(f'{sid} has wrong granularity size')
@@ -268,119 +487,332 @@ class XcpClient(DeviceBase):
                     self.daq_signals[sc.channel] = []
                 self.daq_signals[sc.channel].append(sid)
 
+        max_upload = self.ecu.slaveProperties.maxCto - 1
+        for interval, lst in self.polling_signals.items():
+            self.polling_plan[interval] = plan_polling_spans(lst, max_upload)
+
         for channel, lst in self.daq_signals.items():
-            signals_to_pack = {}
-            for sid in lst:
-                signals_to_pack[sid] = signal_sizes[sid]
-            self.daq_list[channel] = BinPacker.pack(signals_to_pack, odt_size)
+            entries = BinPacker.coalesce({sid: (signal_addrs[sid], signal_sizes[sid]) for sid in lst},
+                                         entry_size, granularity_size)
+            odts = BinPacker.pack(OrderedDict(enumerate(e.size for e in entries)), odt_size)
+            self.daq_entries[channel] = [[entries[i] for i in odt.keys()] for odt in odts]
+            # layout of the signals inside each ODT, as seen by the decoder
+            self.daq_list[channel] = [OrderedDict((sid, size) for e in odt for sid, size in e.signals.items())
+                                      for odt in self.daq_entries[channel]]
+        self.daq_decoder = DaqDecoder(self.daq_list,
+                                      identification_field,
+                                      self.asap2_objs,
+                                      self.db.byte_order,
+                                      self.ecu.slaveProperties.byteOrder)
 
         if self.daq_list:
             ecu = self.ecu
             if self.daq_processor_info.daqProperties.daqConfigType == 'STATIC':
                 ecu.clearDaqList()
+            elif self.daq_fingerprint == self._daq_fingerprint():
+                logging.debug('daq layout unchanged, reusing the configuration on the slave')
             else:
+                self.daq_fingerprint = None
+                self.daq_setup_timing = OrderedDict()
+                setup_start = time.perf_counter()
                 ecu.freeDaq()
                 ecu.allocDaq(len(self.daq_list))
-                for daq_list_no, odts in enumerate(self.daq_list.values()):
+                # the ALLOC_* commands are counted to the lists they allocate
+                durations = {channel: 0.0 for channel in self.daq_entries.keys()}
+                commands = {channel: 0 for channel in self.daq_entries.keys()}
+                for daq_list_no, (channel, odts) in enumerate(self.daq_entries.items()):
+                    start = time.perf_counter()
                     ecu.allocOdt(daq_list_no, len(odts))
-                for daq_list_no, odts in enumerate(self.daq_list.values()):
+                    durations[channel] += time.perf_counter() - start
+                    commands[channel] += 1
+                for daq_list_no, (channel, odts) in enumerate(self.daq_entries.items()):
+                    start = time.perf_counter()
                     for odt_number, odt_entries in enumerate(odts):
                         ecu.allocOdtEntry(daq_list_no, odt_number, len(odt_entries))
-                for daq_list_no, odt_list in enumerate(self.daq_list.values()):
-                    for odt_no, odt_entries in enumerate(odt_list):
-                        for entry_no, (entry_name, entry_size) in enumerate(odt_entries.items()):
-                            ecu.setDaqPtr(daq_list_no, odt_no, entry_no)
-                            ecu.writeDaq(0xFF, entry_size, 0x00, signal_addrs[entry_name])
-                for daq_list_no, (channel_name, odts) in enumerate(self.daq_list.items()):
-                    ecu.setDaqListMode(0, daq_list_no, self.event_channels[channel_name].channel_number, 1, 0)
-
-    def start_measurement(self):
-        self.run_measurement = True
+                    durations[channel] += time.perf_counter() - start
+                    commands[channel] += len(odts)
+                for daq_list_no, (channel, odts) in enumerate(self.daq_entries.items()):
+                    start = time.perf_counter()
+                    for odt_no, odt_entries in enumerate(odts):
+                        commands[channel] += self._write_odt(daq_list_no, odt_no, odt_entries)
+                    ecu.setDaqListMode(0, daq_list_no, self.event_channels[channel].channel_number, 1, 0)
+                    durations[channel] += time.perf_counter() - start
+                    commands[channel] += 1
+                    timing = DaqSetupTiming(len(odts), sum(map(len, odts)), commands[channel], durations[channel])
+                    self.daq_setup_timing[channel] = timing
+                    logging.info(f'daq setup {channel}: {timing.odts} odts, {timing.entries} entries, '
+                                 f'{timing.commands} commands in {timing.seconds * 1000:.1f}ms')
+                logging.info(f'daq setup of {len(self.daq_entries)} lists took '
+                             f'{(time.perf_counter() - setup_start) * 1000:.1f}ms')
+                self.daq_fingerprint = self._daq_fingerprint()
+
+    def _write_odt(self, daq_list_no, odt_no, entries: List[OdtEntry]) -> int:
+        """writes the entries of one ODT, returns the number of commands sent. The DAQ pointer is set once,
+        the slave increments it with every entry written. WRITE_DAQ_MULTIPLE is used when the slave accepts it."""
+        ecu = self.ecu
+        ecu.setDaqPtr(daq_list_no, odt_no, 0)
+        commands = 1
+        max_elements = ecu.slaveProperties.maxWriteDaqMultipleElements
+        if self.write_daq_multiple is not False and max_elements > 1 and len(entries) > 1:
+            try:
+                for i in range(0, len(entries), max_elements):
+                    ecu.writeDaqMultiple([dict(bitOffset=0xFF, size=e.size, address=e.address, addressExt=0)
+                                          for e in entries[i:i + max_elements]])
+                    commands += 1
+                self.write_daq_multiple = True
+                return commands
+            except types.XcpResponseError as e:
+                # the first command probes the support, nothing has been written if it is unknown to the slave
+                if self.write_daq_multiple or e.get_error_code() != 'ERR_CMD_UNKNOWN':
+                    raise
+                logging.info('WRITE_DAQ_MULTIPLE is not supported by the slave, falling back to WRITE_DAQ')
+                self.write_daq_multiple = False
+                ecu.setDaqPtr(daq_list_no, odt_no, 0)
+                commands += 2
+        for e in entries:
+            ecu.writeDaq(0xFF, e.size, 0x00, e.address)
+            commands += 1
+        return commands
+
+    def _daq_fingerprint(self):
+        """everything written to the slave by setup_measurement: event channel and entries of each DAQ list"""
+        return tuple((self.event_channels[channel].channel_number,
+                      tuple(tuple((e.address, e.size) for e in odt) for odt in odts))
+                     for channel, odts in self.daq_entries.items())
+
+    def start_measurement(self, start_barrier=None):
         ecu = self.ecu
         if self.daq_list:
             if self.daq_processor_info.daqProperties.daqConfigType == 'STATIC':
                 ecu.clearDaqList()
             else:
+                # select all lists first, START_STOP_SYNCH starts them at once
                 for daq_list_no, channel_name in enumerate(self.daq_list.keys()):
                     response = ecu.startStopDaqList(2, daq_list_no)
                     self.daq_list_pid[channel_name] = response.firstPid
-                    ecu.startStopSynch(1)
-            self.daq_thread = Thread(target=self._daq_thread)
-            self.daq_thread.start()
+            self.daq_decoder.bind_pids(self.daq_list_pid)
+            if self.capture_path is not None:
+                self.capture = self._open_capture()
+        try:
+            if start_barrier is not None:
+                start_barrier.wait()
+            self.run_measurement = True
+            if self.daq_list:
+                ecu.startStopSynch(1)
+                self.daq_thread = Thread(target=self._daq_thread)
+                self.daq_thread.start()
+        except Exception:
+            self.run_measurement = False
+            self._close_capture()
+            raise
         if self.polling_signals:
             self.polling_thread = Thread(target=self._polling_thread)
             self.polling_thread.start()
 
+    def set_capture(self, path, live_decode=True):
+        """captures the raw DAQ packets of the measurements started from now on to the file `path`, None to stop
+        capturing. Without `live_decode` the packets are only captured, decode them later with
+        `python -m device.DaqCapture`."""
+        self.capture_path = path
+        self.capture_live_decode = live_decode
+
+    def _open_capture(self) -> DaqCapture:
+        objs = {sid: self.asap2_objs[sid] for odts in self.daq_list.values() for odt in odts for sid in odt.keys()}
+        header = {
+            'db': self.db.name,
+            'db_digest': layout_digest(objs, self.db.byte_order),
+            'identification_field': self.daq_decoder.identification_field,
+            'slave_byte_order': self.ecu.slaveProperties.byteOrder,
+            'daq_list': self.daq_list,
+            'daq_list_pid': self.daq_list_pid,
+            'start_time': time.time(),
+        }
+        return DaqCapture(self.capture_path, header)
+
     def get_addr_size_by_name(self, s_name):
-        var = next((c for c in self.db.asap2_parameters if c.name == s_name), None)
-        if not var:
-            var = next((s for s in self.db.asap2_signals if s.name == s_name), None)
-            if not var:
-                raise Exception(f'{s_name} not found in a2l')
-            else:
-                addr, size = int(var.address, 0), size_of_asap2_object(var)
-        else:
-            addr, size = int(var.address, 0), size_of_asap2_object(var)
-        return addr, size, var
+        entry = Asap2DatabaseUtil.find_symbol(self.db, s_name)
+        if not entry:
+            raise Exception(f'{s_name} not found in a2l')
+        return entry.address, entry.size, entry.obj
 
     def stop_measurement(self):
+        """stops the DAQ lists first and then the threads, so the packets still in flight are decoded before it
+        returns"""
+        self.lock.acquire()
+        try:
+            self.ecu.startStopSynch(0)
+        finally:
+            self.lock.release()
+            self._join_threads()
+            # the DAQ thread closes the capture, unless the start failed before the thread was started
+            self._close_capture()
+        for stats in self.polling_stats.values():
+            logging.info(f'polling {stats}')
+
+    def _join_threads(self):
         self.run_measurement = False
-        self.ecu.startStopSynch(0)
+        for thread in (self.polling_thread, self.daq_thread):
+            if thread is not None:
+                thread.join()
+        self.polling_thread = None
+        self.daq_thread = None
 
     def _polling_thread(self):
+        """polls every group when it is due, cycles missed entirely are skipped instead of caught up"""
+        self.polling_stats = {interval: PollingStats(interval) for interval in self.polling_signals.keys()}
+        start = time.perf_counter()
+        deadlines = [(start, interval) for interval in self.polling_signals.keys()]
+        heapq.heapify(deadlines)
         while self.run_measurement:
-            for interval, lst in self.polling_signals.items():
-                for sid, addr, size, obj in lst:
-                    self.lock.acquire()
-                    try:
-                        raw_bytes = self.ecu.shortUpload(size, addr)
-                        raw_val, phy_val = Asap2DatabaseUtil.bytes_to_phy_value(raw_bytes, obj)
-                        for f in self.event_listeners[self.RECV]:
-                            f(sid, raw_val, phy_val, datetime.now())
-                    except:
-                        pass
-                    self.lock.release()
-                    # time.sleep(0.001)
-                time.sleep(interval / 1000)
+            due, interval = deadlines[0]
+            now = time.perf_counter()
+            if due > now:
+                # wake up now and then to notice the end of the measurement
+                time.sleep(min(due - now, 0.05))
+                continue
+            stats = self.polling_stats[interval]
+            stats.record(now - due)
+            self._poll_group(self.polling_plan[interval])
+            period = interval / 1000
+            due += period
+            now = time.perf_counter()
+            if due <= now:
+                missed = int((now - due) / period) + 1
+                stats.skipped += missed
+                due += missed * period
+            heapq.heapreplace(deadlines, (due, interval))
+
+    def _poll_group(self, spans: List[PollingSpan]):
+        timestamp = time.time()
+        raw = {}
+        phy = {}
+        for span in spans:
+            self.lock.acquire()
+            try:
+                raw_bytes = self._read_memory(span.address, span.size)
+            except POLLING_ERRORS as e:
+                logging.warning(f'polling {span.size} bytes at {span.address:#x} failed: {e!r}')
+                continue
+            finally:
+                self.lock.release()
+            for sid, offset, size, obj in span.members:
+                try:
+                    raw_val, phy_val = Asap2DatabaseUtil.bytes_to_phy_value(raw_bytes[offset:offset + size], obj)
+                except (KeyError, ValueError, struct.error) as e:
+                    logging.warning(f'decoding the polled value of {sid} failed: {e!r}')
+                    continue
+                raw[sid] = make_column([raw_val])
+                phy[sid] = make_column([phy_val])
+        if raw:
+            self._emit_block(SampleBlock(np.array([timestamp]), raw, phy))
+
+    def _read_memory(self, addr, size) -> bytes:
+        """one SHORT_UPLOAD if it fits into a CTO, SET_MTA and UPLOADs otherwise, caller holds the lock.
+        In slave block mode each UPLOAD fetches up to 255 bytes in consecutive responses."""
+        ecu = self.ecu
+        max_upload = ecu.slaveProperties.maxCto - 1
+        if size <= max_upload:
+            return ecu.shortUpload(size, addr)
+        block_size = 0xFF if ecu.slaveProperties.slaveBlockMode else max_upload
+        buf = bytearray(size)
+        view = memoryview(buf)
+        ecu.setMta(addr)
+        for offset in range(0, size, block_size):
+            n = min(size - offset, block_size)
+            view[offset:offset + n] = ecu.upload(n)[:n]
+        return bytes(buf)
+
+    def _write_memory(self, addr, data: bytes):
+        """SET_MTA and DOWNLOADs, in master block mode up to `maxBs` packets per DOWNLOAD. Caller holds the lock."""
+        ecu = self.ecu
+        max_download = ecu.slaveProperties.maxCto - 2
+        view = memoryview(data)
+        ecu.setMta(addr)
+        if len(data) > max_download and getattr(ecu.slaveProperties, 'masterBlockMode', False):
+            block_size = min(ecu.slaveProperties.maxBs * max_download, 0xFF)
+            for offset in range(0, len(data), block_size):
+                self._download_block(view[offset:offset + block_size])
+        else:
+            for offset in range(0, len(data), max_download):
+                ecu.download(view[offset:offset + max_download])
+
+    def _download_block(self, block: memoryview):
+        """one master block mode transfer, only the last packet of the block is answered by the slave"""
+        ecu = self.ecu
+        max_download = ecu.slaveProperties.maxCto - 2
+        size = len(block)
+        if size <= max_download:
+            ecu.download(block)
+            return
+        min_st = ecu.slaveProperties.minSt * 100e-6
+        last = max_download * ((size - 1) // max_download)
+        # without a separation time the packets before the last one go out in a single write
+        batch = getattr(ecu.transport, 'batch', None)
+        with batch() if batch and not min_st else contextlib.nullcontext():
+            ecu.download(block[:max_download], size)
+            for offset in range(max_download, last, max_download):
+                if min_st:
+                    time.sleep(min_st)
+                ecu.downloadNext(block[offset:offset + max_download], size - offset)
+        if min_st:
+            time.sleep(min_st)
+        ecu.downloadNext(block[last:], size - last, last=True)
 
     def _daq_thread(self):
-        data_start_index = {
-            'IDF_ABS_ODT_NUMBER': 1,
-            'IDF_REL_ODT_NUMBER_ABS_DAQ_LIST_NUMBER_BYTE': 2,
-            'IDF_REL_ODT_NUMBER_ABS_DAQ_LIST_NUMBER_WORD': 3,
-            'IDF_REL_ODT_NUMBER_ABS_DAQ_LIST_NUMBER_WORD_ALIGNED': 4
-        }[self.daq_processor_info.daqKeyByte.Identification_Field]
+        daq_queue = self.ecu.transport.daqQueue
         while self.run_measurement:
-            for _ in range(len(self.ecu.transport.daqQueue)):
-                response, counter, length, timestamp = self.ecu.transport.daqQueue.popleft()
-                timestamp = datetime.now() if timestamp == 0 else datetime.fromtimestamp(timestamp)
-                odt = {}
-                if data_start_index == 1:
-                    pid = response[0]
-                    for channel, odts in self.daq_list.items():
-                        if self.daq_list_pid[channel] <= pid < self.daq_list_pid[channel] + len(odts):
-                            odt = odts[pid - self.daq_list_pid[channel]]
-                            break
-                else:
-                    odt_index = response[0]
-                    if data_start_index == 2:
-                        daq_list_number = response[1]
-                    else:
-                        daq_list_number = self.ecu.WORD_unpack(response[data_start_index - 2:data_start_index - 1])
-                    for no, odts in enumerate(self.daq_list.values()):
-                        if no == daq_list_number:
-                            odt = odts[odt_index]
-                            break
-                size_offset = 0
-                for sid, size in odt.items():
-                    raw_bytes = response[data_start_index + size_offset:][:size]
-                    size_offset += size
-                    obj = self.data_pool.get_obj_by_sid(sid)
-                    raw_val, phy_val = Asap2DatabaseUtil.bytes_to_phy_value(raw_bytes, obj)
-                    for f in self.event_listeners[self.RECV]:
-                        f(sid, raw_val, phy_val, timestamp)
-
+            self._process_daq_queue(daq_queue)
             time.sleep(0.001)
+        # the packets received until the DAQ lists stopped
+        self._process_daq_queue(daq_queue)
+        self._close_capture()
+
+    def _close_capture(self):
+        if self.capture is not None:
+            capture, self.capture = self.capture, None
+            capture.close()
+            logging.info(f'{capture.packets} DAQ packets captured to {capture.path}')
+
+    def _process_daq_queue(self, daq_queue):
+        """decodes the packets received so far, one block per ODT"""
+        received = [daq_queue.popleft() for _ in range(len(daq_queue))]
+        if self.capture is not None:
+            self.capture.append(received)
+            if not self.capture_live_decode:
+                return
+        decoder = self.daq_decoder
+        packets = {}
+        for response, counter, length, timestamp in received:
+            odt = decoder.lookup(response)
+            if odt is None:
+                continue
+            if odt not in packets:
+                packets[odt] = ([], [])
+            packets[odt][0].append(response)
+            packets[odt][1].append(time.time() if timestamp == 0 else timestamp)
+        for odt, (responses, timestamps) in packets.items():
+            try:
+                raw, phy = odt.decode_block(responses)
+            except (KeyError, ValueError, struct.error) as e:
+                # one undecodable ODT shall not end the DAQ thread
+                logging.warning(f'decoding {len(responses)} packets of DAQ list {odt.daq_list_no} '
+                                f'ODT {odt.odt_no} failed: {e!r}')
+                continue
+            self._emit_block(SampleBlock(np.array(timestamps), raw, phy))
+
+    def _emit_block(self, block: SampleBlock):
+        for f in self.event_listeners[self.RECV_BLOCK]:
+            f(block)
+        listeners = self.event_listeners[self.RECV]
+        if listeners:
+            # adapter for the per sample listeners
+            raw = {sid: col.tolist() for sid, col in block.raw.items()}
+            phy = {sid: col.tolist() for sid, col in block.phy.items()}
+            for i, timestamp in enumerate(block.timestamps.tolist()):
+                timestamp = datetime.fromtimestamp(timestamp)
+                for sid in raw.keys():
+                    for f in listeners:
+                        f(sid, raw[sid][i], phy[sid][i], timestamp)
 
     def set_cal_page(self, page):
         self.ecu.setCalPage(0x83, 0, page)
@@ -398,58 +830,29 @@ class XcpClient(DeviceBase):
     def upload(self, sid):
         db_name, name = sid.split('/')
         addr, size, var = self.get_addr_size_by_name(name)
-        granularity_size = self.granularity_size()
-        max_cto = self.ecu.slaveProperties.maxCto
-        min_size = int(min(size, int(int(max_cto - 1) / granularity_size)) * granularity_size)
-        if size > min_size:
-            self.ecu.setMta(addr)
-            raw_bytes = bytes()
-            remaining_size = size
-            self.lock.acquire()
-            while remaining_size > 0:
-                min_size = min(remaining_size, math.floor((max_cto - 1) / granularity_size) * granularity_size)
-                upload_size = math.ceil(min_size / granularity_size) * granularity_size
-                raw_bytes += self.ecu.upload(upload_size)
-                remaining_size -= upload_size
-            self.lock.release()
-            return Asap2DatabaseUtil.bytes_to_phy_value(raw_bytes, var)
-        else:
-            self.lock.acquire()
-            raw_bytes = self.ecu.shortUpload(min_size, addr)
+        return Asap2DatabaseUtil.bytes_to_phy_value(self.upload_bytes(addr, size), var)
+
+    def upload_bytes(self, addr, size):
+        self.lock.acquire()
+        try:
+            return self._read_memory(addr, size)
+        finally:
             self.lock.release()
-            return Asap2DatabaseUtil.bytes_to_phy_value(raw_bytes, var)
 
     def download(self, sid, value):
         db_name, name = sid.split('/')
         addr, size, var = self.get_addr_size_by_name(name)
-        granularity_size = self.granularity_size()
-        if granularity_size == 1:
-            max_cto = self.ecu.slaveProperties.maxCto
-            max_elements = math.floor((max_cto - 2) / granularity_size)
-            remaining_elements = size
-            current_addr = addr
-            data = Asap2DatabaseUtil.phy_value_to_bytes(value, var)
-            self.lock.acquire()
-            while remaining_elements > 0:
-                self.ecu.setMta(current_addr)
-                self.ecu.download(data[:max_elements])
-                remaining_elements -= max_elements
-                current_addr += max_elements
-            self.lock.release()
+        self.download_bytes(addr, Asap2DatabaseUtil.phy_value_to_bytes(value, var))
 
     def download_bytes(self, addr, byts):
-        granularity_size = self.granularity_size()
-        if granularity_size == 1:
-            max_cto = self.ecu.slaveProperties.maxCto
-            max_elements = math.floor((max_cto - 2) / granularity_size)
-            if max_elements < len(byts):
-                raise Exception("length of raw bytes shall be less than maxCTO-2")
-            self.lock.acquire()
-            self.ecu.setMta(addr)
-            self.ecu.download(byts)
+        self.lock.acquire()
+        try:
+            self._write_memory(addr, byts)
+        finally:
             self.lock.release()
 
     def disconnect(self):
+        self.daq_fingerprint = None
         self.ecu.disconnect()
         self.ecu.transport.close()
         self.connected = False
@@ -0,0 +1,674 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import collections
+import heapq
+import json
+import math
+import os
+import select
+import struct
+import threading
+from time import perf_counter
+from typing import Callable, Dict, List, Union
+
+import numpy as np
+import serial
+from pyxcp.types import Command
+
+from data.Asap2Database import Asap2Database, Asap2Parameter, Asap2Signal, ByteOrder, CompuMethod, \
+    CompuMethodType, Coeffs, Datatype, DBType, ParameterType
+from data.Asap2DatabaseUtil import NUMPY_DATATYPE, process_asap2_database
+from device.transport.XcpOnSxi import XcpOnSxi
+
+# serial.serial_for_url('xcpsim://<name>') opens an in-process port to the simulated slave <name>,
+# the handler is device/sim/protocol_xcpsim.py
+if 'device.sim' not in serial.protocol_handler_packages:
+    serial.protocol_handler_packages.append('device.sim')
+
+ERR_CMD_SYNCH = 0x00
+ERR_CMD_UNKNOWN = 0x20
+ERR_CMD_SYNTAX = 0x21
+ERR_OUT_OF_RANGE = 0x22
+ERR_SEQUENCE = 0x29
+ERR_DAQ_CONFIG = 0x2A
+ERR_MEMORY_OVERFLOW = 0x30
+
+DATATYPES = [Datatype.UBYTE, Datatype.SWORD, Datatype.ULONG, Datatype.FLOAT32_IEEE, Datatype.FLOAT64_IEEE]
+
+SimObject = collections.namedtuple('SimObject', ['name', 'address', 'datatype', 'channel'])
+SimEventChannel = collections.namedtuple('SimEventChannel', ['name', 'period', 'cycle', 'unit'])
+
+
+def _event_cycle(period: float):
+    """time cycle and EVENT_CHANNEL_TIME_UNIT of GET_DAQ_EVENT_INFO for `period` seconds, the units 1US, 1MS and
+    1S are preferred"""
+    scales = [1e-9, 1e-8, 1e-7, 1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1]
+    for unit in [9, 6, 3] + list(range(len(scales) - 1, -1, -1)):
+        cycle = period / scales[unit]
+        if 1 <= round(cycle) <= 0xFF and abs(round(cycle) - cycle) < 1e-6 * cycle:
+            return round(cycle), unit
+    for unit, scale in enumerate(scales):
+        if round(period / scale) <= 0xFF:
+            return max(round(period / scale), 1), unit
+    return 0xFF, 9
+
+
+class XcpSimError(Exception):
+    def __init__(self, code):
+        super(XcpSimError, self).__init__(f'XCP error {code:#x}')
+        self.code = code
+
+
+class SimDaqList(object):
+    def __init__(self):
+        self.odts: List[List[Union[tuple, None]]] = []  # ODT entries as (address, size)
+        self.channel = None
+        self.selected = False
+        self.running = False
+
+
+class XcpSlaveSim(object):
+    """Pure python XCP slave speaking the SxI framing of XcpOnSxi.
+
+    The slave has a byte addressable memory with `n_signals` signals, each of them sampled by one of the
+    `n_channels` event channels, and `n_parameters` calibration parameters. While connected, every event
+    channel fires at its rate, updates the values of its signals and sends the DAQ lists assigned to it.
+    Dynamic DAQ configuration with absolute ODT numbers is supported, like the ESP32 example slave.
+
+    The master side is connected by `attach`, either in-process through the url 'xcpsim://<name>' accepted
+    by XcpOnSxi as port, or through a pseudo terminal opened by `open_pty`.
+    """
+    BASE_ADDRESS = 0x3ffb0000
+    SLOT_SIZE = 8
+    MAX_LAG = 0.1  # events more than this behind their schedule are dropped and counted as overruns
+
+    _instances: Dict[str, 'XcpSlaveSim'] = {}
+
+    def __init__(self, name: str = 'sim', n_signals: int = 16, n_channels: int = 2,
+                 rate: Union[float, List[float]] = 100.0, n_parameters: int = 8,
+                 max_cto: int = 14, max_dto: int = 14, max_daq: int = 0xFF,
+                 block_mode: bool = True, max_bs: int = 16, min_st: int = 0):
+        if name in self._instances:
+            raise Exception(f'simulated slave {name} already exists')
+        rates = list(rate) if isinstance(rate, (list, tuple)) else [rate] * n_channels
+        if len(rates) != n_channels:
+            raise Exception('one rate per event channel is required')
+        self.name = name
+        self.identification = f'DaDuPo simulated slave {name}'
+        self.max_cto = max_cto
+        self.max_dto = max_dto
+        self.max_daq = max_daq
+        self.block_mode = block_mode
+        self.max_bs = max_bs
+        self.min_st = min_st
+        self.event_channels: List[SimEventChannel] = []
+        for ecn, r in enumerate(rates):
+            self.event_channels.append(SimEventChannel(f'sim_event{ecn}', 1.0 / r, *_event_cycle(1.0 / r)))
+        self.signals: List[SimObject] = []
+        self.parameters: List[SimObject] = []
+        for i in range(n_signals):
+            self.signals.append(SimObject(f'sim_signal{i}', self.BASE_ADDRESS + i * self.SLOT_SIZE,
+                                          DATATYPES[i % len(DATATYPES)], i % n_channels))
+        for i in range(n_parameters):
+            self.parameters.append(SimObject(f'sim_param{i}', self.BASE_ADDRESS + (n_signals + i) * self.SLOT_SIZE,
+                                             DATATYPES[i % len(DATATYPES)], None))
+        self.memory = bytearray((n_signals + n_parameters) * self.SLOT_SIZE)
+        self._updaters = self._compile_updaters()
+
+        self._lock = threading.RLock()
+        self._tx_lock = threading.Lock()
+        self._rx = bytearray()
+        self._sink: Union[Callable[[bytes], None], None] = None
+        self._connected = False
+        self._cal_page = 0
+        self._mta = 0
+        self._mta_data: Union[bytes, None] = None
+        self._download_remaining = 0  # elements still expected by a master block mode DOWNLOAD
+        self._daq_lists: List[SimDaqList] = []
+        self._daq_ptr = None
+        self._active: Dict[int, list] = {}  # key: event channel number, value: [(pid, [(start, end)])]
+        self._ticks = [0] * n_channels
+        self._thread: Union[threading.Thread, None] = None
+        self._stop_event: Union[threading.Event, None] = None
+        self._pty_fds = None
+        self._pty_thread: Union[threading.Thread, None] = None
+        self.frame_errors = 0
+        self.packets_sent = 0
+        self.overruns = 0
+        self._handlers = {
+            Command.CONNECT: self._connect,
+            Command.DISCONNECT: self._disconnect,
+            Command.GET_STATUS: self._get_status,
+            Command.SYNCH: self._synch,
+            Command.GET_COMM_MODE_INFO: self._get_comm_mode_info,
+            Command.GET_ID: self._get_id,
+            Command.SET_MTA: self._set_mta,
+            Command.UPLOAD: self._upload,
+            Command.SHORT_UPLOAD: self._short_upload,
+            Command.DOWNLOAD: self._download,
+            Command.DOWNLOAD_NEXT: self._download_next,
+            Command.SET_CAL_PAGE: self._set_cal_page,
+            Command.GET_CAL_PAGE: self._get_cal_page,
+            Command.GET_DAQ_PROCESSOR_INFO: self._get_daq_processor_info,
+            Command.GET_DAQ_RESOLUTION_INFO: self._get_daq_resolution_info,
+            Command.GET_DAQ_EVENT_INFO: self._get_daq_event_info,
+            Command.FREE_DAQ: self._free_daq,
+            Command.ALLOC_DAQ: self._alloc_daq,
+            Command.ALLOC_ODT: self._alloc_odt,
+            Command.ALLOC_ODT_ENTRY: self._alloc_odt_entry,
+            Command.SET_DAQ_PTR: self._set_daq_ptr,
+            Command.WRITE_DAQ: self._write_daq,
+            Command.WRITE_DAQ_MULTIPLE: self._write_daq_multiple,
+            Command.SET_DAQ_LIST_MODE: self._set_daq_list_mode,
+            Command.START_STOP_DAQ_LIST: self._start_stop_daq_list,
+            Command.START_STOP_SYNCH: self._start_stop_synch,
+        }
+        self._instances[name] = self
+
+    @classmethod
+    def get(cls, name: str) -> Union['XcpSlaveSim', None]:
+        return cls._instances.get(name)
+
+    @property
+    def url(self):
+        return f'xcpsim://{self.name}'
+
+    def database(self, name: str = None) -> Asap2Database:
+        """processed ASAP2 database describing the signals and parameters of the simulated memory"""
+        compu_methods = [
+            CompuMethod(None, CompuMethodType.IDENTICAL, None, 'identical', '-'),
+            CompuMethod(Coeffs(0.1, 0), CompuMethodType.LINEAR, None, 'linear', '-'),
+        ]
+        signals = [Asap2Signal(hex(s.address), None, 'linear' if s.datatype == Datatype.SWORD else 'identical', 1,
+                               s.datatype, '', '', s.name, None, None) for s in self.signals]
+        parameters = [Asap2Parameter(hex(p.address), None, 'identical', 1, p.datatype, '', '', p.name,
+                                     ParameterType.VALUE, None, None, None, None) for p in self.parameters]
+        db = Asap2Database(None, parameters, signals, ByteOrder.MSB_LAST, compu_methods, DBType.ASAP2, None,
+                           name or self.name)
+        process_asap2_database(db)
+        return db
+
+    # link
+
+    def attach(self, sink: Callable[[bytes], None]):
+        """connects the master side, `sink` receives every byte sent by the slave"""
+        with self._lock:
+            self._rx.clear()
+            self._sink = sink
+
+    def detach(self):
+        """disconnects the master side, like a power cycle of the slave the XCP session ends"""
+        with self._lock:
+            self._sink = None
+            self._disconnect(None)
+
+    def receive(self, data: bytes):
+        """feeds bytes sent by the master, the responses are sent before returning"""
+        responses = []
+        with self._lock:
+            self._rx += data
+            for request, length, error in XcpOnSxi.decode_frames(self._rx):
+                if error:
+                    self.frame_errors += 1
+                    continue
+                response = self._dispatch(request)
+                if isinstance(response, list):
+                    responses.extend(response)
+                elif response is not None:
+                    responses.append(response)
+        if responses:
+            self._send(responses)
+
+    def _send(self, packets: List[bytes]):
+        sink = self._sink
+        if sink is None:
+            return
+        encode = XcpOnSxi.encode
+        data = b''.join([encode(p) for p in packets])
+        with self._tx_lock:
+            sink(data)
+        self.packets_sent += len(packets)
+
+    def open_pty(self) -> str:
+        """serves the slave on a pseudo terminal, returns the device name to be used as port by XcpOnSxi"""
+        import tty
+        master_fd, slave_fd = os.openpty()
+        tty.setraw(slave_fd)
+        self._pty_fds = (master_fd, slave_fd)
+        self.attach(lambda data: self._write_fd(master_fd, data))
+        self._pty_thread = threading.Thread(target=self._pty_reader, args=(master_fd,), daemon=True)
+        self._pty_thread.start()
+        return os.ttyname(slave_fd)
+
+    @staticmethod
+    def _write_fd(fd, data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+
+    def _pty_reader(self, fd):
+        while self._pty_fds:
+            readable, _, _ = select.select([fd], [], [], 0.1)
+            if not readable:
+                continue
+            try:
+                data = os.read(fd, 4096)
+            except OSError:
+                break
+            if data:
+                self.receive(data)
+
+    def close(self):
+        self.detach()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+        if self._pty_fds:
+            fds = self._pty_fds
+            self._pty_fds = None
+            self._pty_thread.join()
+            for fd in fds:
+                os.close(fd)
+        self._instances.pop(self.name, None)
+
+    # event channels
+
+    def _compile_updaters(self):
+        """per event channel: the signals of each datatype are updated at once through a typed view of the memory"""
+        groups = {}
+        for slot, s in enumerate(self.signals):
+            groups.setdefault((s.channel, s.datatype), []).append(slot)
+        updaters = [[] for _ in self.event_channels]
+        for (ecn, datatype), slots in groups.items():
+            dtype = np.dtype('<' + NUMPY_DATATYPE[datatype])
+            view = np.frombuffer(self.memory, dtype=dtype)
+            index = np.array(slots) * self.SLOT_SIZE // dtype.itemsize
+            if dtype.kind == 'f':
+                offsets = np.array(slots, dtype=np.float64) * 0.1
+            else:
+                offsets = np.array(slots, dtype=np.int64)
+            updaters[ecn].append((view, index, offsets))
+        return updaters
+
+    def _tick(self, ecn: int):
+        with self._lock:
+            k = self._ticks[ecn] = self._ticks[ecn] + 1
+            t = k * self.event_channels[ecn].period
+            for view, index, offsets in self._updaters[ecn]:
+                if view.dtype.kind == 'f':
+                    view[index] = 100 * np.sin(math.pi * t + offsets)
+                else:
+                    view[index] = (k + offsets).astype(view.dtype)
+            odts = self._active.get(ecn)
+            if not odts:
+                return
+            mem = self.memory
+            packets = [b''.join([pid] + [mem[start:end] for start, end in entries]) for pid, entries in odts]
+        self._send(packets)
+
+    def _generator(self, stop: threading.Event):
+        periods = [c.period for c in self.event_channels]
+        start = perf_counter()
+        heap = [(start + period, ecn) for ecn, period in enumerate(periods)]
+        heapq.heapify(heap)
+        while heap and not stop.is_set():
+            due, ecn = heap[0]
+            now = perf_counter()
+            if due > now:
+                stop.wait(min(due - now, 0.1))
+                continue
+            if now - due > self.MAX_LAG:
+                missed = int((now - due) / periods[ecn])
+                self.overruns += missed
+                due += missed * periods[ecn]
+            heapq.heapreplace(heap, (due + periods[ecn], ecn))
+            self._tick(ecn)
+
+    def _start_generator(self):
+        if self._stop_event is not None:
+            return
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._generator, args=(self._stop_event,), daemon=True)
+        self._thread.start()
+
+    def _stop_generator(self):
+        if self._stop_event is not None:
+            self._stop_event.set()
+            self._stop_event = None
+
+    # memory
+
+    def _offset(self, address: int, size: int) -> int:
+        offset = address - self.BASE_ADDRESS
+        if offset < 0 or offset + size > len(self.memory):
+            raise XcpSimError(ERR_OUT_OF_RANGE)
+        return offset
+
+    def _read(self, address: int, size: int) -> bytes:
+        offset = self._offset(address, size)
+        return bytes(self.memory[offset:offset + size])
+
+    def _write(self, address: int, data: bytes):
+        offset = self._offset(address, len(data))
+        self.memory[offset:offset + len(data)] = data
+
+    def _read_mta(self, size: int) -> bytes:
+        if self._mta_data is not None:
+            data = self._mta_data[self._mta:self._mta + size]
+            data += bytes(size - len(data))
+        else:
+            data = self._read(self._mta, size)
+        self._mta += size
+        return data
+
+    def _set_mta_data(self, data: bytes):
+        """lets the next UPLOADs read `data` instead of the memory, like GET_ID and GET_DAQ_EVENT_INFO do"""
+        self._mta_data = data
+        self._mta = 0
+
+    # commands
+
+    def _dispatch(self, request: bytes) -> Union[bytes, List[bytes], None]:
+        """returns the response packet, a list of them in slave block mode or None if there is no response.
+        Handlers return the payload of a positive response the same way."""
+        handler = self._handlers.get(request[0])
+        if not self._connected and request[0] != Command.CONNECT:
+            return None
+        if handler is None:
+            return bytes((0xFE, ERR_CMD_UNKNOWN))
+        try:
+            payload = handler(request)
+        except XcpSimError as e:
+            return bytes((0xFE, e.code))
+        except (struct.error, IndexError):
+            return bytes((0xFE, ERR_CMD_SYNTAX))
+        if payload is None:
+            return None
+        if isinstance(payload, list):
+            return [b'\xff' + p for p in payload]
+        return b'\xff' + payload
+
+    def _connect(self, request):
+        self._connected = True
+        self._start_generator()
+        self._download_remaining = 0
+        # resources: CAL/PAG and DAQ, comm mode: optional info, slave block mode, byte granularity, INTEL byte order
+        comm_mode = 0x80 | (0x40 if self.block_mode else 0)
+        return struct.pack('<BBBHBB', 0x05, comm_mode, self.max_cto, self.max_dto, 1, 1)
+
+    def _disconnect(self, request):
+        for daq_list in self._daq_lists:
+            daq_list.running = False
+            daq_list.selected = False
+        self._update_active()
+        self._connected = False
+        self._stop_generator()
+        return b''
+
+    def _get_status(self, request):
+        running = any(daq_list.running for daq_list in self._daq_lists)
+        return struct.pack('<BBxH', 0x40 if running else 0, 0, 0)
+
+    def _synch(self, request):
+        raise XcpSimError(ERR_CMD_SYNCH)
+
+    def _get_comm_mode_info(self, request):
+        # master block mode
+        return struct.pack('<xBxBBBB', 0x01 if self.block_mode else 0, self.max_bs, self.min_st, 0, 0x10)
+
+    def _get_id(self, request):
+        identification = self.identification.encode('ascii')
+        self._set_mta_data(identification)
+        return struct.pack('<BxxI', 0, len(identification))
+
+    def _set_mta(self, request):
+        self._mta = struct.unpack_from('<I', request, 4)[0]
+        self._mta_data = None
+        return b''
+
+    def _upload(self, request):
+        size = request[1]
+        packet_size = self.max_cto - 1
+        if size <= packet_size:
+            return self._read_mta(size)
+        if not self.block_mode:
+            raise XcpSimError(ERR_OUT_OF_RANGE)
+        # slave block mode: the data follows in consecutive responses
+        data = self._read_mta(size)
+        return [data[i:i + packet_size] for i in range(0, size, packet_size)]
+
+    def _short_upload(self, request):
+        size = request[1]
+        if size > self.max_cto - 1:
+            raise XcpSimError(ERR_OUT_OF_RANGE)
+        return self._read(struct.unpack_from('<I', request, 4)[0], size)
+
+    def _download(self, request):
+        size = request[1]
+        packet_size = self.max_cto - 2
+        if size <= packet_size:
+            self._download_remaining = 0
+            return self._download_data(request[2:2 + size], size)
+        if not self.block_mode or size > self.max_bs * packet_size:
+            raise XcpSimError(ERR_OUT_OF_RANGE)
+        # master block mode: the first packet carries the length of the whole block
+        self._download_remaining = size
+        return self._download_data(request[2:2 + packet_size], packet_size)
+
+    def _download_next(self, request):
+        remaining = request[1]
+        if not self._download_remaining or remaining != self._download_remaining:
+            self._download_remaining = 0
+            raise XcpSimError(ERR_SEQUENCE)
+        size = min(remaining, self.max_cto - 2)
+        return self._download_data(request[2:2 + size], size)
+
+    def _download_data(self, data: bytes, size: int) -> Union[bytes, None]:
+        """writes one packet of a download, responds when the download is complete"""
+        if len(data) != size:
+            self._download_remaining = 0
+            raise XcpSimError(ERR_OUT_OF_RANGE)
+        self._write(self._mta, data)
+        self._mta += size
+        if self._download_remaining:
+            self._download_remaining -= size
+            if self._download_remaining:
+                return None
+        return b''
+
+    def _set_cal_page(self, request):
+        self._cal_page = request[3]
+        return b''
+
+    def _get_cal_page(self, request):
+        return bytes((0, 0, self._cal_page))
+
+    def _get_daq_processor_info(self, request):
+        # dynamic DAQ configuration, DAQ key byte: absolute ODT numbers
+        return struct.pack('<BHHBB', 0x01, self.max_daq, len(self.event_channels), 0, 0x00)
+
+    def _get_daq_resolution_info(self, request):
+        return struct.pack('<BBBBBH', 1, self.max_dto - 1, 1, 0, 0, 0)
+
+    def _get_daq_event_info(self, request):
+        ecn = struct.unpack_from('<H', request, 2)[0]
+        if ecn >= len(self.event_channels):
+            raise XcpSimError(ERR_OUT_OF_RANGE)
+        channel = self.event_channels[ecn]
+        name = channel.name.encode('ascii')
+        self._set_mta_data(name)
+        return struct.pack('<BBBBBB', 0x04, 0xFF, len(name), channel.cycle, channel.unit, 0)
+
+    def _daq_list(self, daq_list_no: int) -> SimDaqList:
+        if daq_list_no >= len(self._daq_lists):
+            raise XcpSimError(ERR_OUT_OF_RANGE)
+        return self._daq_lists[daq_list_no]
+
+    def _free_daq(self, request):
+        self._daq_lists = []
+        self._daq_ptr = None
+        self._update_active()
+        return b''
+
+    def _alloc_daq(self, request):
+        count = struct.unpack_from('<H', request, 2)[0]
+        if self._daq_lists:
+            raise XcpSimError(ERR_SEQUENCE)
+        if count > self.max_daq:
+            raise XcpSimError(ERR_MEMORY_OVERFLOW)
+        self._daq_lists = [SimDaqList() for _ in range(count)]
+        return b''
+
+    def _alloc_odt(self, request):
+        daq_list = self._daq_list(struct.unpack_from('<H', request, 2)[0])
+        count = request[4]
+        if daq_list.odts:
+            raise XcpSimError(ERR_SEQUENCE)
+        # absolute ODT numbers are PIDs, which end below the response PIDs
+        if sum(len(d.odts) for d in self._daq_lists) + count > 0xFC:
+            raise XcpSimError(ERR_MEMORY_OVERFLOW)
+        daq_list.odts = [[] for _ in range(count)]
+        return b''
+
+    def _alloc_odt_entry(self, request):
+        daq_list = self._daq_list(struct.unpack_from('<H', request, 2)[0])
+        odt_no, count = request[4], request[5]
+        if odt_no >= len(daq_list.odts):
+            raise XcpSimError(ERR_OUT_OF_RANGE)
+        daq_list.odts[odt_no] = [None] * count
+        return b''
+
+    def _set_daq_ptr(self, request):
+        daq_list_no = struct.unpack_from('<H', request, 2)[0]
+        odt_no, entry_no = request[4], request[5]
+        daq_list = self._daq_list(daq_list_no)
+        if odt_no >= len(daq_list.odts) or entry_no >= len(daq_list.odts[odt_no]):
+            raise XcpSimError(ERR_OUT_OF_RANGE)
+        self._daq_ptr = [daq_list_no, odt_no, entry_no]
+        return b''
+
+    def _write_daq(self, request):
+        size = request[2]
+        address = struct.unpack_from('<I', request, 4)[0]
+        self._write_daq_entry(size, address)
+        return b''
+
+    def _write_daq_multiple(self, request):
+        n = request[1]
+        if 2 + n * 8 > len(request):
+            raise XcpSimError(ERR_CMD_SYNTAX)
+        for i in range(n):
+            size, address = struct.unpack_from('<BI', request, 2 + i * 8 + 1)
+            self._write_daq_entry(size, address)
+        return b''
+
+    def _write_daq_entry(self, size, address):
+        if self._daq_ptr is None:
+            raise XcpSimError(ERR_SEQUENCE)
+        daq_list_no, odt_no, entry_no = self._daq_ptr
+        entries = self._daq_lists[daq_list_no].odts[odt_no]
+        if entry_no >= len(entries):
+            raise XcpSimError(ERR_OUT_OF_RANGE)
+        used = sum(entry[1] for i, entry in enumerate(entries) if entry and i != entry_no)
+        if used + size > self.max_dto - 1:
+            raise XcpSimError(ERR_DAQ_CONFIG)
+        self._offset(address, size)
+        entries[entry_no] = (address, size)
+        self._daq_ptr[2] += 1
+
+    def _set_daq_list_mode(self, request):
+        daq_list_no, ecn = struct.unpack_from('<HH', request, 2)
+        daq_list = self._daq_list(daq_list_no)
+        if ecn >= len(self.event_channels):
+            raise XcpSimError(ERR_OUT_OF_RANGE)
+        daq_list.channel = ecn
+        return b''
+
+    def _start_stop_daq_list(self, request):
+        mode = request[1]
+        daq_list_no = struct.unpack_from('<H', request, 2)[0]
+        daq_list = self._daq_list(daq_list_no)
+        if mode > 2:
+            raise XcpSimError(ERR_OUT_OF_RANGE)
+        if mode and (daq_list.channel is None or any(None in odt for odt in daq_list.odts)):
+            raise XcpSimError(ERR_DAQ_CONFIG)
+        if mode == 2:
+            daq_list.selected = True
+        else:
+            daq_list.running = mode == 1
+            self._update_active()
+        return bytes((sum(len(d.odts) for d in self._daq_lists[:daq_list_no]),))
+
+    def _start_stop_synch(self, request):
+        mode = request[1]
+        if mode > 2:
+            raise XcpSimError(ERR_OUT_OF_RANGE)
+        for daq_list in self._daq_lists:
+            if mode == 0:
+                daq_list.running = False
+            elif daq_list.selected:
+                daq_list.running = mode == 1
+            daq_list.selected = False
+        self._update_active()
+        return b''
+
+    def _update_active(self):
+        active = {}
+        pid = 0
+        for daq_list in self._daq_lists:
+            if daq_list.running:
+                odts = active.setdefault(daq_list.channel, [])
+                for odt_no, entries in enumerate(daq_list.odts):
+                    odts.append((bytes((pid + odt_no,)),
+                                 [(address - self.BASE_ADDRESS, address - self.BASE_ADDRESS + size)
+                                  for address, size in entries]))
+            pid += len(daq_list.odts)
+        self._active = active
+
+
+def main():
+    parser = argparse.ArgumentParser(description='simulated XCP slave on a pseudo terminal')
+    parser.add_argument('--signals', type=int, default=16)
+    parser.add_argument('--channels', type=int, default=2)
+    parser.add_argument('--rate', type=float, default=100.0, help='event rate of every channel in Hz')
+    parser.add_argument('--parameters', type=int, default=8)
+    parser.add_argument('--db', help='writes the database of the simulated slave to this file')
+    args = parser.parse_args()
+    sim = XcpSlaveSim('sim', args.signals, args.channels, args.rate, args.parameters)
+    if args.db:
+        import marshmallow_dataclass
+        schema = marshmallow_dataclass.class_schema(Asap2Database)()
+        with open(args.db, 'w') as f:
+            json.dump(schema.dump(sim.database()), f, indent=2)
+    print(f'simulated XCP slave on {sim.open_pty()}, stop with Ctrl+C')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    sim.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import threading
+import time
+import urllib.parse as urlparse
+
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError, to_bytes
+
+from device.sim.XcpSlaveSim import XcpSlaveSim
+
+
+class Serial(SerialBase):
+    """in-process serial port to a XcpSlaveSim, opened by serial.serial_for_url('xcpsim://<name>')
+
+    Requests are handled by the simulated slave inside `write`, so the responses are already buffered when it
+    returns. The line settings are accepted and ignored.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._sim = None
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+        self._sim = self.from_url(self.port)
+        self._buffer.clear()
+        self.is_open = True
+        self._sim.attach(self._on_data)
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            self._sim.detach()
+            with self._cond:
+                self._cond.notify_all()
+        super(Serial, self).close()
+
+    def from_url(self, url) -> XcpSlaveSim:
+        parts = urlparse.urlsplit(url)
+        if parts.scheme != 'xcpsim':
+            raise SerialException(f'expected a string in the form "xcpsim://<name>": not starting with xcpsim:// '
+                                  f'({parts.scheme!r})')
+        sim = XcpSlaveSim.get(parts.netloc)
+        if sim is None:
+            raise SerialException(f'there is no simulated slave named {parts.netloc!r}')
+        return sim
+
+    def _reconfigure_port(self):
+        pass
+
+    def _on_data(self, data: bytes):
+        with self._cond:
+            self._buffer += data
+            self._cond.notify_all()
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        return len(self._buffer)
+
+    def read(self, size=1):
+        if not self.is_open:
+            raise PortNotOpenError()
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        with self._cond:
+            while len(self._buffer) < size and self.is_open:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = to_bytes(data)
+        self._sim.receive(data)
+        return len(data)
+
+    def reset_input_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        with self._cond:
+            self._buffer.clear()
+
+    def reset_output_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+
+    def _update_break_state(self):
+        pass
+
+    def _update_rts_state(self):
+        pass
+
+    def _update_dtr_state(self):
+        pass
+
+    @property
+    def cts(self):
+        return True
+
+    @property
+    def dsr(self):
+        return True
+
+    @property
+    def ri(self):
+        return False
+
+    @property
+    def cd(self):
+        return True
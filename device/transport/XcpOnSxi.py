@@ -21,8 +21,8 @@ __copyright__ = """
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from datetime import time
-from time import perf_counter
+from contextlib import contextmanager
+from time import perf_counter, time
 
 import serial
 from pyxcp.transport.base import BaseTransport
@@ -46,6 +46,11 @@ class XcpOnSxi(BaseTransport):
     ESC_SYNC = 1
     ESC_ESC = 0
 
+    SYNC = bytes([SLIP_SYNC])
+    ESC = bytes([SLIP_ESC])
+    ESCAPED_SYNC = bytes([SLIP_ESC, ESC_SYNC])
+    ESCAPED_ESC = bytes([SLIP_ESC, ESC_ESC])
+
     MAX_DATAGRAM_SIZE = 512
     TIMEOUT = 0.75
 
@@ -54,6 +59,8 @@ class XcpOnSxi(BaseTransport):
         self.loadConfig(config)
         self.portName = self.config.get("port")
         self.baudrate = self.config.get("bitrate")
+        self._rx_buffer = bytearray()
+        self._tx_pending = None
 
     def __del__(self):
         self.closeConnection()
@@ -75,7 +82,8 @@ class XcpOnSxi(BaseTransport):
     def connect(self):
         self.logger.debug("Trying to open serial commPort {}.".format(self.portName))
         try:
-            self.commPort = serial.Serial(self.portName, self.baudrate, timeout=XcpOnSxi.TIMEOUT)
+            # besides device names, pyserial URLs like socket://host:port or xcpsim://name are accepted
+            self.commPort = serial.serial_for_url(self.portName, self.baudrate, timeout=XcpOnSxi.TIMEOUT)
         except serial.SerialException as e:
             raise e
         self.logger.info("Serial commPort openend as '{}' @ {} Bits/Sec.".format(self.commPort.portstr, self.baudrate))
@@ -93,83 +101,119 @@ class XcpOnSxi(BaseTransport):
     def flush(self):
         self.commPort.flush()
 
-    def listen(self):
-        high_resolution_time = self.perf_counter_origin > 0
-        timestamp_origin = self.timestamp_origin
-        perf_counter_origin = self.perf_counter_origin
+    def _timestamp(self):
+        if self.perf_counter_origin > 0:
+            return self.timestamp_origin + perf_counter() - self.perf_counter_origin
+        return time()
 
+    def listen(self):
+        buf = self._rx_buffer
+        buf.clear()
         while True:
             if self.closeEvent.isSet():
                 return
-            if not self.commPort.inWaiting():
-                continue
-            if high_resolution_time:
-                recv_timestamp = time()
-            else:
-                recv_timestamp = timestamp_origin + perf_counter() - perf_counter_origin
-            sync = self.commPort.read(1)[0]
-            if sync != self.SLIP_SYNC:
+            # blocks until data arrives or the read timeout expires, then takes everything already received
+            chunk = self.commPort.read(self.commPort.in_waiting or 1)
+            if not chunk:
+                if buf:
+                    self.logger.error("Size mismatch.")
+                    buf.clear()
                 continue
-            length = self.commPort.read(1)[0]
-            data = self.commPort.read(length)
-            checksum = self.commPort.read(1)[0]
+            recv_timestamp = self._timestamp()
+            buf += chunk
+            self._process_frames(buf, recv_timestamp)
+
+    def _process_frames(self, buf: bytearray, recv_timestamp):
+        """processes all complete frames in `buf` and leaves an incomplete tail in it"""
+        for response, length, error in self.decode_frames(buf):
             self.timing.stop()
+            if error:
+                self.logger.error(error)
+                continue
+            self.processResponse(response, length, self.counterReceived + 1, recv_timestamp)
+
+    @classmethod
+    def decode_frames(cls, buf: bytearray):
+        """yields (payload, length, error) of all complete frames in `buf` and leaves an incomplete tail in it,
+        the payload of a corrupt frame is None and error describes the problem"""
+        while buf:
+            start = buf.find(cls.SYNC)
+            if start < 0:
+                buf.clear()
+                return
+            if start:
+                del buf[:start]
+            if len(buf) < 2:
+                return
+            length = buf[1]
+            if len(buf) < length + 3:
+                return
+            data = bytes(buf[2:2 + length])
+            checksum = buf[2 + length]
+            del buf[:length + 3]
 
-            if len(data) != length:
-                self.logger.error("Size mismatch.")
+            if not length:
+                yield None, length, "Size mismatch."
                 continue
             if (sum(data) + length) % 256 != checksum:
-                self.logger.error("Checksum mismatch")
+                yield None, length, "Checksum mismatch"
                 continue
-            if self.SLIP_SYNC in data or self.SLIP_ESC == data[-1]:
-                self.logger.error("Wrong data format")
+            if cls.SLIP_SYNC in data or cls.SLIP_ESC == data[-1]:
+                yield None, length, "Wrong data format"
                 continue
-
-            response = []
-            i = 0
-            if length == 1:
-                response.append(data[0])
-            while i < length:
-                if data[i] == self.SLIP_ESC:
-                    if i == length - 1:
-                        self.logger.error("Wrong data format")
-                        continue
-                    if data[i + 1] == self.ESC_SYNC:
-                        response.append(self.SLIP_SYNC)
-                    elif data[i + 1] == self.ESC_ESC:
-                        response.append(self.SLIP_ESC)
-                    else:
-                        self.logger.error("Wrong data format")
-                        continue
-                    i += 1
-                else:
-                    response.append(data[i])
-                i += 1
-            # print(bytes(response))
-            self.processResponse(bytes(response), length, self.counterReceived + 1, recv_timestamp)
-
-    def send(self, frame):
-        packed = []
-        for d in frame:
-            if d == self.SLIP_SYNC:
-                packed.extend([self.SLIP_ESC, self.ESC_SYNC])
-            elif d == self.SLIP_ESC:
-                packed.extend([self.SLIP_ESC, self.ESC_ESC])
+            escapes = data.count(cls.SLIP_ESC)
+            if escapes:
+                # every ESC has to start one of the two escape sequences
+                if escapes != data.count(cls.ESCAPED_SYNC) + data.count(cls.ESCAPED_ESC):
+                    yield None, length, "Wrong data format"
+                    continue
+                yield data.replace(cls.ESCAPED_SYNC, cls.SYNC).replace(cls.ESCAPED_ESC, cls.ESC), length, None
             else:
-                packed.append(d)
+                yield data, length, None
+
+    @classmethod
+    def encode(cls, frame) -> bytes:
+        """SLIP escapes `frame` and wraps it with SYNC, length and checksum"""
+        packed = bytes(frame).replace(cls.ESC, cls.ESCAPED_ESC).replace(cls.SYNC, cls.ESCAPED_SYNC)
         length = len(packed)
+        if length > 0xFF:
+            raise Exception(f'escaped frame of {length} bytes does not fit into a SxI frame')
         checksum = (sum(packed) + length) % 256
-        packed = bytes([self.SLIP_SYNC, length] + packed + [checksum])
-        if self.perf_counter_origin > 0:
-            self.pre_send_timestamp = time()
-            self.commPort.write(packed)
-            self.post_send_timestamp = time()
-        else:
-            pre_send_timestamp = perf_counter()
-            self.commPort.write(packed)
-            post_send_timestamp = perf_counter()
-            self.pre_send_timestamp = self.timestamp_origin + pre_send_timestamp - self.perf_counter_origin
-            self.post_send_timestamp = self.timestamp_origin + post_send_timestamp - self.perf_counter_origin
+        return b''.join((cls.SYNC, bytes((length,)), packed, bytes((checksum,))))
+
+    def send(self, frame):
+        packed = self.encode(frame)
+        if self._tx_pending is not None:
+            self._tx_pending += packed
+            return
+        self._write(packed)
+
+    def _write(self, packed):
+        self.pre_send_timestamp = self._timestamp()
+        self.commPort.write(packed)
+        self.post_send_timestamp = self._timestamp()
+
+    @contextmanager
+    def batch(self):
+        """frames sent inside the block are queued and written with one write() when the block is left.
+
+        Only for frames without response, e.g. block mode DOWNLOAD_NEXT: a request waiting for its response
+        inside the block would time out.
+        """
+        if self._tx_pending is not None:
+            yield
+            return
+        self._tx_pending = bytearray()
+        try:
+            yield
+        finally:
+            self.flush_frames()
+
+    def flush_frames(self):
+        pending = self._tx_pending
+        self._tx_pending = None
+        if pending:
+            self._write(bytes(pending))
 
     def closeConnection(self):
         if hasattr(self, "commPort") and self.commPort.isOpen():
@@ -0,0 +1,71 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import struct
+import unittest
+
+from data.Asap2Database import ByteOrder, CompuMethod, CompuMethodType, Coeffs, Datatype
+from data.Asap2DatabaseUtil import array_phy_value_to_bytes, phy_value_to_raw_value, single_phy_value_to_bytes
+
+DICT = CompuMethod(None, CompuMethodType.DICT, {'0': 'OFF', '1': 'ON', '2': 'ON', '7': 'ERROR'}, 'state', '')
+LINEAR = CompuMethod(Coeffs(0.5, 10.0), CompuMethodType.LINEAR, None, 'scaled', '')
+
+
+class PhyToBytesTest(unittest.TestCase):
+
+    def test_dict_reverse_lookup(self):
+        self.assertEqual(phy_value_to_raw_value('OFF', Datatype.UBYTE, DICT), 0)
+        # the smallest raw value of a physical value listed twice
+        self.assertEqual(phy_value_to_raw_value('ON', Datatype.UBYTE, DICT), 1)
+        self.assertEqual(phy_value_to_raw_value('ERROR', Datatype.UBYTE, DICT), 7)
+        with self.assertRaises(KeyError):
+            phy_value_to_raw_value('UNKNOWN', Datatype.UBYTE, DICT)
+
+    def test_dict_array(self):
+        self.assertEqual(array_phy_value_to_bytes(['ERROR', 'ON', 'OFF'], Datatype.UBYTE, ByteOrder.MSB_LAST, DICT),
+                         bytes([7, 1, 0]))
+        with self.assertRaises(KeyError):
+            array_phy_value_to_bytes(['ON', 'UNKNOWN'], Datatype.UBYTE, ByteOrder.MSB_LAST, DICT)
+
+    def test_array_matches_single_values(self):
+        for bo in ByteOrder:
+            for dt in (Datatype.SWORD, Datatype.ULONG, Datatype.FLOAT32_IEEE):
+                values = [10.0, 12.5, 1000.0]
+                self.assertEqual(array_phy_value_to_bytes(values, dt, bo, LINEAR),
+                                 b''.join(single_phy_value_to_bytes(v, dt, bo, LINEAR) for v in values), (bo, dt))
+
+    def test_out_of_range(self):
+        for values in ([300, 1, 5], [-1, 1, 5]):
+            with self.assertRaises(struct.error):
+                single_phy_value_to_bytes(values[0], Datatype.UBYTE, ByteOrder.MSB_LAST, None)
+            with self.assertRaises(struct.error):
+                array_phy_value_to_bytes(values, Datatype.UBYTE, ByteOrder.MSB_LAST, None)
+        with self.assertRaises(struct.error):
+            # 40000 after the conversion
+            array_phy_value_to_bytes([20010.0], Datatype.SWORD, ByteOrder.MSB_FIRST, LINEAR)
+        self.assertEqual(array_phy_value_to_bytes([255, 0], Datatype.UBYTE, ByteOrder.MSB_LAST, None),
+                         bytes([255, 0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import unittest
+
+from device.XcpClient import BinPacker
+
+
+class BinPackerTest(unittest.TestCase):
+
+    def check_bins(self, bins, items, bin_size, max_items=0xFF):
+        packed = {}
+        for b in bins:
+            self.assertLessEqual(sum(b.values()), bin_size)
+            self.assertLessEqual(len(b), max_items)
+            packed.update(b)
+        self.assertEqual(packed, items)
+
+    def test_exact_beats_first_fit_decreasing(self):
+        items = {'a': 5, 'b': 5, 'c': 4, 'd': 4, 'e': 3, 'f': 3}
+        sizes = sorted(items.values(), reverse=True)
+        self.assertEqual(max(BinPacker._first_fit_decreasing(sizes, 12, 0xFF)) + 1, 3)
+        bins = BinPacker.pack(items, 12)
+        self.assertEqual(len(bins), 2)
+        self.check_bins(bins, items, 12)
+
+    def test_first_fit_decreasing_above_exact_limit(self):
+        items = {f's{i}': 1 + i % 7 for i in range(BinPacker.EXACT_LIMIT + 20)}
+        bins = BinPacker.pack(items, 13)
+        self.check_bins(bins, items, 13)
+        sizes = sorted(items.values(), reverse=True)
+        self.assertEqual(len(bins), max(BinPacker._first_fit_decreasing(sizes, 13, 0xFF)) + 1)
+
+    def test_max_items(self):
+        items = {f's{i}': 1 for i in range(10)}
+        bins = BinPacker.pack(items, 100, max_items=3)
+        self.assertEqual(len(bins), 4)
+        self.check_bins(bins, items, 100, max_items=3)
+
+    def test_item_too_large(self):
+        with self.assertRaises(Exception):
+            BinPacker.pack({'a': 4, 'b': 9}, 8)
+
+    def test_empty(self):
+        self.assertEqual(BinPacker.pack({}, 8), [])
+
+    def test_coalesce(self):
+        signals = {'a': (0x100, 2), 'b': (0x102, 2), 'c': (0x104, 4), 'd': (0x200, 1), 'e': (0x108, 4)}
+        entries = BinPacker.coalesce(signals, 8)
+        self.assertEqual([(e.address, e.size, list(e.signals)) for e in entries], [
+            (0x100, 8, ['a', 'b', 'c']),
+            (0x108, 4, ['e']),
+            (0x200, 1, ['d']),
+        ])
+
+    def test_coalesce_granularity(self):
+        signals = {'a': (0x100, 2), 'b': (0x102, 2), 'c': (0x104, 2)}
+        # a maximum entry size of 5 shrinks to 4 with a granularity of 2
+        entries = BinPacker.coalesce(signals, 5, granularity=2)
+        self.assertEqual([(e.address, e.size) for e in entries], [(0x100, 4), (0x104, 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
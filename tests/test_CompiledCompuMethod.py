@@ -0,0 +1,81 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import unittest
+
+import numpy as np
+
+from data.Asap2Database import CompuMethod, CompuMethodType, Coeffs
+from data.CompiledCompuMethod import CompiledCompuMethod, compile_compu_method, make_column
+
+LINEAR = CompuMethod(Coeffs(0.1, -40.0), CompuMethodType.LINEAR, None, 'linear', 'degC')
+DENSE = CompuMethod(None, CompuMethodType.DICT, {str(i): f'state{i}' for i in range(-3, 5)}, 'dense', '')
+# keys spread wider than DENSE_SPAN
+SPARSE = CompuMethod(None, CompuMethodType.DICT, {str(i << 20): f'state{i}' for i in range(8)}, 'sparse', '')
+
+
+class CompiledCompuMethodTest(unittest.TestCase):
+
+    def assertArrayMatchesValues(self, compiled: CompiledCompuMethod, raw: np.ndarray):
+        self.assertEqual(compiled.to_phy(raw).tolist(), [compiled.to_phy_value(v) for v in raw.tolist()])
+
+    def test_identical(self):
+        compiled = compile_compu_method(None)
+        raw = np.array([1, -2, 3], dtype=np.int16)
+        self.assertIs(compiled.to_phy(raw), raw)
+        self.assertEqual(compiled.to_raw_value(7), 7)
+
+    def test_linear(self):
+        compiled = compile_compu_method(LINEAR)
+        # integer raw values give integers truncated towards zero
+        self.assertArrayMatchesValues(compiled, np.array([0, 1, 399, 401, 1000, -5], dtype=np.int16))
+        self.assertEqual(compiled.to_phy(np.array([401], dtype=np.int16)).dtype, np.int64)
+        self.assertArrayMatchesValues(compiled, np.array([0.0, 0.5, 401.0], dtype=np.float32))
+        self.assertEqual(compiled.to_raw_value(-39.0), 10)
+        np.testing.assert_array_equal(compiled.to_raw(np.array([-40.0, -39.0, 0.0])), [0, 10, 400])
+
+    def test_dict(self):
+        for cm, raw in ((DENSE, np.array([-3, 0, 4, 4, 1])), (SPARSE, np.array([0, 1 << 20, 5 << 20]))):
+            compiled = compile_compu_method(cm)
+            self.assertEqual(compiled.dense is None, cm is SPARSE)
+            self.assertArrayMatchesValues(compiled, raw)
+            phy = compiled.to_phy(raw)
+            np.testing.assert_array_equal(compiled.to_raw(phy), raw)
+            for missing in (5, -4, 3 << 19):
+                with self.assertRaises(KeyError):
+                    compiled.to_phy(np.array([0, missing]))
+                with self.assertRaises(KeyError):
+                    compiled.to_phy_value(missing)
+
+    def test_compiled_once(self):
+        self.assertIs(compile_compu_method(LINEAR), compile_compu_method(LINEAR))
+
+    def test_make_column(self):
+        self.assertEqual(make_column([1, 2.5]).dtype, np.float64)
+        column = make_column([[1, 0, 0], [0, 0, 0]])
+        self.assertEqual(column.dtype, object)
+        self.assertEqual(column[0], [1, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
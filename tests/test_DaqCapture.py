@@ -0,0 +1,208 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import shutil
+import struct
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from data.Asap2Database import Alignment, Asap2Database, Asap2Signal, ByteOrder, CompuMethod, CompuMethodType, \
+    Coeffs, Datatype, DBType
+from data.Asap2DatabaseUtil import process_asap2_database
+from data.RecordingReader import RecordingReader
+from device import DaqCapture
+from device.DaqCapture import DaqCapture as Capture
+
+DAQ_LIST = {'ev0': [{'db/a': 2, 'db/b': 4}, {'db/c': 1}], 'ev1': [{'db/d': 2}]}
+DAQ_LIST_PID = {'ev0': 0, 'ev1': 2}
+
+
+def make_db(datatype_c=Datatype.UBYTE) -> Asap2Database:
+    signals = [Asap2Signal('0x100', None, 'scaled', 1, Datatype.SWORD, '', '', 'a', None, None),
+               Asap2Signal('0x104', None, 'identical', 1, Datatype.ULONG, '', '', 'b', None, None),
+               Asap2Signal('0x108', None, 'identical', 1, datatype_c, '', '', 'c', None, None),
+               Asap2Signal('0x10a', None, 'identical', 1, Datatype.UWORD, '', '', 'd', None, None)]
+    compu_methods = [CompuMethod(Coeffs(0.5, 0.0), CompuMethodType.LINEAR, None, 'scaled', ''),
+                     CompuMethod(None, CompuMethodType.IDENTICAL, None, 'identical', '')]
+    db = Asap2Database(Alignment(1, 4, 8, 8, 4, 2), [], signals, ByteOrder.MSB_LAST, compu_methods, DBType.ASAP2,
+                       None, 'db')
+    process_asap2_database(db)
+    return db
+
+
+def make_header(db: Asap2Database) -> dict:
+    objs = DaqCapture.layout_objs({'db': db.name, 'daq_list': DAQ_LIST}, db, check_digest=False)
+    return {
+        'db': db.name,
+        'db_digest': DaqCapture.layout_digest(objs, db.byte_order),
+        'identification_field': 'IDF_ABS_ODT_NUMBER',
+        'slave_byte_order': 'INTEL',
+        'daq_list': DAQ_LIST,
+        'daq_list_pid': DAQ_LIST_PID,
+        'start_time': 1000.0,
+    }
+
+
+def make_packets(k: int, t0: float) -> list:
+    """one cycle of all ODTs as (response, counter, length, timestamp) like in the DAQ queue"""
+    return [(bytes([0]) + struct.pack('<hI', -k, 3 * k), k, 7, t0),
+            (bytes([1, k & 0xFF]), k, 2, t0),
+            (bytes([2]) + struct.pack('<H', k), k, 3, t0 + 0.5)]
+
+
+class DaqCaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.path = self.dir / 'm.daq'
+        self.db = make_db()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def capture(self, cycles: int, per_batch: int = 10):
+        capture = Capture(self.path, make_header(self.db))
+        for start in range(0, cycles, per_batch):
+            capture.append([p for k in range(start, min(start + per_batch, cycles))
+                            for p in make_packets(k, 1000.0 + k)])
+        capture.close()
+        return capture
+
+    def test_header_and_batches(self):
+        capture = self.capture(25)
+        self.assertEqual((capture.packets, capture.batches), (75, 3))
+        self.assertEqual(capture.bytes, self.path.stat().st_size)
+        with open(self.path, 'rb') as f:
+            header = DaqCapture.read_header(f)
+            self.assertEqual(header['daq_list'], DAQ_LIST)
+            self.assertEqual(header['version'], DaqCapture.CAPTURE_VERSION)
+            ranges = DaqCapture.batch_ranges(f, 1)
+        self.assertEqual(len(ranges), 3)
+        buf = self.path.read_bytes()[ranges[0][0]:ranges[-1][1]]
+        batches = list(DaqCapture.iter_batches(buf))
+        self.assertEqual([len(b[0]) for b in batches], [30, 30, 15])
+        timestamps, counters, lengths, payload = DaqCapture.concat_batches(batches)
+        self.assertEqual(lengths.tolist()[:3], [7, 2, 3])
+        self.assertEqual(counters.tolist()[-3:], [24, 24, 24])
+        self.assertEqual(timestamps.tolist()[-1], 1024.5)
+        self.assertEqual(len(payload), 25 * 12)
+
+    def test_zero_timestamps(self):
+        capture = Capture(self.path, make_header(self.db))
+        before = time.time()
+        capture.append(make_packets(1, 0.0))
+        capture.close()
+        with open(self.path, 'rb') as f:
+            DaqCapture.read_header(f)
+            start, end = DaqCapture.batch_ranges(f, 1 << 20)[0]
+        timestamps = next(DaqCapture.iter_batches(self.path.read_bytes()[start:end]))[0]
+        # taken when the packets were drained
+        self.assertTrue(all(t >= before for t in timestamps.tolist()[:2]))
+        self.assertEqual(timestamps[2], 0.5)
+
+    def test_truncated(self):
+        self.capture(20)
+        self.path.write_bytes(self.path.read_bytes()[:-3])
+        with open(self.path, 'rb') as f:
+            DaqCapture.read_header(f)
+            ranges = DaqCapture.batch_ranges(f, 1)
+        self.assertEqual(len(ranges), 1)
+
+    def test_not_a_capture(self):
+        self.path.write_bytes(b'something else')
+        with open(self.path, 'rb') as f:
+            with self.assertRaises(Exception):
+                DaqCapture.read_header(f)
+
+    def test_decode_batch(self):
+        header = make_header(self.db)
+        decoder = DaqCapture.decoder_of_header(header, DaqCapture.layout_objs(header, self.db), self.db.byte_order)
+        packets = make_packets(4, 1000.0) + make_packets(5, 1001.0)
+        # a packet of an unknown PID and one too short for its ODT are skipped
+        packets += [(bytes([9, 1, 2]), 0, 3, 1002.0), (bytes([0, 1]), 0, 2, 1002.0)]
+        timestamps = np.array([p[3] for p in packets])
+        lengths = np.array([len(p[0]) for p in packets], dtype=np.uint16)
+        payload = np.frombuffer(b''.join(p[0] for p in packets), dtype=np.uint8)
+        blocks = DaqCapture.decode_batch(decoder, timestamps, lengths, payload)
+        self.assertEqual([sorted(b.phy.keys()) for b in blocks], [['db/a', 'db/b'], ['db/c'], ['db/d']])
+        self.assertEqual(blocks[0].timestamps.tolist(), [1000.0, 1001.0])
+        # integer raw values convert to integers, like in the live decoding
+        self.assertEqual(blocks[0].phy['db/a'].tolist(), [-2, -2])
+        self.assertEqual(blocks[0].raw['db/b'].tolist(), [12, 15])
+        self.assertEqual(blocks[1].raw['db/c'].tolist(), [4, 5])
+        self.assertEqual(blocks[2].timestamps.tolist(), [1000.5, 1001.5])
+
+
+class DecodeCaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.path = self.dir / 'm.daq'
+        self.db = make_db()
+        capture = Capture(self.path, make_header(self.db))
+        for start in range(0, 600, 20):
+            capture.append([p for k in range(start, start + 20) for p in make_packets(k, 1000.0 + k)])
+        capture.close()
+        self.decode_bytes = DaqCapture.DECODE_BYTES
+
+    def tearDown(self):
+        DaqCapture.DECODE_BYTES = self.decode_bytes
+        shutil.rmtree(self.dir)
+
+    def test_decode(self):
+        recorder = DaqCapture.decode_capture(self.path, self.db, self.dir / 'out')
+        self.assertEqual(recorder.samples, 600 * 4)
+        reader = RecordingReader(self.dir / 'out')
+        self.assertEqual(reader.start_time, 1000.0)
+        t, v = reader.read('db/d')
+        np.testing.assert_array_equal(t, np.arange(600) + 1000.5)
+        np.testing.assert_array_equal(v, np.arange(600))
+        self.assertEqual(reader.read('db/b')[1].tolist(), [3.0 * k for k in range(600)])
+        t, v = reader.read('db/a', 1100.0, 1101.0)
+        self.assertEqual(v.tolist(), [-50.0, -50.0])
+
+    def test_workers(self):
+        # many small ranges, so that the pool gets several of them
+        DaqCapture.DECODE_BYTES = 1 << 10
+        DaqCapture.decode_capture(self.path, self.db, self.dir / 'one')
+        DaqCapture.decode_capture(self.path, self.db, self.dir / 'two', workers=2)
+        one, two = RecordingReader(self.dir / 'one'), RecordingReader(self.dir / 'two')
+        self.assertEqual(sorted(one.signals), sorted(two.signals))
+        for sid in one.signals:
+            for a, b in zip(one.read(sid), two.read(sid)):
+                np.testing.assert_array_equal(a, b)
+
+    def test_other_database(self):
+        with self.assertRaises(Exception):
+            DaqCapture.decode_capture(self.path, make_db(Datatype.SBYTE), self.dir / 'out')
+        # the layout check can be skipped when the change is known to be harmless
+        recorder = DaqCapture.decode_capture(self.path, make_db(Datatype.SBYTE), self.dir / 'out', check_digest=False)
+        self.assertEqual(recorder.samples, 600 * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+
+from data.Asap2Database import Alignment, Asap2Database, Asap2Parameter, Asap2Signal, ByteOrder, CompuMethod, \
+    CompuMethodType, Coeffs, Datatype, DBType, ParameterType
+from data.Asap2DatabaseUtil import process_asap2_database
+from device.DaqDecoder import DaqDecoder
+
+
+def make_objs(byte_order: ByteOrder):
+    """a scaled SWORD signal and a UBYTE[3] array parameter in a processed database"""
+    signal = Asap2Signal('0x100', None, 'scaled', 1, Datatype.SWORD, '', '', 'sig', None, None)
+    array = Asap2Parameter('0x200', None, 'identical', 3, Datatype.UBYTE, '', '', 'arr', ParameterType.ARRAY,
+                           None, None, None, None)
+    compu_methods = [CompuMethod(Coeffs(0.5, 1.0), CompuMethodType.LINEAR, None, 'scaled', ''),
+                     CompuMethod(None, CompuMethodType.IDENTICAL, None, 'identical', '')]
+    db = Asap2Database(Alignment(1, 4, 8, 8, 4, 2), [array], [signal], byte_order, compu_methods, DBType.ASAP2,
+                       None, 'db')
+    process_asap2_database(db)
+    return {'db/sig': signal, 'db/arr': array}
+
+
+class DaqDecoderTest(unittest.TestCase):
+
+    def make_decoder(self, byte_order=ByteOrder.MSB_LAST):
+        odts = [OrderedDict([('db/sig', 2), ('db/arr', 3)])]
+        return DaqDecoder(OrderedDict(channel=odts), 'IDF_ABS_ODT_NUMBER', make_objs(byte_order), byte_order)
+
+    def test_block_matches_single_packets(self):
+        decoder = self.make_decoder()
+        odt = decoder.odts[0][0]
+        # arrays ending in NUL bytes must keep their length in the block path
+        packets = [b'\x00' + bytes([4, 0]) + bytes([1, 0, 0]),
+                   b'\x00' + bytes([0xFE, 0xFF]) + bytes([0, 0, 0]),
+                   b'\x00' + bytes([0, 1]) + bytes([7, 8, 9])]
+        raw, phy = odt.decode_block(packets)
+        for k, packet in enumerate(packets):
+            for sid, raw_value, phy_value in odt.decode(packet):
+                self.assertEqual(np.asarray(raw[sid][k]).tolist(), raw_value, sid)
+                self.assertEqual(np.asarray(phy[sid][k]).tolist(), phy_value, sid)
+        self.assertEqual(np.asarray(phy['db/arr'][0]).tolist(), [1, 0, 0])
+        self.assertEqual(phy['db/sig'].tolist(), [3.0, 0.0, 129.0])
+
+    def test_msb_first(self):
+        decoder = self.make_decoder(ByteOrder.MSB_FIRST)
+        odt = decoder.odts[0][0]
+        packet = b'\x00' + bytes([0xFF, 0xFE]) + bytes([5, 0, 0])
+        self.assertEqual(odt.decode(packet)[0][1:], (-2, 0.0))
+        raw, _ = odt.decode_block([packet])
+        self.assertEqual(raw['db/sig'].tolist(), [-2])
+
+    def test_bind_pids(self):
+        decoder = self.make_decoder()
+        decoder.bind_pids({'channel': 0x10})
+        self.assertIs(decoder.lookup(b'\x10' + bytes(5)), decoder.odts[0][0])
+        self.assertIsNone(decoder.lookup(b'\x11' + bytes(5)))
+        # too short for the ODT
+        self.assertIsNone(decoder.lookup(b'\x10' + bytes(2)))
+        with self.assertRaises(Exception):
+            decoder.bind_pids({'channel': 0x100})
+
+
+if __name__ == '__main__':
+    unittest.main()
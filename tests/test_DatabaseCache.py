@@ -0,0 +1,93 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from data import DatabaseCache, PickleCache
+from data.Asap2Database import Alignment, Asap2Database, Asap2Signal, ByteOrder, CompuMethod, CompuMethodType, \
+    Datatype, DBType
+from data.Asap2DatabaseUtil import process_asap2_database
+
+
+def make_db() -> Asap2Database:
+    signal = Asap2Signal('0x100', None, 'identical', 1, Datatype.UWORD, '', '', 'sig', None, None)
+    db = Asap2Database(Alignment(1, 4, 8, 8, 4, 2), [], [signal], ByteOrder.MSB_LAST,
+                       [CompuMethod(None, CompuMethodType.IDENTICAL, None, 'identical', '')], DBType.ASAP2, None, 'db')
+    process_asap2_database(db)
+    return db
+
+
+class DatabaseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.db_path = self.dir / 'db.json'
+        self.db_path.write_text('{"name": "db"}')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_roundtrip(self):
+        self.assertIsNone(DatabaseCache.load(self.db_path))
+        DatabaseCache.store(self.db_path, make_db())
+        db = DatabaseCache.load(self.db_path)
+        self.assertEqual(db.name, 'db')
+        self.assertEqual([s.name for s in db.asap2_signals], ['sig'])
+        self.assertEqual(list(self.dir.glob('**/*.tmp')), [])
+
+    def test_stale(self):
+        DatabaseCache.store(self.db_path, make_db())
+        self.db_path.write_text('{"name": "other"}')
+        self.assertIsNone(DatabaseCache.load(self.db_path))
+
+    def test_touched_but_unchanged(self):
+        DatabaseCache.store(self.db_path, make_db())
+        st = self.db_path.stat()
+        os.utime(self.db_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        self.assertIsNotNone(DatabaseCache.load(self.db_path))
+
+    def test_version(self):
+        DatabaseCache.store(self.db_path, make_db())
+        PickleCache.write(DatabaseCache.cache_path(self.db_path), {'version': DatabaseCache.CACHE_VERSION + 1},
+                          make_db())
+        self.assertIsNone(DatabaseCache.load(self.db_path))
+
+    def test_truncated(self):
+        DatabaseCache.store(self.db_path, make_db())
+        path = DatabaseCache.cache_path(self.db_path)
+        path.write_bytes(path.read_bytes()[:-10])
+        self.assertIsNone(DatabaseCache.load(self.db_path))
+
+    def test_unwritable(self):
+        # the cache directory can not be created where a file is in the way
+        DatabaseCache.cache_path(self.db_path).parent.write_text('')
+        DatabaseCache.store(self.db_path, make_db())
+        self.assertIsNone(DatabaseCache.load(self.db_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from device import EcuCache
+
+
+class EcuCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.env = mock.patch.dict(os.environ, {'XDG_CACHE_HOME': str(self.dir), 'LOCALAPPDATA': str(self.dir)})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        shutil.rmtree(self.dir)
+
+    def test_cache_dir(self):
+        self.assertIn(self.dir, EcuCache.cache_dir().parents)
+
+    def test_identity_key(self):
+        self.assertEqual(EcuCache.identity_key('slave', 8, 8), EcuCache.identity_key('slave', 8, 8))
+        self.assertNotEqual(EcuCache.identity_key('slave', 8, 8), EcuCache.identity_key('slave', 8, 16))
+
+    def test_roundtrip(self):
+        key = EcuCache.identity_key('slave')
+        self.assertIsNone(EcuCache.load(key))
+        capabilities = EcuCache.EcuCapabilities({'daq': 1}, {'granularity': 1}, {'event0': 10})
+        EcuCache.store(key, capabilities)
+        self.assertEqual(EcuCache.load(key), capabilities)
+        self.assertIsNone(EcuCache.load(EcuCache.identity_key('other slave')))
+
+    def test_key_mismatch(self):
+        key, other = EcuCache.identity_key('slave'), EcuCache.identity_key('other slave')
+        EcuCache.store(key, EcuCache.EcuCapabilities(None, None, {}))
+        # a cache file renamed to another key is not taken for that slave
+        EcuCache.cache_path(key).rename(EcuCache.cache_path(other))
+        self.assertIsNone(EcuCache.load(other))
+
+
+if __name__ == '__main__':
+    unittest.main()
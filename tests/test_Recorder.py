@@ -0,0 +1,105 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from data.DataPool import SampleBlock
+from data.Recorder import Recorder
+from data.RecordingReader import RecordingReader
+
+
+class StalledRecorder(Recorder):
+    """a recorder whose writer waits for `resume` before the first block, like on a stalled disk"""
+    MAX_QUEUE_SAMPLES = 100
+
+    def __init__(self, path, block=False):
+        super().__init__(path, block)
+        self.stalled = threading.Event()
+        self.resume = threading.Event()
+
+    def _add_block(self, block: SampleBlock):
+        self.stalled.set()
+        self.resume.wait()
+        super()._add_block(block)
+
+
+def make_block(k: int, rows: int = 10) -> SampleBlock:
+    t = np.arange(k * rows, (k + 1) * rows, dtype=np.float64)
+    return SampleBlock(t, {}, {'a': t, 'b': -t})
+
+
+class RecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_drops_by_samples(self):
+        recorder = StalledRecorder(self.dir / 'recording')
+        recorder.start()
+        recorder.on_new_xcp_block(make_block(0))
+        recorder.stalled.wait()
+        # the writer holds the first block, the queue takes 100 samples of 20 per block
+        for k in range(1, 10):
+            recorder.on_new_xcp_block(make_block(k))
+        recorder.resume.set()
+        recorder.stop()
+        self.assertEqual(recorder.dropped_blocks, 4)
+        self.assertEqual(recorder.dropped_samples, 80)
+        self.assertEqual(recorder.samples, 120)
+        self.assertLessEqual(recorder.max_queue, StalledRecorder.MAX_QUEUE_SAMPLES)
+
+    def test_block_waits(self):
+        recorder = StalledRecorder(self.dir / 'recording', block=True)
+        recorder.start()
+        producer = threading.Thread(target=lambda: [recorder.on_new_xcp_block(make_block(k)) for k in range(10)])
+        producer.start()
+        producer.join(0.2)
+        self.assertTrue(producer.is_alive())
+        recorder.resume.set()
+        producer.join()
+        recorder.stop()
+        self.assertEqual(recorder.dropped_blocks, 0)
+        reader = RecordingReader(self.dir / 'recording')
+        np.testing.assert_array_equal(reader.read('b')[1], -np.arange(100.0))
+
+    def test_large_block(self):
+        recorder = Recorder(self.dir / 'recording')
+        recorder.MAX_QUEUE_SAMPLES = 10
+        recorder.start()
+        # a block above the limit still goes into an empty queue
+        recorder.on_new_xcp_block(make_block(0, rows=50))
+        recorder.stop()
+        self.assertEqual(recorder.samples, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from data.DataPool import SampleBlock
+from data.Recorder import Recorder
+from data.RecordingReader import RecordingReader
+
+
+class RecordingReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.path = self.dir / 'recording'
+        self.recorder = Recorder(self.path, block=True)
+        # one chunk per block, so the queries cross chunk borders
+        self.recorder.CHUNK_ROWS = 1
+        self.recorder.start(datetime.fromtimestamp(100.0))
+
+    def tearDown(self):
+        self.recorder.stop()
+        shutil.rmtree(self.dir)
+
+    def record(self, t: np.ndarray, **signals):
+        self.recorder.on_new_xcp_block(SampleBlock(t, {}, signals))
+
+    def record_blocks(self):
+        """a: 0.0 .. 9.5 in blocks of 4 samples, b: from 4.0 on"""
+        t = np.arange(0.0, 10.0, 0.5)
+        for k in range(0, len(t), 4):
+            block = t[k:k + 4]
+            signals = {'a': block * 2}
+            if block[0] >= 4.0:
+                signals['b'] = -block
+            self.record(block, **signals)
+        self.recorder.stop()
+
+    def test_signals(self):
+        self.record_blocks()
+        reader = RecordingReader(self.path)
+        self.assertEqual(reader.signals, ['a', 'b'])
+        self.assertEqual(len(reader), 2)
+        self.assertIn('a', reader)
+        self.assertNotIn('c', reader)
+        self.assertEqual(reader.start_time, 100.0)
+        self.assertEqual(reader.samples('a'), 20)
+        self.assertEqual(reader.samples('b'), 12)
+        self.assertEqual(reader.time_range('b'), (4.0, 9.5))
+        self.assertEqual(reader.time_range(), (0.0, 9.5))
+
+    def test_read(self):
+        self.record_blocks()
+        reader = RecordingReader(self.path)
+        t, v = reader.read('a')
+        np.testing.assert_array_equal(t, np.arange(0.0, 10.0, 0.5))
+        np.testing.assert_array_equal(v, t * 2)
+        # borders inside a chunk, on a chunk border and between samples are inclusive
+        for t0, t1 in ((1.0, 3.0), (1.5, 2.0), (0.2, 7.7), (2.0, 2.0), (None, 3.2), (8.1, None)):
+            t, _ = reader.read('a', t0, t1)
+            expected = np.arange(0.0, 10.0, 0.5)
+            if t0 is not None:
+                expected = expected[expected >= t0]
+            if t1 is not None:
+                expected = expected[expected <= t1]
+            np.testing.assert_array_equal(t, expected, err_msg=f'{t0} .. {t1}')
+
+    def test_read_outside(self):
+        self.record_blocks()
+        reader = RecordingReader(self.path)
+        self.assertEqual(len(reader.read('a', 10.0)[0]), 0)
+        self.assertEqual(len(reader.read('a', None, -1.0)[0]), 0)
+        self.assertEqual(len(reader.read('b', 0.0, 3.0)[0]), 0)
+        self.assertEqual(len(reader.read('a', 3.0, 2.0)[0]), 0)
+
+    def test_query(self):
+        self.record_blocks()
+        reader = RecordingReader(self.path)
+        result = reader.query(['a', 'b'], 4.5, 5.0)
+        np.testing.assert_array_equal(result['a'][0], [4.5, 5.0])
+        np.testing.assert_array_equal(result['b'][1], [-4.5, -5.0])
+
+    def test_refresh(self):
+        reader = RecordingReader(self.path)
+        self.assertEqual(reader.signals, [])
+        self.assertIsNone(reader.time_range())
+        self.record_blocks()
+        reader.refresh()
+        self.assertEqual(reader.samples('a'), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
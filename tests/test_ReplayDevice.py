@@ -0,0 +1,146 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from data.Asap2Database import Alignment, Asap2Database, Asap2Signal, ByteOrder, CompuMethod, CompuMethodType, \
+    Coeffs, Datatype, DBType
+from data.Asap2DatabaseUtil import process_asap2_database
+from data.DataPool import DataPool, SampleBlock, SignalConfig
+from data.Recorder import Recorder
+from device.ReplayDevice import ReplayDevice
+
+DB_NAME = 'replaytest'
+
+
+def make_db() -> Asap2Database:
+    signals = [Asap2Signal('0x100', None, 'scaled', 1, Datatype.SWORD, '', '', 'a', None, None),
+               Asap2Signal('0x102', None, 'state', 1, Datatype.UBYTE, '', '', 'b', None, None)]
+    compu_methods = [CompuMethod(Coeffs(0.5, 0.0), CompuMethodType.LINEAR, None, 'scaled', ''),
+                     CompuMethod(None, CompuMethodType.DICT, {'0': 'OFF', '1': 'ON'}, 'state', '')]
+    db = Asap2Database(Alignment(1, 4, 8, 8, 4, 2), [], signals, ByteOrder.MSB_LAST, compu_methods, DBType.ASAP2,
+                       None, DB_NAME)
+    process_asap2_database(db)
+    return db
+
+
+class ReplayDeviceTest(unittest.TestCase):
+    """replays a recording of 2 s: a at 100 Hz with the value k / 2 at 10 s + k / 100, b at 10 Hz"""
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        recorder = Recorder(self.dir / 'recording', block=True)
+        recorder.start(datetime.fromtimestamp(10.0))
+        t = 10.0 + np.arange(200) / 100
+        recorder.on_new_xcp_block(SampleBlock(t, {}, {f'{DB_NAME}/a': np.arange(200) / 2}))
+        # the recorder keeps the raw value of dictionary compu methods
+        recorder.on_new_xcp_block(SampleBlock(t[::10], {f'{DB_NAME}/b': np.arange(20) % 2},
+                                              {f'{DB_NAME}/b': np.array(['OFF', 'ON'] * 10, dtype=object)}))
+        recorder.stop()
+        self.data_pool = DataPool()
+        self.signal_config = self.data_pool.signal_config
+        self.data_pool.signal_config = {}
+        self.data_pool._databases[DB_NAME] = make_db()
+        self.device = ReplayDevice(self.dir / 'recording', None)
+        self.blocks = []
+        self.finished = []
+        self.device.add_event_listener(ReplayDevice.RECV_BLOCK, self.blocks.append)
+        self.device.add_event_listener(ReplayDevice.STOP_MEASUREMENT, lambda: self.finished.append(True))
+        self.device.connect()
+
+    def tearDown(self):
+        self.device.stop_measurement()
+        self.device.disconnect()
+        self.data_pool.signal_config = self.signal_config
+        del self.data_pool._databases[DB_NAME]
+        shutil.rmtree(self.dir)
+
+    def replay(self, timeout: float = 5.0):
+        self.device.setup_measurement()
+        self.device.start_measurement()
+        deadline = time.perf_counter() + timeout
+        while not self.device.finished and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        self.device.replay_thread.join(timeout)
+
+    def samples(self, sid: str):
+        blocks = [b for b in self.blocks if sid in b.phy]
+        return np.concatenate([b.timestamps for b in blocks]), np.concatenate([b.phy[sid] for b in blocks])
+
+    def test_fast(self):
+        self.replay()
+        self.assertTrue(self.device.finished)
+        self.assertEqual(self.finished, [True])
+        self.assertEqual(self.device.samples, 220)
+        self.assertAlmostEqual(self.device.duration, 1.99)
+        t, v = self.samples(f'{DB_NAME}/a')
+        np.testing.assert_array_equal(v, np.arange(200) / 2)
+        # moved to the start of the replay
+        np.testing.assert_allclose(t - t[0], np.arange(200) / 100, atol=1e-6)
+        self.assertLess(abs(t[0] - self.device.clock() + 1.99), 1e-6)
+
+    def test_speed(self):
+        self.device.speed = 2.0
+        self.device.setup_measurement()
+        self.device.start_measurement()
+        time.sleep(0.3)
+        self.assertGreater(self.device.position, 0.3)
+        self.assertLess(self.device.position, 1.5)
+        self.assertFalse(self.device.finished)
+        self.device.speed = None
+        self.replay()
+        self.assertEqual(self.device.samples, 220)
+
+    def test_clock(self):
+        self.device.setup_measurement()
+        self.device.start_measurement()
+        self.assertEqual(self.data_pool._clock, self.device.clock)
+        self.device.replay_thread.join(5.0)
+        self.device.stop_measurement()
+        self.assertIsNone(self.data_pool._clock)
+
+    def test_configured_signals(self):
+        sid = f'{DB_NAME}/b'
+        self.data_pool.signal_config = {sid: SignalConfig(sid, 'replay', 10, True)}
+        self.replay()
+        self.assertEqual({s for b in self.blocks for s in b.phy.keys()}, {sid})
+
+    def test_upload(self):
+        self.assertIsNone(self.device.upload(f'{DB_NAME}/a'))
+        self.assertIsNone(self.device.upload(f'{DB_NAME}/missing'))
+        self.replay()
+        self.assertEqual(self.device.upload(f'{DB_NAME}/a'), (199, 99.5))
+        self.assertEqual(self.device.upload(f'{DB_NAME}/b'), (1, 'ON'))
+        with self.assertRaises(Exception):
+            self.device.download(f'{DB_NAME}/a', 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
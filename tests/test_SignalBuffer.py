@@ -0,0 +1,108 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import unittest
+
+import numpy as np
+
+from data.SignalBuffer import SignalBuffer
+
+
+class SignalBufferTest(unittest.TestCase):
+
+    def fill(self, buffer: SignalBuffer, start: int, stop: int):
+        for i in range(start, stop):
+            buffer.append(float(i), float(-i))
+
+    def assertSamples(self, buffer: SignalBuffer, start: int, stop: int):
+        t, v = buffer.view()
+        np.testing.assert_array_equal(t, np.arange(start, stop, dtype=np.float64))
+        np.testing.assert_array_equal(v, -np.arange(start, stop, dtype=np.float64))
+
+    def test_capacity(self):
+        with self.assertRaises(ValueError):
+            SignalBuffer(0)
+
+    def test_empty(self):
+        buffer = SignalBuffer(4)
+        self.assertEqual(len(buffer), 0)
+        self.assertIsNone(buffer.last())
+        self.assertEqual(len(buffer.latest(1.0)[0]), 0)
+
+    def test_wraparound(self):
+        buffer = SignalBuffer(4)
+        # several compactions of the double sized storage
+        self.fill(buffer, 0, 23)
+        self.assertEqual(len(buffer), 4)
+        self.assertSamples(buffer, 19, 23)
+        self.assertEqual(buffer.last(), (22.0, -22.0))
+
+    def test_views_stay_valid(self):
+        buffer = SignalBuffer(4)
+        self.fill(buffer, 0, 4)
+        t, v = buffer.view()
+        self.fill(buffer, 4, 20)
+        buffer.clear()
+        np.testing.assert_array_equal(t, [0.0, 1.0, 2.0, 3.0])
+        np.testing.assert_array_equal(v, [0.0, -1.0, -2.0, -3.0])
+
+    def test_extend(self):
+        buffer = SignalBuffer(5)
+        self.fill(buffer, 0, 3)
+        buffer.extend(np.arange(3.0, 9.0), -np.arange(3.0, 9.0))
+        self.assertSamples(buffer, 4, 9)
+        buffer.extend(np.empty(0), np.empty(0))
+        self.assertSamples(buffer, 4, 9)
+
+    def test_extend_beyond_capacity(self):
+        buffer = SignalBuffer(5)
+        self.fill(buffer, 0, 3)
+        buffer.extend(np.arange(3.0, 20.0), -np.arange(3.0, 20.0))
+        self.assertSamples(buffer, 15, 20)
+
+    def test_window(self):
+        buffer = SignalBuffer(100, window=3.0)
+        self.fill(buffer, 0, 10)
+        self.assertSamples(buffer, 6, 10)
+        buffer.extend(np.arange(10.0, 20.0), -np.arange(10.0, 20.0))
+        self.assertSamples(buffer, 16, 20)
+
+    def test_latest(self):
+        buffer = SignalBuffer(8)
+        self.fill(buffer, 0, 12)
+        t, v = buffer.latest(2.0)
+        np.testing.assert_array_equal(t, [9.0, 10.0, 11.0])
+        np.testing.assert_array_equal(v, [-9.0, -10.0, -11.0])
+        self.assertEqual(len(buffer.latest(100.0)[0]), 8)
+
+    def test_clear(self):
+        buffer = SignalBuffer(4)
+        self.fill(buffer, 0, 6)
+        buffer.clear()
+        self.assertEqual(len(buffer), 0)
+        self.fill(buffer, 10, 12)
+        self.assertSamples(buffer, 10, 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import unittest
+
+from device.XcpClient import PollingSpan, plan_polling_spans
+
+
+class PlanPollingSpansTest(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual(plan_polling_spans([], 13), [])
+
+    def test_merge_with_gaps(self):
+        signals = [('c', 0x108, 4, None), ('a', 0x100, 2, None), ('b', 0x104, 1, None), ('d', 0x200, 4, None)]
+        self.assertEqual(plan_polling_spans(signals, 13), [
+            PollingSpan(0x100, 12, [('a', 0, 2, None), ('b', 4, 1, None), ('c', 8, 4, None)]),
+            PollingSpan(0x200, 4, [('d', 0, 4, None)]),
+        ])
+
+    def test_max_size(self):
+        signals = [(f's{i}', 0x100 + 4 * i, 4, None) for i in range(5)]
+        spans = plan_polling_spans(signals, 13)
+        self.assertEqual([(s.address, s.size) for s in spans], [(0x100, 12), (0x10c, 8)])
+        self.assertEqual([sid for s in spans for sid, _, _, _ in s.members], [f's{i}' for i in range(5)])
+
+    def test_large_signal(self):
+        signals = [('a', 0x100, 2, None), ('big', 0x102, 40, None), ('b', 0x12a, 2, None)]
+        spans = plan_polling_spans(signals, 13)
+        self.assertEqual([(s.address, s.size) for s in spans], [(0x100, 2), (0x102, 40), (0x12a, 2)])
+
+    def test_overlapping(self):
+        # a struct and one of its members
+        signals = [('whole', 0x100, 8, None), ('member', 0x104, 2, None)]
+        self.assertEqual(plan_polling_spans(signals, 13),
+                         [PollingSpan(0x100, 8, [('whole', 0, 8, None), ('member', 4, 2, None)])])
+
+
+if __name__ == '__main__':
+    unittest.main()
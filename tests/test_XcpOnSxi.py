@@ -0,0 +1,90 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import unittest
+
+from device.transport.XcpOnSxi import XcpOnSxi
+
+
+class XcpOnSxiCodecTest(unittest.TestCase):
+
+    def decode(self, buf: bytearray):
+        return list(XcpOnSxi.decode_frames(buf))
+
+    def test_roundtrip(self):
+        frame = bytes([0xFF, 0x9A, 0x01, 0x9B, 0x9B, 0x9A, 0x00])
+        buf = bytearray(XcpOnSxi.encode(frame))
+        self.assertEqual(self.decode(buf), [(frame, 11, None)])
+        self.assertEqual(buf, bytearray())
+
+    def test_escapes(self):
+        encoded = XcpOnSxi.encode(bytes([0x9A, 0x9B]))
+        self.assertEqual(encoded[:2], bytes([0x9A, 4]))
+        self.assertEqual(encoded[2:6], bytes([0x9B, 0x01, 0x9B, 0x00]))
+        self.assertEqual(encoded[6], (0x9B + 0x01 + 0x9B + 0x00 + 4) % 256)
+
+    def test_several_frames_and_tail(self):
+        frames = [bytes([1, 2, 3]), bytes([0x9A]), bytes(range(40))]
+        stream = b''.join(XcpOnSxi.encode(f) for f in frames)
+        buf = bytearray(stream[:-5])
+        decoded = self.decode(buf)
+        self.assertEqual([payload for payload, _, _ in decoded], frames[:2])
+        # the incomplete last frame stays in the buffer until the rest arrives
+        self.assertEqual(bytes(buf), XcpOnSxi.encode(frames[2])[:-5])
+        buf += stream[-5:]
+        self.assertEqual([payload for payload, _, _ in self.decode(buf)], frames[2:])
+        self.assertEqual(buf, bytearray())
+
+    def test_garbage_before_sync(self):
+        buf = bytearray(b'\x00\x01\x02' + XcpOnSxi.encode(b'\x10\x20'))
+        self.assertEqual(self.decode(buf), [(b'\x10\x20', 2, None)])
+
+    def test_no_sync(self):
+        buf = bytearray(b'\x00\x01\x02')
+        self.assertEqual(self.decode(buf), [])
+        self.assertEqual(buf, bytearray())
+
+    def test_checksum_mismatch(self):
+        encoded = bytearray(XcpOnSxi.encode(b'\x10\x20'))
+        encoded[-1] ^= 0xFF
+        buf = encoded + XcpOnSxi.encode(b'\x30')
+        decoded = self.decode(buf)
+        self.assertEqual(decoded[0], (None, 2, 'Checksum mismatch'))
+        self.assertEqual(decoded[1], (b'\x30', 1, None))
+
+    def test_dangling_escape(self):
+        data = bytes([0x9B, 0x05])
+        buf = bytearray([0x9A, 2]) + data + bytes([(sum(data) + 2) % 256])
+        self.assertEqual(self.decode(buf), [(None, 2, 'Wrong data format')])
+
+    def test_empty_frame(self):
+        buf = bytearray([0x9A, 0, 0])
+        self.assertEqual(self.decode(buf), [(None, 0, 'Size mismatch.')])
+
+    def test_frame_too_long(self):
+        with self.assertRaises(Exception):
+            XcpOnSxi.encode(bytes([0x9A]) * 128)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+__copyright__ = """
+    DaDuPo - An online calibration and measurement tool using XCP protocol
+
+    (C) 2021 by Jun Yang <fever_sky@qq.com>
+
+    All Rights Reserved
+
+    This file is part of DaDuPo.
+
+    DaDuPo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import time
+import unittest
+from collections import Counter
+
+import numpy as np
+from pyxcp.types import Command
+
+from data.DataPool import DataPool, SignalConfig
+from device.XcpClient import XcpClient
+from device.sim.XcpSlaveSim import XcpSlaveSim
+
+
+class XcpSlaveSimTest(unittest.TestCase):
+    """XcpClient against the in-process simulated slave, no hardware involved"""
+
+    def setUp(self):
+        self.use_ecu_cache = XcpClient.use_ecu_cache
+        # the cache is keyed by the slave identity only and would carry state between the tests
+        XcpClient.use_ecu_cache = False
+        self.data_pool = DataPool()
+        self.signal_config = self.data_pool.signal_config
+        self.sim = None
+        self.client = None
+
+    def tearDown(self):
+        if self.client is not None:
+            if self.client.run_measurement:
+                self.client.stop_measurement()
+            self.client.disconnect()
+        if self.sim is not None:
+            self.sim.close()
+        self.data_pool.signal_config = self.signal_config
+        XcpClient.use_ecu_cache = self.use_ecu_cache
+
+    def connect(self, **kwargs) -> XcpClient:
+        self.sim = XcpSlaveSim(self.id(), **kwargs)
+        config = {'transport': 'XcpOnSxi', 'port': self.sim.url, 'bitrate': 115200, 'TIMEOUT': 2.0}
+        self.client = XcpClient('XcpOnSxi', config, self.sim.database())
+        self.client.connect()
+        return self.client
+
+    def count_commands(self) -> Counter:
+        """counts the requests the slave receives from now on, key: command"""
+        counts = Counter()
+        for command, handler in list(self.sim._handlers.items()):
+            def counted(request, command=command, handler=handler):
+                counts[command] += 1
+                return handler(request)
+            self.sim._handlers[command] = counted
+        return counts
+
+    def configure(self, channels):
+        """measures each signal of the simulated slave on channels[i % len(channels)]"""
+        db = self.client.db
+        self.data_pool.signal_config = {
+            f'{db.name}/{s.name}': SignalConfig(f'{db.name}/{s.name}', channels[i % len(channels)], 10, True)
+            for i, s in enumerate(db.asap2_signals)}
+
+    def measure(self, seconds: float) -> dict:
+        """runs a measurement, returns the number of samples received per sid"""
+        samples = Counter()
+
+        def on_block(block):
+            for sid in block.phy.keys():
+                samples[sid] += len(block.timestamps)
+        self.client.add_event_listener(XcpClient.RECV_BLOCK, on_block)
+        self.client.setup_measurement()
+        self.client.start_measurement()
+        time.sleep(seconds)
+        self.client.stop_measurement()
+        self.client.remove_event_listener(XcpClient.RECV_BLOCK, on_block)
+        return samples
+
+    def test_connect(self):
+        client = self.connect(n_signals=4, n_channels=2, rate=[100, 10])
+        self.assertTrue(client.connected)
+        self.assertEqual(sorted(client.event_channels.keys()), ['sim_event0', 'sim_event1'])
+
+    def test_daq(self):
+        # WRITE_DAQ_MULTIPLE needs a CTO of at least two elements
+        self.connect(n_signals=10, n_channels=2, rate=[1000, 100], max_cto=64, max_dto=64)
+        counts = self.count_commands()
+        self.configure(['sim_event0', 'sim_event1'])
+        samples = self.measure(0.5)
+        self.assertEqual(len(samples), 10)
+        fast = [n for sid, n in samples.items() if int(sid.rsplit('signal', 1)[1]) % 2 == 0]
+        slow = [n for sid, n in samples.items() if int(sid.rsplit('signal', 1)[1]) % 2 == 1]
+        self.assertGreater(min(fast), 5 * max(slow))
+        self.assertGreater(min(slow), 0)
+        self.assertGreater(counts[Command.WRITE_DAQ_MULTIPLE], 0)
+        self.assertEqual(counts[Command.WRITE_DAQ], 0)
+        self.assertTrue(self.client.write_daq_multiple)
+        self.assertEqual(sorted(self.client.daq_setup_timing.keys()), ['sim_event0', 'sim_event1'])
+        self.assertIsNone(self.client.daq_thread)
+
+    def test_write_daq_fallback(self):
+        self.connect(n_signals=10, n_channels=1, rate=200, max_cto=64, max_dto=64)
+        del self.sim._handlers[Command.WRITE_DAQ_MULTIPLE]
+        counts = self.count_commands()
+        self.configure(['sim_event0'])
+        samples = self.measure(0.3)
+        self.assertEqual(len(samples), 10)
+        self.assertFalse(self.client.write_daq_multiple)
+        self.assertGreater(counts[Command.WRITE_DAQ], 0)
+
+    def test_reuse_daq_configuration(self):
+        self.connect(n_signals=6, n_channels=1, rate=200)
+        self.configure(['sim_event0'])
+        self.measure(0.1)
+        counts = self.count_commands()
+        samples = self.measure(0.2)
+        self.assertEqual(len(samples), 6)
+        self.assertEqual(counts[Command.FREE_DAQ], 0)
+        self.assertEqual(counts[Command.WRITE_DAQ_MULTIPLE] + counts[Command.WRITE_DAQ], 0)
+
+    def test_polling(self):
+        self.connect(n_signals=6, n_channels=1, rate=100)
+        self.configure(['polling'])
+        samples = self.measure(0.3)
+        self.assertEqual(len(samples), 6)
+        self.assertIsNone(self.client.polling_thread)
+
+    def test_block_mode_upload_download(self):
+        for block_mode in (True, False):
+            with self.subTest(block_mode=block_mode):
+                client = self.connect(n_signals=2, n_parameters=40, block_mode=block_mode, max_bs=4)
+                counts = self.count_commands()
+                address = self.sim.parameters[0].address + 3
+                data = os.urandom(150)
+                client.download_bytes(address, data)
+                self.assertEqual(client.upload_bytes(address, len(data)), data)
+                offset = address - XcpSlaveSim.BASE_ADDRESS
+                self.assertEqual(bytes(self.sim.memory[offset:offset + len(data)]), data)
+                if block_mode:
+                    self.assertGreater(counts[Command.DOWNLOAD_NEXT], 0)
+                    # one UPLOAD fetches up to 255 bytes in consecutive responses
+                    self.assertEqual(counts[Command.UPLOAD], 1)
+                else:
+                    self.assertEqual(counts[Command.DOWNLOAD_NEXT], 0)
+                    self.assertGreater(counts[Command.UPLOAD], 1)
+                client.disconnect()
+                self.sim.close()
+                self.client = self.sim = None
+
+    def test_upload_download_values(self):
+        client = self.connect(n_signals=2, n_parameters=5)
+        db = client.db
+        for p in db.asap2_parameters:
+            sid = f'{db.name}/{p.name}'
+            client.download(sid, 42)
+            raw, phy = client.upload(sid)
+            self.assertTrue(np.isclose(phy, 42), (sid, phy))
+
+
+if __name__ == '__main__':
+    unittest.main()
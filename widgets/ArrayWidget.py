@@ -117,7 +117,10 @@ class ArrayParameterWidget(ArrayWidgetBase):
             return
         self.setEnabled(True)
         obj = self.obj
-        phy_data = self.xcp_client.upload(obj.Name)[-1]
+        result = self.xcp_client.upload(obj.Name)
+        if result is None:
+            return
+        phy_data = result[-1]
         self.prev_data = phy_data
         if obj.Type == ParameterType.VAL_BLK:
             for i, d in enumerate(phy_data):
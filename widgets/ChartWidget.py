@@ -375,8 +375,7 @@ class ChartWidget(BaseUIEvents, QWidget):
                     self.signal_plot[sid].setSymbolSize(8)
                     self.signal_viewbox[sid].setXLink(self.default_viewbox)
             if not self._snap_shot:
-                for sid in self.data_pool.signal_buffer.keys():
-                    self._snap_shot[sid] = self.data_pool.signal_buffer[sid].copy()
+                self._take_snap_shot(self.data_pool.signal_buffer.keys())
 
     def disable_move_view(self):
         self._move_view = False
@@ -386,8 +385,13 @@ class ChartWidget(BaseUIEvents, QWidget):
                 self.signal_plot[sid].setSymbolSize(8)
                 self.signal_viewbox[sid].setXLink(self.default_viewbox)
         if not self._snap_shot:
-            for sid in self.signal_viewbox.keys():
-                self._snap_shot[sid] = self.data_pool.signal_buffer[sid].copy()
+            self._take_snap_shot(self.signal_viewbox.keys())
+
+    def _take_snap_shot(self, sids):
+        for sid in sids:
+            data = self.data_pool.get_signal_data(sid)
+            if data is not None:
+                self._snap_shot[sid] = (data[0].copy(), data[1].copy())
 
     @Slot(str)
     def on_signal_deleted(self, sid):
@@ -467,15 +471,15 @@ class ChartWidget(BaseUIEvents, QWidget):
         if (datetime.now() - self._update_time).total_seconds() < 0.1:
             return
         self._update_time = datetime.now()
-        now = (datetime.now() - self.data_pool.start_time).total_seconds()
+        now = self.data_pool.now()
         for sid in self.signal_viewbox.keys():
             # if message is None and self._move_view:
             #     if now > 15:
             #         self.signal_viewbox[sid].setXRange(now - 15, now, update=False)
-            if sid in self.data_pool.signal_buffer.keys():
-                v = self.data_pool.signal_buffer[sid]
+            data = self.data_pool.get_signal_data(sid, self.data_pool.buffer_window)
+            if data is not None:
+                x, y = data
                 if self._move_view:
-                    x = v[:, 0]
                     diff = np.diff(x)
                     mask = diff > 1.0
                     mask1 = np.append(mask, False)
@@ -484,11 +488,11 @@ class ChartWidget(BaseUIEvents, QWidget):
                     mask = np.logical_or(mask, mask1)
 
                     self.signal_viewbox[sid].setXLink(None)
-                    self.signal_plot[sid].setData(v)
+                    self.signal_plot[sid].setData(x=x, y=y)
                     if mask.any():
-                        self.signal_miss_plot[sid].setData(x=x[mask], y=v[:, 1][mask])
+                        self.signal_miss_plot[sid].setData(x=x[mask], y=y[mask])
                     self._snap_shot = {}
-                if self._move_view and len(v) and v[-1, 0] > 10 and self.signal_viewbox[sid].isVisible():
+                if self._move_view and len(x) and x[-1] > 10 and self.signal_viewbox[sid].isVisible():
                     self.signal_viewbox[sid].setXRange(now - 10, now, update=False)
 
     def enable_singleline(self):
@@ -509,7 +513,9 @@ class ChartWidget(BaseUIEvents, QWidget):
                 if sid not in self._snap_shot.keys():
                     return
                 for s in self.signal_plot.keys():
-                    x = self._snap_shot[s][:, 0]
+                    if s not in self._snap_shot.keys():
+                        continue
+                    x, y = self._snap_shot[s]
                     if not len(x):
                         continue
                     idx = np.searchsorted(x, mouse_point.x(), side="left")
@@ -517,7 +523,7 @@ class ChartWidget(BaseUIEvents, QWidget):
                         idx -= 1
                     if s == sid:
                         self.vLine.setPos(x[idx])
-                    self.sig_info_widget.set_sig_value(s, self._snap_shot[s][idx, 1])
+                    self.sig_info_widget.set_sig_value(s, y[idx])
 
         self.proxy_single_line = pg.SignalProxy(self.default_viewbox.scene().sigMouseMoved, rateLimit=60,
                                                 slot=mouse_moved)
@@ -148,13 +148,16 @@ class ScalarParameterWidget(ScalarBaseWidget):
 
                 def on_value_changed(var_id, sbox, val):
                     self.device_manager.download(var_id, val)
-                    sbox.setValue(self.device_manager.upload(var_id)[-1])
+                    result = self.device_manager.upload(var_id)
+                    if result is not None:
+                        sbox.setValue(result[-1])
 
                 spinbox.valueChanged.connect(partial(on_value_changed, sid, spinbox))
 
-        if self.device_manager.connected:
+        result = self.device_manager.upload(sid) if self.device_manager.connected else None
+        if result is not None:
             control = self.cellWidget(row, 1)
-            value = self.device_manager.upload(sid)[-1]
+            value = result[-1]
             if type(control) in [QLineEdit, pg.ComboBox]:
                 control.setText(value)
             elif type(control) in [QDoubleSpinBox]:
@@ -167,9 +170,13 @@ class ScalarParameterWidget(ScalarBaseWidget):
         for row in range(self.rowCount()):
             # name = self.item(row, 0).text()
             sid = self.item(row, 0).data(Qt.UserRole)
-            value = self.device_manager.upload(sid)[-1]
+            result = self.device_manager.upload(sid)
             control = self.cellWidget(row, 1)
             control.setEnabled(True)
+            if result is None:
+                # not available on the device, e.g. a parameter missing in a replayed recording
+                continue
+            value = result[-1]
             if type(control) in [QLineEdit, pg.ComboBox]:
                 control.setText(value)
             elif type(control) in [QDoubleSpinBox]:
@@ -227,5 +234,8 @@ class ScalarSignalWidget(ScalarBaseWidget):
         for row in range(self.rowCount()):
             sid = self.item(row, 0).data(Qt.UserRole)
             item = self.item(row, 1)
-            if len(self.data_pool.signal_buffer[sid]):
-                item.setText(str(self.data_pool.signal_buffer[sid][-1][1]))
+            last = self.data_pool.get_last_value(sid)
+            if last is not None:
+                vt = self.data_pool.get_value_table_by_sid(sid)
+                value = last[1]
+                item.setText(str(vt.get(str(int(value)), value) if vt else value))